@@ -0,0 +1,84 @@
+"""Per-process LRU of text featurization results, keyed by a content hash.
+
+The same text is featurized on item creation, per variant, per streamed snippet and per RM
+scoring request. Entries are keyed by (featurizer kind, blake2b-128 of the UTF-8 text), so a
+hit costs one hash of the text instead of every regex pass, and the key holds no raw text.
+The cache is bounded both by entry count and by an estimate of the bytes held; the least
+recently used entries go first. Callers get a copy of the cached dict and may mutate it.
+"""
+from __future__ import annotations
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+from ..config import config
+
+# OrderedDict link + key tuple + 16-byte digest
+_ENTRY_OVERHEAD = 200
+
+
+def _entry_bytes(feats: Dict[str, Any]) -> int:
+    # keys are shared interned names; count the dict and its values
+    return _ENTRY_OVERHEAD + sys.getsizeof(feats) + sum(sys.getsizeof(v) for v in feats.values())
+
+
+class FeatureCache:
+    def __init__(self, size: int, max_bytes: int):
+        self.size = size
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[Tuple[str, bytes], Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, text: str, compute: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """compute(text), memoized under (kind, hash(text))."""
+        key = (kind, hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(hit[0])
+            self.misses += 1
+        # computed outside the lock; a concurrent miss on the same text just computes twice
+        feats = compute(text)
+        cost = _entry_bytes(feats)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (dict(feats), cost)
+            self.bytes += cost
+            while self._entries and (len(self._entries) > self.size or self.bytes > self.max_bytes):
+                _, (_, c) = self._entries.popitem(last=False)
+                self.bytes -= c
+                self.evictions += 1
+        return feats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_entries": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / calls) if calls else None,
+            }
+
+
+feature_cache = FeatureCache(config.feature_cache_size, config.feature_cache_max_bytes)
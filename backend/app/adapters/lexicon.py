@@ -0,0 +1,132 @@
+"""Hedges, specificity markers and time/place cues, matched in one pass over the text.
+
+All the word lists that featurization, streaming spans, the hedge-removal variant and the
+agreement gate look for are compiled into a single case-insensitive alternation. `scan` walks
+it once with `finditer` and sorts each match into its category by group name, instead of one
+`re.findall` per pattern per caller. Matching follows the per-pattern regexes it replaces:
+
+- hedges are whole words or phrases (`\\bmaybe\\b`, `\\bI think\\b`, ...), returned as spans;
+- specificity markers are substrings ("today", "tomorrow", "at ", "on "), counted once each;
+- time and place cues are whole words and only their presence is reported;
+- the streaming agreement gate's specificity check is the whole words today, tomorrow, at and
+  on (`\b(today|tomorrow|at|on)\b`), reported as `has_specific_word`.
+
+Alternatives never overlap except a time cue "at 3", which also contains the marker "at " and
+the word "at"; time is tried first and credits both itself.
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, FrozenSet, List, NamedTuple, Optional, Tuple
+
+HEDGES = ["maybe", "perhaps", "kind of", "sort of", "I think", "just"]
+SPECIFICITY_MARKERS = ["today", "tomorrow", "at ", "on "]
+TIME_CUES = [r"at\s*\d", r"\d\s*(?:am|pm)", "monday", "tuesday", "wednesday", "thursday", "friday"]
+PLACE_CUES = ["cafe", "office", "zoom", "room", "building", "coffee"]
+
+
+def _words(words: List[str]) -> str:
+    return "|".join(re.escape(w) for w in words)
+
+
+# the lookahead on first letters lets most positions fail in one step
+HEDGE_RE = re.compile(rf"(?=[{''.join(sorted({w[0].lower() for w in HEDGES}))}])\b(?:{_words(HEDGES)})\b", re.IGNORECASE)
+
+# every alternative starts with one of these; the lookahead lets most positions fail in one step
+_FIRST = "".join(sorted({w[0].lower() for w in HEDGES + SPECIFICITY_MARKERS + TIME_CUES + PLACE_CUES if w[0].isalpha()}))
+
+_LEXICON = re.compile(
+    rf"(?=[{_FIRST}\d])"
+    rf"(?:(?P<time>\b(?:{'|'.join(TIME_CUES)})\b)"
+    rf"|(?P<hedge>\b(?:{_words(HEDGES)})\b)"
+    rf"|(?P<place>\b(?:{_words(PLACE_CUES)})\b)"
+    # a bare "at"/"on" is the marker "at "/"on " when a space follows, the gate word when whole
+    rf"|(?P<spec>today|tomorrow|(?:at|on)(?= )|\b(?:at|on)\b))",
+    re.IGNORECASE,
+)
+
+
+class Scan(NamedTuple):
+    hedge_spans: List[Tuple[int, int]]
+    specificity_markers: int
+    has_concrete_time: bool
+    has_place: bool
+    markers: FrozenSet[str] = frozenset()
+    has_specific_word: bool = False
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+def scan(text: str) -> Scan:
+    hedges: List[Tuple[int, int]] = []
+    markers = set()
+    time = place = word = False
+    n = len(text)
+    for m in _LEXICON.finditer(text):
+        kind = m.lastgroup
+        if kind == "hedge":
+            hedges.append(m.span())
+        elif kind == "spec":
+            a, b = m.span()
+            w = m.group().lower()
+            if len(w) > 2:
+                markers.add(w)
+            elif b < n and text[b] == " ":
+                markers.add(w + " ")
+            if not word:
+                word = (a == 0 or not _is_word_char(text[a - 1])) and (b == n or not _is_word_char(text[b]))
+        elif kind == "time":
+            time = True
+            g = m.group()
+            if g[:3].lower() == "at ":
+                markers.add("at ")
+            if g[:2].lower() == "at" and not g[2].isdigit():
+                word = True
+        else:
+            place = True
+    return Scan(hedges, len(markers), time, place, frozenset(markers), word)
+
+
+def remove_hedges(text: str) -> str:
+    return re.sub(r"\s+", " ", HEDGE_RE.sub("", text)).strip()
+
+
+# whitespace that remove_hedges rewrites even with no hedge next to it
+_ODD_SPACE = re.compile(r"\s{2,}|[^\S ]")
+
+
+def remove_hedges_ops(text: str, hedges: Optional[List[Tuple[int, int]]] = None) -> List[Tuple[int, int, str]]:
+    """The edits (start, end, replacement), ascending, that turn text into remove_hedges(text).
+    `hedges` are the hedge spans of text if already known (scan(text).hedge_spans)."""
+    n = len(text)
+    # [start, end, has whitespace]: each hedge widened over the whitespace around it, merged
+    # with the previous one when they touch (then whitespace separates them)
+    runs: List[List[Any]] = []
+    for a, b in hedges if hedges is not None else [m.span() for m in HEDGE_RE.finditer(text)]:
+        start, end = a, b
+        while start and text[start - 1].isspace():
+            start -= 1
+        while end < n and text[end].isspace():
+            end += 1
+        if runs and runs[-1][1] >= start:
+            runs[-1][1:] = [end, True]
+        else:
+            runs.append([start, end, (start, end) != (a, b)])
+    # whitespace runs away from hedges: only odd ones, and those at either end, change
+    spaces = [[m.start(), m.end(), True] for m in _ODD_SPACE.finditer(text)]
+    if text[:1].isspace():
+        spaces.append([0, len(text) - len(text.lstrip()), True])
+    if text[-1:].isspace():
+        spaces.append([len(text.rstrip()), n, True])
+    ops, last = [], -1
+    for start, end, space in sorted(runs + spaces, key=lambda r: (r[0], -r[1])):
+        if start < last:  # inside a run already handled (a hedge run takes all its whitespace)
+            continue
+        last = end
+        # a run that touches either end, or was only hedges, leaves nothing behind
+        rep = " " if 0 < start and end < n and space else ""
+        if text[start:end] != rep:
+            ops.append((start, end, rep))
+    return ops
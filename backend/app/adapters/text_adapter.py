@@ -1,15 +1,8 @@
 import re
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-
-HEDGES = [
-    r"\bmaybe\b",
-    r"\bperhaps\b",
-    r"\bkind of\b",
-    r"\bsort of\b",
-    r"\bI think\b",
-    r"\bjust\b",
-]
+from .feature_cache import feature_cache
+from .lexicon import HEDGE_RE, Scan, scan
 
 
 def redact_pii(s: str) -> str:
@@ -20,21 +13,25 @@ def redact_pii(s: str) -> str:
 
 
 def count_hedges(s: str) -> int:
-    lower = s.lower()
-    return sum(len(re.findall(pat, lower)) for pat in HEDGES)
+    return len(HEDGE_RE.findall(s))
 
 
-def text_features(s: str) -> Dict[str, Any]:
+def compute_text_features(s: str, lex: Optional[Scan] = None) -> Dict[str, Any]:
+    lex = lex or scan(s)
     return {
         "length": len(s),
         "words": len(s.split()),
-        "hedges": count_hedges(s),
+        "hedges": len(lex.hedge_spans),
         "question_marks": s.count("?"),
         "exclamations": s.count("!"),
-        "specificity_markers": sum(1 for t in ["today", "tomorrow", "at ", "on "] if t in s.lower()),
+        "specificity_markers": lex.specificity_markers,
     }
 
 
+def text_features(s: str) -> Dict[str, Any]:
+    return feature_cache.get("text", s, compute_text_features)
+
+
 def normalize_text_payload(text: str, context: Dict[str, Any]) -> Dict[str, Any]:
     redacted = redact_pii(text)
     feats = text_features(redacted)
@@ -1,35 +1,133 @@
 from __future__ import annotations
 
-import random
 import math
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Optional, Set
 
+import numpy as np
 
-def thompson_sample(scores: Dict[str, Tuple[float, float]]) -> List[Tuple[str, float]]:
+_rng = np.random.default_rng()
+
+
+def thompson_sample(
+    scores: Dict[str, Tuple[float, float]], rng: Optional[np.random.Generator] = None
+) -> List[Tuple[str, float]]:
     # sample once from Normal(s, stderr)
-    sampled = []
-    for vid, (s, se) in scores.items():
-        stdev = max(se, 0.05)
-        # Box-Muller for normal sample
-        u1, u2 = random.random(), random.random()
-        z = math.sqrt(-2.0 * math.log(max(u1, 1e-12))) * math.cos(2 * math.pi * u2)
-        draw = s + stdev * z
-        sampled.append((vid, draw))
-    sampled.sort(key=lambda x: x[1], reverse=True)
-    return sampled
-
-
-def pick_next_duel(vids: List[str], scores: Dict[str, Tuple[float, float]]) -> Tuple[str, str]:
+    vids = list(scores)
+    s = np.array([scores[v][0] for v in vids], dtype=np.float64)
+    se = np.maximum(np.array([scores[v][1] for v in vids], dtype=np.float64), 0.05)
+    draws = s + se * (rng or _rng).standard_normal(len(vids))
+    order = np.argsort(-draws, kind="stable")
+    return [(vids[i], float(draws[i])) for i in order]
+
+
+def diff_variance(
+    a: str,
+    b: str,
+    scores: Dict[str, Tuple[float, float]],
+    diff_var: Optional[Dict[Tuple[str, str], float]] = None,
+) -> float:
+    """Var(s_a - s_b): the independent-errors variance, or the batch Laplace one when that is
+    smaller (it accounts for the positive covariance of variants compared against each other).
+    """
+    var = scores[a][1] ** 2 + scores[b][1] ** 2
+    if diff_var:
+        var = min(var, diff_var.get((a, b) if a < b else (b, a), var))
+    return var
+
+
+def pair_z(
+    a: str,
+    b: str,
+    scores: Dict[str, Tuple[float, float]],
+    diff_var: Optional[Dict[Tuple[str, str], float]] = None,
+) -> float:
+    """|s_a - s_b| in standard deviations of the difference (see diff_variance)."""
+    return abs(scores[a][0] - scores[b][0]) / math.sqrt(max(diff_variance(a, b, scores, diff_var), 1e-12))
+
+
+def pick_next_duel(
+    vids: List[str],
+    scores: Dict[str, Tuple[float, float]],
+    z_resolved: Optional[float] = None,
+    diff_var: Optional[Dict[Tuple[str, str], float]] = None,
+    rng: Optional[np.random.Generator] = None,
+) -> Tuple[str, str]:
     if len(vids) < 2:
         raise ValueError("Need at least two variants for a duel")
-    sampled = thompson_sample({v: scores[v] for v in vids})
+    sampled = thompson_sample({v: scores[v] for v in vids}, rng)
     a = sampled[0][0]
-    # challenger: pick one with high stderr
+    # challenger: pick one with high stderr, skipping ones already resolved against `a`
     challengers = sorted(
         [v for v in vids if v != a], key=lambda v: scores[v][1], reverse=True
     )
+    if z_resolved is not None:
+        open_ = [v for v in challengers if pair_z(a, v, scores, diff_var) < z_resolved]
+        challengers = open_ or sorted(challengers, key=lambda v: pair_z(a, v, scores, diff_var))
     b = challengers[0]
     if a == b and len(sampled) > 1:
         b = sampled[1][0]
     return a, b
 
+
+def pick_duels(
+    vids: List[str],
+    scores: Dict[str, Tuple[float, float]],
+    k: int,
+    rng: Optional[np.random.Generator] = None,
+    z_resolved: Optional[float] = None,
+    diff_var: Optional[Dict[Tuple[str, str], float]] = None,
+) -> List[Tuple[str, str]]:
+    """Up to k distinct duels from one batch of Thompson draws (k x variants, one NumPy call).
+
+    Each draw's leader meets its highest-stderr challenger not yet used with it and not yet
+    resolved; leaders by mean score fill in if the draws run out. If every pair is resolved,
+    returns the single least-resolved leader/challenger pair, as pick_next_duel would.
+    """
+    n = len(vids)
+    if n < 2:
+        raise ValueError("Need at least two variants for a duel")
+    rng = rng or _rng
+    s = np.array([scores[v][0] for v in vids], dtype=np.float64)
+    se = np.array([scores[v][1] for v in vids], dtype=np.float64)
+    var = se * se
+    k = min(k, n * (n - 1) // 2)
+    # a few spare draws per duel: later draws often repeat a leader whose challengers ran out
+    draws = s + np.maximum(se, 0.05) * rng.standard_normal((4 * k, n))
+    leaders = np.argmax(draws, axis=1)
+    by_stderr = np.argsort(-se, kind="stable")
+
+    z_cache: Dict[int, np.ndarray] = {}
+
+    def z_row(a: int) -> np.ndarray:
+        if a not in z_cache:
+            v = var[a] + var
+            if diff_var:
+                for j in range(n):
+                    key = (vids[a], vids[j]) if vids[a] < vids[j] else (vids[j], vids[a])
+                    v[j] = min(v[j], diff_var.get(key, v[j]))
+            z_cache[a] = np.abs(s[a] - s) / np.sqrt(np.maximum(v, 1e-12))
+        return z_cache[a]
+
+    used: Set[Tuple[int, int]] = set()
+    out: List[Tuple[str, str]] = []
+
+    def take(a: int, limit: int) -> None:
+        z = z_row(a)
+        for b in by_stderr.tolist():
+            if limit <= 0 or len(out) >= k:
+                return
+            pair = (a, b) if a < b else (b, a)
+            if b == a or pair in used or (z_resolved is not None and z[b] >= z_resolved):
+                continue
+            used.add(pair)
+            out.append((vids[a], vids[b]))
+            limit -= 1
+
+    for a in leaders.tolist():
+        take(a, 1)
+    # draws that kept repeating an exhausted leader: fill up by mean score
+    for a in np.argsort(-s, kind="stable").tolist():
+        take(a, n)
+    if not out:
+        out.append(pick_next_duel(vids, scores, z_resolved=z_resolved, diff_var=diff_var, rng=rng))
+    return out
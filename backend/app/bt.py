@@ -1,58 +1,363 @@
 from __future__ import annotations
 
 import math
-from typing import Dict, Tuple, List
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .config import config
+from .shared_state import shared
+from .storage import InMemoryDB, db as default_db
+
+
+def comparison_info(p: Any, inv_alpha: Any) -> Any:
+    """Fisher information one comparison adds to each side: p(1-p)/alpha^2 (floats or arrays).
+
+    With p = sigmoid((s_a - s_b) / alpha), d logit / d s = 1/alpha. Shared by the online update,
+    the batch fit and its Laplace covariance so their stderrs agree.
+    """
+    return p * (1.0 - p) * inv_alpha * inv_alpha
+
+
+class Shard:
+    """BT state of one item: parallel arrays indexed by the variant's position in `vids`.
+
+    Guarded by `lock`. Once `evicted` is set the shard is dead and callers must look it up again.
+    """
+
+    __slots__ = ("item_id", "vids", "index", "s", "info", "lock", "dirty", "evicted")
+
+    def __init__(self, item_id: str):
+        self.item_id = item_id
+        self.vids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.s = array("d")
+        # accumulated Fisher information (prior contributes 1, so stderr starts at 1)
+        self.info = array("d")
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.evicted = False
+
+    def score(self, i: int) -> Tuple[float, float]:
+        return self.s[i], 1.0 / math.sqrt(self.info[i])
+
+
+class ScoresView(Mapping):
+    """Read-only variant_id -> (score, stderr) over resident shards, then the storage table."""
+
+    def __init__(self, bt: "BradleyTerry"):
+        self._bt = bt
+
+    def __getitem__(self, vid: str) -> Tuple[float, float]:
+        shard = self._bt._where.get(vid)
+        if shard is not None:
+            with shard.lock:
+                if not shard.evicted and vid in shard.index:
+                    return shard.score(shard.index[vid])
+        row = self._bt.db.scores.get(vid)
+        if row is None:
+            raise KeyError(vid)
+        return row["s"], row["stderr"]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(set(self._bt._where) | set(self._bt.db.scores))
+
+    def __len__(self) -> int:
+        return len(set(self._bt._where) | set(self._bt.db.scores))
 
 
 class BradleyTerry:
-    def __init__(self):
-        # variant_id -> (score, stderr)
-        self.scores: Dict[str, Tuple[float, float]] = {}
+    """Online BT scores, sharded per item with an LRU bound on resident shards.
+
+    A resident shard is the only authoritative copy of its variants' scores; db.scores holds
+    everything else. Evicted shards are written back to db.scores (as are dirty shards on
+    flush()), and a shard is rebuilt lazily from db.scores on its next use. Updates lock only
+    their item's shard, so different items update in parallel.
+    """
+
+    def __init__(self, db: Optional[InMemoryDB] = None, max_shards: Optional[int] = None, max_cov_items: Optional[int] = None):
+        self.db = db if db is not None else default_db
+        self.max_shards = max(1, max_shards or config.bt_max_shards)
+        self.max_cov_items = max(1, max_cov_items or config.bt_max_cov_items)
         # rater_id -> alpha (temperature)
         self.rater_alpha: Dict[str, float] = {}
+        self.scores = ScoresView(self)
+        self.shards: "OrderedDict[str, Shard]" = OrderedDict()
+        # variant_id -> resident shard; entries of a shard change only under that shard's lock
+        self._where: Dict[str, Shard] = {}
+        # guards `shards` (residency and LRU order); taken before any shard lock, never after
+        self._lock = threading.Lock()
+        # item_id -> shard popped from `shards` whose write-back has not finished (under _lock)
+        self._evicting: Dict[str, Shard] = {}
+        self._alpha_lock = threading.Lock()
+        self.evictions = 0
+        # item_id -> {(a, b) with a < b: Var(s_a - s_b)} from the last batch Laplace fit (LRU).
+        # Kept apart from the shards: a refit sets it for every small item without making them
+        # resident, and it survives shard eviction.
+        self._diff_var: "OrderedDict[str, Tuple[Tuple[str, ...], Dict[Tuple[str, str], float]]]" = OrderedDict()
+        # variant_id -> item_id for the items in _diff_var
+        self._diff_var_item: Dict[str, str] = {}
+        self._cov_lock = threading.Lock()
+
+    # Shards
+    def _item_of(self, vid: str) -> str:
+        row = self.db.variants.get(vid)
+        return row["item_id"] if row else ""
+
+    def _acquire(self, vid: str, item_id: Optional[str] = None) -> Shard:
+        """Return the resident shard holding (or owning) `vid`, with its lock held."""
+        while True:
+            victims: List[Shard] = []
+            with self._lock:
+                resident = self._where.get(vid)
+                item = resident.item_id if resident is not None else (item_id if item_id is not None else self._item_of(vid))
+                leaving = self._evicting.get(item)
+                if leaving is not None and not leaving.evicted:
+                    # rebuilding now would read db.scores before the write-back lands
+                    shard = None
+                else:
+                    shard = self.shards.get(item)
+                    if shard is None:
+                        shard = self.shards[item] = Shard(item)
+                        victims = self._evict_over_bound()
+                    else:
+                        self.shards.move_to_end(item)
+            if shard is None:
+                with leaving.lock:  # type: ignore[union-attr]
+                    continue
+            if victims:
+                self._retire(victims)
+            shard.lock.acquire()
+            if not shard.evicted:
+                return shard
+            shard.lock.release()
+
+    def _evict_over_bound(self) -> List[Shard]:
+        """Pop shards over the bound (global lock held). Returns them with their locks held."""
+        victims = []
+        while len(self.shards) > self.max_shards:
+            _, victim = self.shards.popitem(last=False)
+            victim.lock.acquire()
+            self._evicting[victim.item_id] = victim
+            victims.append(victim)
+            self.evictions += 1
+        return victims
 
-    def ensure(self, vid: str):
-        if vid not in self.scores:
-            self.scores[vid] = (0.0, 1.0)
+    def _retire(self, victims: List[Shard]) -> None:
+        """Write back shards from _evict_over_bound and release them, outside the global lock.
 
+        Until a victim is marked evicted its variants stay in `_where`, so readers block on its
+        lock rather than falling back to the db.scores rows it is about to overwrite.
+        """
+        for victim in victims:
+            try:
+                self._write_back(victim)
+                for vid in victim.vids:
+                    if self._where.get(vid) is victim:
+                        del self._where[vid]
+                victim.evicted = True
+            finally:
+                victim.lock.release()
+        with self._lock:
+            for victim in victims:
+                if self._evicting.get(victim.item_id) is victim:
+                    del self._evicting[victim.item_id]
+
+    def _write_back(self, shard: Shard) -> None:
+        if shard.dirty:
+            for i, vid in enumerate(shard.vids):
+                self.db.set_score(vid, *shard.score(i))
+            shard.dirty = False
+
+    def _slot(self, shard: Shard, vid: str) -> int:
+        """Index of `vid` in `shard` (lock held), pulling its stored score in on first use.
+
+        A variant of another item is refused: adopting it would leave a second, stale copy of
+        its score in this shard.
+        """
+        i = shard.index.get(vid)
+        if i is None:
+            owner = self._item_of(vid)
+            if owner and owner != shard.item_id:
+                raise ValueError(f"{vid} belongs to {owner}, not {shard.item_id}")
+            row = self.db.scores.get(vid)
+            s, se = (row["s"], row["stderr"]) if row else (0.0, config.bt_prior ** -0.5)
+            i = shard.index[vid] = len(shard.vids)
+            shard.vids.append(vid)
+            shard.s.append(s)
+            shard.info.append(1.0 / (max(se, 1e-6) ** 2))
+            self._where[vid] = shard
+        return i
+
+    def flush(self) -> int:
+        """Write every dirty resident shard back to db.scores. Returns the number of shards written."""
+        with self._lock:
+            shards = list(self.shards.values())
+        n = 0
+        for shard in shards:
+            with shard.lock:
+                if not shard.evicted and shard.dirty:
+                    self._write_back(shard)
+                    n += 1
+        return n
+
+    def resident(self) -> Dict[str, int]:
+        with self._lock:
+            return {"shards": len(self.shards), "variants": len(self._where), "evictions": self.evictions}
+
+    # Raters
     def set_alpha(self, rater_id: str, alpha: float):
-        self.rater_alpha[rater_id] = alpha
+        with self._alpha_lock:
+            self.rater_alpha[rater_id] = alpha
+
+    def set_alphas(self, alphas: Dict[str, float]):
+        with self._alpha_lock:
+            self.rater_alpha.update(alphas)
+
+    def alphas(self) -> Dict[str, float]:
+        with self._alpha_lock:
+            return dict(self.rater_alpha)
 
     def prob_win(self, sa: float, sb: float, alpha: float = 1.0) -> float:
         # temperature via alpha: larger alpha -> flatter distribution
         return 1.0 / (1.0 + math.exp(-(sa - sb) / max(alpha, 1e-6)))
 
-    def update(self, a: str, b: str, winner: str | None, rater_id: str | None, lr: float = 0.1):
-        self.ensure(a)
-        self.ensure(b)
-        sa, ea = self.scores[a]
-        sb, eb = self.scores[b]
-        alpha = 1.0
-        if rater_id and (rater_id in self.rater_alpha):
-            alpha = self.rater_alpha[rater_id]
-
+    # Updates
+    def _update(self, shard: Shard, a: str, b: str, winner: str | None, rater_id: str | None, lr: float = 0.1):
+        ia = self._slot(shard, a)
+        ib = self._slot(shard, b)
         # handle abstain: nudge towards tie (no update)
         if winner is None:
             return
-
+        alpha = self.rater_alpha.get(rater_id, 1.0) if rater_id else 1.0
+        sa, sb = shard.s[ia], shard.s[ib]
         p = self.prob_win(sa, sb, alpha)
         ya = 1.0 if winner == a else 0.0
-        yb = 1.0 - ya
         # gradient for sa: (ya - p); for sb: (yb - (1-p)) = (yb - 1 + p) = (p - ya)
         g = (ya - p)
-        sa_new = sa + lr * g
-        sb_new = sb - lr * g
+        shard.s[ia] = sa + lr * g
+        shard.s[ib] = sb - lr * g
+        # stderr from accumulated Fisher information
+        fi = comparison_info(p, 1.0 / max(alpha, 1e-6))
+        shard.info[ia] += fi
+        shard.info[ib] += fi
+        shard.dirty = True
 
-        # simple stderr shrinkage with more comparisons
-        ea_new = max(0.05, ea * 0.99)
-        eb_new = max(0.05, eb * 0.99)
-        self.scores[a] = (sa_new, ea_new)
-        self.scores[b] = (sb_new, eb_new)
+    def update(self, a: str, b: str, winner: str | None, rater_id: str | None, lr: float = 0.1, item_id: Optional[str] = None):
+        shard = self._acquire(a, item_id)
+        try:
+            self._update(shard, a, b, winner, rater_id, lr)
+        finally:
+            shard.lock.release()
 
-    def get_scores(self, vids: List[str]) -> Dict[str, Tuple[float, float]]:
+    def apply(
+        self, a: str, b: str, winner: str | None, rater_id: str, alpha: float, item_id: Optional[str] = None
+    ) -> Dict[str, Tuple[float, float]]:
+        """update + read back both scores as one atomic call (one round trip when shared).
+
+        `alpha` is only the initial temperature for a rater BT has not seen; learned values from
+        the reliability job are kept.
+        """
+        with self._alpha_lock:
+            self.rater_alpha.setdefault(rater_id, alpha)
+        shard = self._acquire(a, item_id)
+        try:
+            self._update(shard, a, b, winner, rater_id)
+            return {v: shard.score(self._slot(shard, v)) for v in (a, b)}
+        finally:
+            shard.lock.release()
+
+    def get_scores(self, vids: List[str], item_id: Optional[str] = None) -> Dict[str, Tuple[float, float]]:
         out = {}
+        if item_id is not None and vids:
+            # one item: one shard, locked once
+            shard = self._acquire(vids[0], item_id)
+            try:
+                for v in vids:
+                    out[v] = shard.score(self._slot(shard, v))
+            finally:
+                shard.lock.release()
+            return out
         for v in vids:
-            self.ensure(v)
-            out[v] = self.scores[v]
+            shard = self._acquire(v, item_id)
+            try:
+                out[v] = shard.score(self._slot(shard, v))
+            finally:
+                shard.lock.release()
+        return out
+
+    def seed(self, scores: Dict[str, Tuple[float, float]]):
+        """Replace scores wholesale (batch refit): resident variants in place, the rest in storage."""
+        for v, (s, se) in scores.items():
+            while True:
+                shard = self._where.get(v)
+                if shard is None:
+                    self.db.set_score(v, s, se)
+                    break
+                with shard.lock:
+                    if shard.evicted:
+                        continue
+                    i = shard.index[v]
+                    shard.s[i] = s
+                    shard.info[i] = 1.0 / (max(se, 1e-6) ** 2)
+                    shard.dirty = True
+                    break
+
+    # Batch covariance (small items)
+    def set_covariance(self, vids: List[str], cov: List[List[float]], item_id: Optional[str] = None):
+        """Store pairwise Var(s_a - s_b) from a full (Laplace) covariance over `vids`."""
+        item = item_id if item_id is not None else self._item_of(vids[0])
+        dv: Dict[Tuple[str, str], float] = {}
+        for i, a in enumerate(vids):
+            for j in range(i + 1, len(vids)):
+                b = vids[j]
+                key = (a, b) if a < b else (b, a)
+                dv[key] = max(cov[i][i] + cov[j][j] - 2.0 * cov[i][j], 0.0)
+        with self._cov_lock:
+            self._drop_covariance(item)
+            self._diff_var[item] = (tuple(vids), dv)
+            for v in vids:
+                self._diff_var_item[v] = item
+            while len(self._diff_var) > self.max_cov_items:
+                self._drop_covariance(next(iter(self._diff_var)))
+
+    def _drop_covariance(self, item: str) -> None:
+        entry = self._diff_var.pop(item, None)
+        if entry is not None:
+            for v in entry[0]:
+                if self._diff_var_item.get(v) == item:
+                    del self._diff_var_item[v]
+
+    def diff_vars(self, vids: List[str], item_id: Optional[str] = None) -> Dict[Tuple[str, str], float]:
+        """Batch Var(s_a - s_b) for pairs within `vids` that have one."""
+        out: Dict[Tuple[str, str], float] = {}
+        if not vids:
+            return out
+        with self._cov_lock:
+            item = item_id if item_id is not None else self._diff_var_item.get(vids[0], "")
+            entry = self._diff_var.get(item)
+            if entry is None:
+                return out
+            self._diff_var.move_to_end(item)
+            dv = entry[1]
+            for i, a in enumerate(vids):
+                for b in vids[i + 1 :]:
+                    key = (a, b) if a < b else (b, a)
+                    if key in dv:
+                        out[key] = dv[key]
         return out
 
+
+bt_global: BradleyTerry | None = None
+
+
+def get_bt() -> BradleyTerry:
+    global bt_global
+    if bt_global is None:
+        bt_global = shared("bt", BradleyTerry)
+        if isinstance(bt_global, BradleyTerry):
+            # resident shards are the only copy of their scores: write them out with each snapshot
+            default_db.snapshot_hooks.append(bt_global.flush)
+    return bt_global
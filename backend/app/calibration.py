@@ -0,0 +1,236 @@
+"""Calibration of RM margins into win probabilities, fitted from labeled comparisons.
+
+For a decided comparison the RM margin is d = w . (f_a - f_b) and the outcome y = 1 if a won.
+Two calibrators map d to P(a wins):
+
+- Platt: sigmoid(a * d + b), fitted by Newton's method on the weighted log loss (2x2 Hessian,
+  all comparisons in one vectorized pass), with Platt's smoothed targets (N+ + 1) / (N+ + 2)
+  and (1) / (N- + 2) so separable data keeps finite parameters.
+- Isotonic: the monotone step function minimizing squared error, by pool-adjacent-violators
+  over the sorted margins; served by linear interpolation between block centers.
+
+Each comparison is used once in a fixed orientation, alternating (a, b) and (b, a), so both
+outcomes appear and the Platt offset stays near 0 as the pairwise model implies. Fits are
+stored per rm_version in `calibration_store` (serving) and `db.rm_calibration` (durable).
+
+CalibrationMonitor keeps, per rm_version, reliability bins (count, sum of predicted p, sum of
+outcomes) and an agreement count, updated on each expert label. ECE and RM-vs-expert agreement
+are read from these O(bins) sums, never from a rescan of the log.
+"""
+from __future__ import annotations
+
+import math
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .bt import get_bt
+from .bt_fit import encode_comparisons
+from .config import config
+from .rm import SimpleTextRM, get_rm
+from .shared_state import shared, shared_dict
+from .storage import InMemoryDB, db as default_db
+
+
+class PlattCalibrator:
+    def __init__(self, a: float = 1.0, b: float = 0.0):
+        self.a = a
+        self.b = b
+
+    def calibrate(self, z: float) -> float:
+        return 1.0 / (1.0 + math.exp(-(self.a * z + self.b)))
+
+    def calibrate_many(self, z: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-(self.a * z + self.b)))
+
+    def params(self) -> Dict[str, Any]:
+        return {"a": self.a, "b": self.b}
+
+
+class IsotonicCalibrator:
+    def __init__(self, x: list, y: list):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+
+    def calibrate(self, z: float) -> float:
+        return float(np.interp(z, self.x, self.y))
+
+    def calibrate_many(self, z: np.ndarray) -> np.ndarray:
+        return np.interp(z, self.x, self.y)
+
+    def params(self) -> Dict[str, Any]:
+        return {"x": self.x.tolist(), "y": self.y.tolist()}
+
+
+def make_calibrator(method: str, params: Dict[str, Any]):
+    if method == "isotonic":
+        return IsotonicCalibrator(params["x"], params["y"])
+    return PlattCalibrator(float(params.get("a", 1.0)), float(params.get("b", 0.0)))
+
+
+def fit_platt(d: np.ndarray, y: np.ndarray, w: Optional[np.ndarray] = None, max_iter: int = 50, tol: float = 1e-10) -> Tuple[float, float]:
+    """Platt scaling by Newton's method. Returns (a, b) with P(y=1 | d) = sigmoid(a d + b)."""
+    w = np.ones_like(d) if w is None else w
+    pos, neg = float(w[y > 0.5].sum()), float(w[y <= 0.5].sum())
+    t = np.where(y > 0.5, (pos + 1.0) / (pos + 2.0), 1.0 / (neg + 2.0))
+    x = np.column_stack([d, np.ones_like(d)])
+    theta = np.array([1.0, 0.0])
+    for _ in range(max_iter):
+        p = 1.0 / (1.0 + np.exp(-(x @ theta)))
+        g = x.T @ (w * (p - t))
+        h = (x * (w * p * (1.0 - p))[:, None]).T @ x + 1e-9 * np.eye(2)
+        step = np.linalg.solve(h, g)
+        theta -= step
+        if np.abs(step).max() < tol:
+            break
+    return float(theta[0]), float(theta[1])
+
+
+def fit_isotonic(d: np.ndarray, y: np.ndarray, w: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Pool-adjacent-violators. Returns (block centers, block means), both nondecreasing."""
+    w = np.ones_like(d) if w is None else w
+    order = np.argsort(d, kind="stable")
+    xs, ys, ws = d[order], y[order], w[order]
+    # blocks as parallel stacks: weighted sum of y, weight, weighted sum of x
+    sy, sw, sx = [], [], []
+    for xi, yi, wi in zip(xs.tolist(), ys.tolist(), ws.tolist()):
+        sy.append(yi * wi)
+        sw.append(wi)
+        sx.append(xi * wi)
+        # pool on a violation, and ties in d (one block per distinct margin)
+        while len(sy) > 1 and (sy[-2] * sw[-1] >= sy[-1] * sw[-2] or sx[-2] * sw[-1] >= sx[-1] * sw[-2]):
+            y_last, w_last, x_last = sy.pop(), sw.pop(), sx.pop()
+            sy[-1] += y_last
+            sw[-1] += w_last
+            sx[-1] += x_last
+    wts = np.maximum(np.asarray(sw), 1e-12)
+    return np.asarray(sx) / wts, np.asarray(sy) / wts
+
+
+def calibration_data(db: InMemoryDB, alphas: Dict[str, float], rm: SimpleTextRM) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(RM margin, outcome, trust weight) per decided comparison, orientation alternating."""
+    vids, win, lose, wt = encode_comparisons(db.comparisons.values(), alphas)
+    rows = [db.variants.get(v) for v in vids]
+    z = rm.feature_matrix([(r or {}).get("features_json") or {} for r in rows]) @ rm.w
+    known = np.array([r is not None for r in rows], dtype=bool)
+    keep = known[win] & known[lose] if len(vids) else np.zeros(0, dtype=bool)
+    d = z[win[keep]] - z[lose[keep]]
+    y = np.ones(len(d))
+    d[1::2] *= -1.0
+    y[1::2] = 0.0
+    return d, y, wt[keep]
+
+
+def expected_calibration_error(p: np.ndarray, y: np.ndarray, bins: int = 10) -> float:
+    b = np.minimum((p * bins).astype(np.intp), bins - 1)
+    n = np.bincount(b, minlength=bins)
+    gap = np.abs(np.bincount(b, p, bins) - np.bincount(b, y, bins))
+    return float(gap.sum() / max(n.sum(), 1))
+
+
+class CalibrationMonitor:
+    """Per rm_version reliability bins and RM-vs-expert agreement, updated one label at a time."""
+
+    def __init__(self, bins: int = 10):
+        self.bins = bins
+        self._state: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, rm_version: str, p: float, y: float) -> None:
+        """One labeled outcome y (1 = a won) for which the calibrated RM predicted P(a wins) = p."""
+        b = min(int(p * self.bins), self.bins - 1)
+        with self._lock:
+            # rows: count, sum p, sum y per bin; [3, 0] agreements
+            s = self._state.get(rm_version)
+            if s is None:
+                s = self._state[rm_version] = np.zeros((4, self.bins))
+            s[0, b] += 1.0
+            s[1, b] += p
+            s[2, b] += y
+            s[3, 0] += float((p > 0.5) == (y > 0.5))
+
+    def reset(self, rm_version: str) -> None:
+        with self._lock:
+            self._state.pop(rm_version, None)
+
+    def snapshot(self, rm_version: str) -> Dict[str, Any]:
+        with self._lock:
+            s = self._state.get(rm_version)
+            if s is None or s[0].sum() == 0:
+                return {"n": 0, "ece": None, "agreement_rate": None}
+            n = float(s[0].sum())
+            return {
+                "n": int(n),
+                "ece": float(np.abs(s[1] - s[2]).sum() / n),
+                "agreement_rate": float(s[3, 0] / n),
+            }
+
+
+calibration_monitor = shared("calibration_monitor", CalibrationMonitor)
+
+# rm_version -> {"method", "params", "fitted_at", "n", "obj"}; filled from db.rm_calibration on
+# first use of a version, identity Platt until one is fitted
+calibration_store: Dict[str, Dict[str, Any]] = shared_dict("calibration_store")
+
+
+def get_calibrator(rm_version: str, db: Optional[InMemoryDB] = None):
+    art = calibration_store.get(rm_version)
+    if art and art.get("obj"):
+        return art["obj"]
+    # a fit saved before a restart, else the identity
+    db = db if db is not None else default_db
+    rec = db.rm_calibration.get(rm_version)
+    if rec:
+        cal = make_calibrator(rec["method"], rec["params"])
+        calibration_store[rm_version] = dict(rec, obj=cal)
+        return cal
+    cal = PlattCalibrator(1.0, 0.0)
+    calibration_store[rm_version] = {"method": "platt", "params": {"a": 1.0, "b": 0.0}, "obj": cal}
+    return cal
+
+
+def fit_calibration(
+    rm_version: Optional[str] = None,
+    method: Optional[str] = None,
+    db: Optional[InMemoryDB] = None,
+    alphas: Optional[Dict[str, float]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Fit `method` (default config.calibration_method) for `rm_version` (default current) and
+    install it. Returns the stored record, or None if there are no labeled comparisons."""
+    db = db if db is not None else default_db
+    rm = get_rm(config.allowed_reason_tags, rm_version)
+    method = method or config.calibration_method
+    d, y, w = calibration_data(db, alphas if alphas is not None else get_bt().alphas(), rm)
+    if len(d) == 0:
+        return None
+    if method == "isotonic":
+        cal: Any = IsotonicCalibrator(*fit_isotonic(d, y, w))
+    else:
+        method = "platt"
+        cal = PlattCalibrator(*fit_platt(d, y, w))
+    p = cal.calibrate_many(d)
+    record = {
+        "rm_version": rm.version,
+        "method": method,
+        "params": cal.params(),
+        "fitted_at": db.now(),
+        "n": int(len(d)),
+        "ece_fit": expected_calibration_error(p, y),
+    }
+    db.set_calibration(rm.version, record)
+    calibration_store[rm.version] = dict(record, obj=cal)
+    calibration_monitor.reset(rm.version)
+    return record
+
+
+def observe_label(a_id: str, b_id: str, winner_id: str, db: Optional[InMemoryDB] = None) -> None:
+    """Score an expert-labeled pair with the current RM and add it to the monitor."""
+    db = db if db is not None else default_db
+    va, vb = db.variants.get(a_id), db.variants.get(b_id)
+    if va is None or vb is None:
+        return
+    rm = get_rm(config.allowed_reason_tags)
+    d = rm.score_feats(rm.features(va.get("features_json") or {})) - rm.score_feats(rm.features(vb.get("features_json") or {}))
+    p = get_calibrator(rm.version, db).calibrate(d)
+    calibration_monitor.observe(rm.version, p, 1.0 if winner_id == a_id else 0.0)
@@ -40,9 +40,75 @@ class Config:
             "hi_conf_margin": 0.15,
         }
     )
+    # streaming sessions whose last snippet is kept for incremental featurization (per process, LRU)
+    stream_docs_max: int = field(default_factory=lambda: int(os.getenv("STREAM_DOCS_MAX", "4096")))
+
+    # Storage backend: "memory" (InMemoryDB) or "sqlite" (SQLiteDB, for datasets larger than RAM)
+    storage_backend: str = field(default_factory=lambda: os.getenv("STORAGE_BACKEND", "memory").lower())
+    sqlite_path: str = field(default_factory=lambda: os.getenv("SQLITE_PATH", "evdojo.db"))
+    sqlite_read_pool: int = field(default_factory=lambda: int(os.getenv("SQLITE_READ_POOL", "4")))
+    sqlite_max_batch: int = 256
+
+    # Durability: WAL + snapshots of the in-memory store (disabled when STORAGE_DIR is unset)
+    storage_dir: str | None = field(default_factory=lambda: os.getenv("STORAGE_DIR") or None)
+    snapshot_interval_s: float = field(default_factory=lambda: float(os.getenv("SNAPSHOT_INTERVAL_S", "300")))
+    wal_fsync: bool = field(default_factory=lambda: os.getenv("WAL_FSYNC", "false").lower() in ("1", "true", "yes", "on"))
+
+    # Batch BT refit over the comparisons log (0 disables the background job)
+    bt_refit_interval_s: float = field(default_factory=lambda: float(os.getenv("BT_REFIT_INTERVAL_S", "300")))
+    # precision of the N(0, 1/bt_prior) prior on every BT score: a new variant starts online at
+    # stderr 1/sqrt(bt_prior), and the batch fit uses the same prior
+    bt_prior: float = 1.0
+    # Online BT: items whose shard stays in memory (LRU); colder ones live only in db.scores
+    bt_max_shards: int = field(default_factory=lambda: int(os.getenv("BT_MAX_SHARDS", "10000")))
+    # rater accuracy that maps to BT alpha 1 in the reliability EM
+    reliability_ref_accuracy: float = 0.8
+    # items with at most this many variants also get a full Laplace covariance at each refit
+    bt_laplace_max_variants: int = 32
+    # items whose Laplace difference variances are kept (LRU, independent of resident shards)
+    bt_max_cov_items: int = field(default_factory=lambda: int(os.getenv("BT_MAX_COV_ITEMS", "50000")))
+    # /next_duel: "info_gain" (scheduler.py heap) or "thompson" (bandit.pick_next_duel)
+    duel_policy: str = field(default_factory=lambda: os.getenv("DUEL_POLICY", "info_gain"))
+    scheduler_max_items: int = 10000
+    # a duel pair is resolved once |s_a - s_b| / sd(s_a - s_b) reaches this z
+    duel_resolved_z: float = 2.0
+
+    # Multi-worker: address of the shared state coordinator ("host:port" or a unix socket path)
+    state_server: str | None = field(default_factory=lambda: os.getenv("STATE_SERVER") or None)
+    state_authkey: str = field(default_factory=lambda: os.getenv("STATE_AUTHKEY", "evdojo"))
+
+    # Retention: TTL (seconds) and max-size bounds, enforced a few rows at a time on write
+    retention: Dict[str, Dict[str, float]] = field(
+        default_factory=lambda: {
+            "stream_events": {"ttl_s": 7 * 86400, "max_rows": 1_000_000},
+            "idempotency": {"ttl_s": 86400, "max_rows": 200_000},
+            "stream_sessions": {"ttl_s": 3600, "max_rows": 200_000},
+        }
+    )
+    retention_sweep_batch: int = 32
+
+    # Built /rank responses kept per process (LRU)
+    rank_cache_size: int = 4096
+    # Text featurization results kept per process (LRU by content hash), bounded by count and bytes
+    feature_cache_size: int = field(default_factory=lambda: int(os.getenv("FEATURE_CACHE_SIZE", "65536")))
+    feature_cache_max_bytes: int = field(default_factory=lambda: int(os.getenv("FEATURE_CACHE_MAX_BYTES", str(64 << 20))))
 
     # Default RM version
     rm_version: str = "v1"
+    # POST /rm/train/batch defaults (mini-batch SGD over the comparisons log)
+    rm_train_epochs: int = 5
+    rm_train_batch_size: int = 256
+    rm_train_lr: float = 0.5
+    # RM registry: saved models (default STORAGE_DIR/rm; unset with no STORAGE_DIR = not saved)
+    rm_registry_dir: str | None = field(
+        default_factory=lambda: os.getenv("RM_REGISTRY_DIR")
+        or (os.path.join(os.environ["STORAGE_DIR"], "rm") if os.getenv("STORAGE_DIR") else None)
+    )
+    rm_registry_keep: int = 8
+    # calibrator fitted by POST /rm/calibration/fit and after each training job: platt | isotonic
+    calibration_method: str = field(default_factory=lambda: os.getenv("CALIBRATION_METHOD", "platt"))
+    # share of users (by hashed user_id) served a newly trained RM before it is promoted; 0 = promote at once
+    rm_canary_fraction: float = field(default_factory=lambda: float(os.getenv("RM_CANARY_FRACTION", "0")))
 
     # Debug/demo controls
     debug_demo: bool = field(default_factory=lambda: os.getenv("DEBUG_DEMO", "false").lower() in ("1", "true", "yes", "on"))
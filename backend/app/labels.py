@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+from .bt import get_bt
+from .calibration import observe_label
+from .rank_cache import item_versions
+from .scheduler import duel_scheduler, expert_queue
+from .storage import db
+
+
+def record_comparison(
+    item_id: str,
+    a_id: str,
+    b_id: str,
+    winner_id: Optional[str],
+    judge_type: str,
+    rater_id: Optional[str],
+    tags: List[str],
+    abstain: bool,
+    confidence: Optional[float],
+    alpha: float,
+    bt_rater_id: Optional[str] = None,
+    pair_id: Optional[str] = None,
+) -> Optional[str]:
+    """Atomically apply one judgement: BT update, comparison row, pair label.
+
+    Runs under the item's transaction lock so concurrent labels on the same item cannot lose BT
+    updates or label a pair twice. Returns the new comparison id, or None if `pair_id` was
+    already labeled by someone else.
+    """
+    bt = get_bt()
+    bt_rater = bt_rater_id or rater_id or f"{judge_type}_default"
+    with db.transaction(item_id):
+        if pair_id is not None and db.pairs[pair_id].get("labeled"):
+            return None
+        scores = {}
+        if winner_id is not None:
+            scores = bt.apply(a_id, b_id, winner_id, bt_rater, alpha, item_id=item_id)
+            duel_scheduler.on_label(item_id, scores)
+            item_versions.bump(item_id)
+        if pair_id is not None:
+            db.mark_pair_labeled(pair_id, abstain=winner_id is None)
+        expert_queue.on_label(item_id, scores, pair_id)
+        cid = db.create_comparison(
+            item_id=item_id,
+            a_id=a_id,
+            b_id=b_id,
+            winner_id=winner_id,
+            judge_type=judge_type,
+            rater_id=rater_id,
+            tags=tags,
+            abstain=abstain,
+            confidence=confidence,
+        )
+    if judge_type == "expert" and winner_id is not None:
+        # RM-vs-expert reliability bins for /metrics/stream (outside the item lock)
+        observe_label(a_id, b_id, winner_id, db)
+    return cid
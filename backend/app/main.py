@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 try:
@@ -9,10 +11,40 @@ from fastapi.staticfiles import StaticFiles
 from .routers import items, variants, rank, compare, duel, rm, judge, expert, moderate, abuse, metrics, debug, topics, import_emails, expert_pairs, users, health
 from .config import config
 from .middleware import RequestIDMiddleware
+from .storage import db
+from .persistence import open_persistence
+from .shared_state import is_remote
+from .bt_fit import Refitter
+from .rm_train import rm_trainer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    persistence = None
+    refitter = None
+    if config.storage_dir and config.storage_backend == "memory":
+        persistence = open_persistence(db, config.storage_dir, config.snapshot_interval_s, config.wal_fsync)
+    if is_remote():
+        if config.storage_backend == "memory":
+            raise RuntimeError("STATE_SERVER (multi-worker) requires STORAGE_BACKEND=sqlite")
+    else:
+        # with a coordinator, the refit runs there once instead of in every worker
+        refitter = Refitter(config.bt_refit_interval_s)
+        refitter.start()
+    yield
+    rm_trainer.close()
+    if refitter is not None:
+        refitter.close()
+        # BT shards hold the only copy of their scores until written back
+        compare.bt.flush()
+    if persistence is not None:
+        persistence.close()
+    if hasattr(db, "close"):
+        db.close()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="Comparative Coaching Platform (MVP)")
+    app = FastAPI(title="Comparative Coaching Platform (MVP)", lifespan=lifespan)
     if ProxyHeadersMiddleware is not None:
         app.add_middleware(ProxyHeadersMiddleware, trusted_hosts="*")
     app.add_middleware(RequestIDMiddleware)
@@ -30,8 +62,9 @@ def create_app() -> FastAPI:
     app.include_router(duel.router)
     app.include_router(rm.router)
     app.include_router(judge.router)
-    app.include_router(expert.router)
+    # pair-based /expert/queue and /expert/label first: the frontends use these
     app.include_router(expert_pairs.router)
+    app.include_router(expert.router)
     app.include_router(moderate.router)
     app.include_router(abuse.router)
     app.include_router(metrics.router)
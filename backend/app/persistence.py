@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import glob
+import mmap
+import os
+import pickle
+import struct
+import threading
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+from .storage import InMemoryDB
+
+
+# record header: payload length, crc32 of payload
+_HEADER = struct.Struct("<II")
+_PROTOCOL = 5
+
+
+def _segment_path(directory: str, n: int) -> str:
+    return os.path.join(directory, f"wal-{n:08d}.log")
+
+
+def _snapshot_path(directory: str, n: int) -> str:
+    return os.path.join(directory, f"snapshot-{n:08d}.pkl")
+
+
+def _numbered(directory: str, prefix: str, suffix: str) -> List[Tuple[int, str]]:
+    out = []
+    for path in glob.glob(os.path.join(directory, f"{prefix}-*{suffix}")):
+        name = os.path.basename(path)[len(prefix) + 1 : -len(suffix)]
+        if name.isdigit():
+            out.append((int(name), path))
+    return sorted(out)
+
+
+class WriteAheadLog:
+    """Append-only, length-prefixed log split into numbered segments.
+
+    Each record is `<len><crc32><pickle>`; a torn or corrupt tail ends replay of that segment.
+    """
+
+    def __init__(self, directory: str, segment: int, fsync: bool = False):
+        self.directory = directory
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self.segment = segment
+        self._f = open(_segment_path(directory, segment), "ab")
+
+    def append(self, record: tuple) -> None:
+        payload = pickle.dumps(record, protocol=_PROTOCOL)
+        buf = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            self._f.write(buf)
+            self._f.flush()
+            if self.fsync:
+                os.fsync(self._f.fileno())
+
+    def rotate(self) -> int:
+        """Start a new segment; returns its number. Records before it belong to older segments."""
+        with self._lock:
+            self._f.close()
+            self.segment += 1
+            self._f = open(_segment_path(self.directory, self.segment), "ab")
+            return self.segment
+
+    def close(self) -> None:
+        with self._lock:
+            self._f.close()
+
+    @staticmethod
+    def read(path: str) -> Iterator[tuple]:
+        with open(path, "rb") as f:
+            data = f.read()
+        pos, end = 0, len(data)
+        while pos + _HEADER.size <= end:
+            size, crc = _HEADER.unpack_from(data, pos)
+            start = pos + _HEADER.size
+            payload = data[start : start + size]
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                return
+            yield pickle.loads(payload)
+            pos = start + size
+
+
+class Persistence:
+    """WAL + periodic snapshots for an InMemoryDB.
+
+    A snapshot `snapshot-N.pkl` holds the full state as of the start of WAL segment N, so startup
+    loads the newest snapshot and replays only segments >= N.
+    """
+
+    def __init__(self, db: InMemoryDB, directory: str, interval_s: float = 300.0, fsync: bool = False):
+        self.db = db
+        self.directory = directory
+        self.interval_s = interval_s
+        self.fsync = fsync
+        self.wal: Optional[WriteAheadLog] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._snap_lock = threading.Lock()
+
+    def open(self) -> int:
+        """Restore state from disk and attach the WAL. Returns the number of replayed records."""
+        os.makedirs(self.directory, exist_ok=True)
+        base = 0
+        snaps = _numbered(self.directory, "snapshot", ".pkl")
+        if snaps:
+            base, path = snaps[-1]
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self.db.load_state(pickle.loads(mm))
+        replayed = 0
+        last = base
+        for n, path in _numbered(self.directory, "wal", ".log"):
+            if n < base:
+                continue
+            for record in WriteAheadLog.read(path):
+                self.db.replay(record)
+                replayed += 1
+            last = n
+        # never append after a possibly torn tail: continue in a fresh segment
+        self.wal = WriteAheadLog(self.directory, last + 1, fsync=self.fsync)
+        self.db._wal = self.wal
+        return replayed
+
+    def snapshot(self) -> str:
+        assert self.wal is not None, "open() first"
+        with self._snap_lock:
+            for hook in self.db.snapshot_hooks:
+                hook()
+            with self.db.write_barrier():
+                segment = self.wal.rotate()
+                state = self.db.state()
+            path = _snapshot_path(self.directory, segment)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f, protocol=_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            self._prune(segment)
+            return path
+
+    def _prune(self, keep_from: int) -> None:
+        for n, path in _numbered(self.directory, "snapshot", ".pkl"):
+            if n < keep_from:
+                os.remove(path)
+        for n, path in _numbered(self.directory, "wal", ".log"):
+            if n < keep_from:
+                os.remove(path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.snapshot()
+
+    def start(self) -> None:
+        if self.interval_s > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-snapshot", daemon=True)
+            self._thread.start()
+
+    def close(self, snapshot: bool = True) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.wal is not None:
+            if snapshot:
+                self.snapshot()
+            self.db._wal = None
+            self.wal.close()
+            self.wal = None
+
+
+def open_persistence(db: InMemoryDB, directory: str, interval_s: float = 300.0, fsync: bool = False) -> Persistence:
+    p = Persistence(db, directory, interval_s=interval_s, fsync=fsync)
+    p.open()
+    p.start()
+    return p
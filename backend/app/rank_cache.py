@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import re
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .bt import get_bt
+from .config import config
+from .schemas import RankResponse, RankResponseEntry
+from .shared_state import shared
+
+
+class ItemVersions:
+    """Per-item counters bumped whenever an item's scores can change (labels, new variants, refit).
+
+    `epoch` is fresh per process start, so ETags from before a restart never match.
+    """
+
+    def __init__(self):
+        self.epoch = secrets.token_hex(4)
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, item_id: str) -> None:
+        with self._lock:
+            self._versions[item_id] = self._versions.get(item_id, 0) + 1
+
+    def bump_many(self, item_ids: Iterable[str]) -> None:
+        with self._lock:
+            for item_id in item_ids:
+                self._versions[item_id] = self._versions.get(item_id, 0) + 1
+
+    def etag(self, item_id: str) -> str:
+        with self._lock:
+            return f'W/"{self.epoch}-{self._versions.get(item_id, 0)}"'
+
+
+item_versions = shared("item_versions", ItemVersions)
+
+_ENTITY_TAG = re.compile(r'(?:W/)?"([^"]*)"')
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match evaluation (RFC 9110 13.1.2) for an existing resource whose tag is `etag`:
+    `*`, or any listed entity-tag equal under weak comparison (the W/ prefix is ignored)."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = _ENTITY_TAG.search(etag)
+    return opaque is not None and opaque.group(1) in _ENTITY_TAG.findall(if_none_match)
+
+
+def win_prob_matrix(scores: np.ndarray) -> np.ndarray:
+    """P[i, j] = P(variant i beats variant j) = sigmoid(s_i - s_j), in one vectorized pass."""
+    return 1.0 / (1.0 + np.exp(scores[None, :] - scores[:, None]))
+
+
+def build_rank(item_id: str, vids: List[str], with_win_probs: bool) -> RankResponse:
+    scores = get_bt().get_scores(vids, item_id)
+    s = np.array([scores[v][0] for v in vids], dtype=np.float64)
+    se = [scores[v][1] for v in vids]
+    order = np.argsort(-s, kind="stable")
+    ranked = [vids[i] for i in order]
+    rows: List[Optional[Dict[str, float]]] = [None] * len(vids)
+    if with_win_probs:
+        p = win_prob_matrix(s[order]).tolist()
+        rows = [dict(zip(ranked, row)) for row in p]
+    return RankResponse(
+        item_id=item_id,
+        ranking=[
+            RankResponseEntry(variant_id=vids[i], score=float(s[i]), stderr=se[i], win_prob_row=rows[k])
+            for k, i in enumerate(order)
+        ],
+    )
+
+
+class RankCache:
+    """Per-process LRU of built RankResponses, keyed by (item_id, with_win_probs) and tagged by ETag."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, bool], Tuple[str, RankResponse]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, bool], etag: str) -> Optional[RankResponse]:
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None or hit[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return hit[1]
+
+    def put(self, key: Tuple[str, bool], etag: str, resp: RankResponse) -> None:
+        with self._lock:
+            self._entries[key] = (etag, resp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+rank_cache = RankCache(config.rank_cache_size)
@@ -0,0 +1,191 @@
+"""Rater reliability from the comparisons log (Dawid–Skene style EM, two-class).
+
+Each unordered pair (a, b) has a latent answer "a is better" or "b is better"; each rater has
+an accuracy q_r, the probability their vote matches that answer. EM alternates
+
+    E: P(a better | votes) = sigmoid(sum_k ±logit(q_r(k)))   (gold pairs are fixed)
+    M: q_r = (agreeing posterior mass + a0) / (votes + a0 + b0)
+
+vectorized with np.bincount over the raters x comparisons incidence. Votes are appended
+incrementally (a comparison labeled or relabeled later replaces its vote) and EM warm-starts from
+the previous accuracies, so each run only pays for a few sweeps. Accuracy maps to a BT temperature by matching log-odds against a reference rater:
+alpha_r = logit(ref_accuracy) / logit(q_r), so a 0.8-accurate rater gets alpha 1 and a rater at
+chance gets the maximum alpha (their votes barely move scores).
+"""
+from __future__ import annotations
+
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .bt import BradleyTerry, get_bt
+from .config import config
+from .storage import InMemoryDB, db as default_db
+
+
+def rater_key(row: Any) -> str:
+    """The rater id BT uses for a comparison row (same fallback as labels.record_comparison)."""
+    return row.get("rater_id") or f"{row.get('judge_type')}_default"
+
+
+class ReliabilityEM:
+    def __init__(
+        self,
+        prior_correct: float = 4.0,
+        prior_wrong: float = 1.0,
+        ref_accuracy: float = 0.8,
+        alpha_bounds: Tuple[float, float] = (0.25, 10.0),
+    ):
+        self.a0, self.b0 = prior_correct, prior_wrong
+        self.ref_logit = float(np.log(ref_accuracy / (1.0 - ref_accuracy)))
+        self.alpha_bounds = alpha_bounds
+        self.cursor = 0
+        # position in db.comparison_updates_since
+        self.update_cursor = 0
+        self.raters: List[str] = []
+        self.rater_type: List[str] = []
+        self._rater_index: Dict[str, int] = {}
+        self._pair_index: Dict[Tuple[str, str], int] = {}
+        # one entry per vote: rater, pair, 1 if the vote is for the pair's first (smaller) id,
+        # and the comparison number it came from
+        self._r = array("i")
+        self._j = array("i")
+        self._y = array("b")
+        self._c = array("q")
+        self.q = np.zeros(0)
+        self._lock = threading.Lock()
+
+    @property
+    def votes(self) -> int:
+        return len(self._r)
+
+    def _pair(self, a: str, b: str) -> Tuple[int, bool]:
+        key = (a, b) if a < b else (b, a)
+        j = self._pair_index.setdefault(key, len(self._pair_index))
+        return j, key[0] == a
+
+    def _vote(self, c: Any) -> Optional[Tuple[int, int, int]]:
+        """(rater, pair, y) of a decided comparison row, else None."""
+        a, b, w = c["a_id"], c["b_id"], c["winner_id"]
+        if w is None or c.get("abstain") or w not in (a, b):
+            return None
+        key = rater_key(c)
+        r = self._rater_index.get(key)
+        if r is None:
+            r = self._rater_index[key] = len(self.raters)
+            self.raters.append(key)
+            self.rater_type.append(c.get("judge_type") or "crowd")
+        j, _ = self._pair(a, b)
+        return r, j, 1 if w == min(a, b) else 0
+
+    def ingest(self, rows: Iterable[Any]) -> int:
+        n = 0
+        for c in rows:
+            vote = self._vote(c)
+            if vote is None:
+                continue
+            self._r.append(vote[0])
+            self._j.append(vote[1])
+            self._y.append(vote[2])
+            self._c.append(int(c["id"].rsplit("_", 1)[1]))
+            n += 1
+        return n
+
+    def reingest(self, rows: Iterable[Any]) -> int:
+        """Ingest rows that may already have a vote: it is replaced, or dropped if the row is no
+        longer decided. One pass over the votes for the whole batch."""
+        by_num = {int(c["id"].rsplit("_", 1)[1]): c for c in rows}
+        if not by_num:
+            return 0
+        # a copy: the vote arrays are resized below, which a live buffer view would block
+        c_all = np.array(self._c, dtype=np.int64)
+        hit = np.flatnonzero(np.isin(c_all, np.fromiter(by_num, dtype=np.int64, count=len(by_num))))
+        at = dict(zip(c_all[hit].tolist(), hit.tolist()))
+        drop = []
+        for num, c in by_num.items():
+            i = at.get(num)
+            if i is None:
+                self.ingest([c])
+                continue
+            vote = self._vote(c)
+            if vote is None:
+                drop.append(i)
+            else:
+                self._r[i], self._j[i], self._y[i] = vote
+        # the last vote takes a dropped one's place; highest first, so no vote still to drop moves
+        for i in sorted(drop, reverse=True):
+            for col in (self._r, self._j, self._y, self._c):
+                col[i] = col[-1]
+                col.pop()
+        return len(by_num)
+
+    def fit(self, gold: Iterable[Any] = (), max_iter: int = 50, tol: float = 1e-5) -> np.ndarray:
+        """Run EM to convergence from the previous accuracies; returns q per rater."""
+        n_r, n_j = len(self.raters), len(self._pair_index)
+        r = np.frombuffer(self._r, dtype=np.int32) if len(self._r) else np.zeros(0, dtype=np.int32)
+        j = np.frombuffer(self._j, dtype=np.int32) if len(self._j) else np.zeros(0, dtype=np.int32)
+        sign = np.frombuffer(self._y, dtype=np.int8).astype(np.float64) * 2.0 - 1.0 if len(self._y) else np.zeros(0)
+        gold_j, gold_first = [], []
+        for g in gold:
+            a, b = g["a_id"], g["b_id"]
+            # only pairs that have votes; a read never adds pairs
+            jj = self._pair_index.get((a, b) if a < b else (b, a))
+            if jj is not None:
+                gold_j.append(jj)
+                gold_first.append(1.0 if (g["winner_id"] == a) == (a < b) else 0.0)
+        gold_j_arr, gold_t = np.asarray(gold_j, dtype=np.intp), np.asarray(gold_first)
+
+        prior_q = self.a0 / (self.a0 + self.b0)
+        q = np.full(n_r, prior_q)
+        q[: len(self.q)] = self.q
+        votes = np.bincount(r, minlength=n_r)
+        for _ in range(max_iter):
+            lo = np.log(q / (1.0 - q))
+            t = 1.0 / (1.0 + np.exp(-np.bincount(j, weights=sign * lo[r], minlength=n_j)))
+            t[gold_j_arr] = gold_t
+            agree = np.where(sign > 0, t[j], 1.0 - t[j])
+            new = (np.bincount(r, weights=agree, minlength=n_r) + self.a0) / (votes + self.a0 + self.b0)
+            delta = np.max(np.abs(new - q)) if n_r else 0.0
+            q = new
+            if delta < tol:
+                break
+        self.q = q
+        return q
+
+    def alphas(self) -> Dict[str, float]:
+        lo, hi = self.alpha_bounds
+        logit = np.log(self.q / (1.0 - self.q))
+        alpha = np.where(logit > 1e-3, self.ref_logit / np.maximum(logit, 1e-3), hi)
+        return {rid: float(a) for rid, a in zip(self.raters, np.clip(alpha, lo, hi))}
+
+    def update(self, db: InMemoryDB, bt: BradleyTerry) -> Dict[str, float]:
+        """Ingest new comparisons, refit, and publish alpha to BT and alpha/trust to db.raters."""
+        with self._lock:
+            # updates first: one made while new rows are read is in them or is read next time
+            updated, self.update_cursor = db.comparison_updates_since(self.update_cursor)
+            rows, self.cursor = db.comparisons_since(self.cursor)
+            self.ingest(rows)
+            # updates to rows read just now are already in them
+            fresh = {c["id"] for c in rows}
+            self.reingest([c for c in updated if c["id"] not in fresh])
+            if not self.raters:
+                return {}
+            q = self.fit(list(db.gold_pairs.values()))
+            alphas = self.alphas()
+        bt.set_alphas(alphas)
+        for i, rid in enumerate(self.raters):
+            prev = db.raters.get(rid)
+            if prev is not None and abs(prev["alpha"] - alphas[rid]) < 1e-3 and abs(prev["trust"] - q[i]) < 1e-3:
+                continue
+            domain = prev["domain"] if prev is not None else "general"
+            db.upsert_rater(rid, self.rater_type[i], domain, alphas[rid], float(q[i]))
+        return alphas
+
+
+reliability = ReliabilityEM(ref_accuracy=config.reliability_ref_accuracy)
+
+
+def update_reliability(db: Optional[InMemoryDB] = None, bt: Optional[BradleyTerry] = None) -> Dict[str, float]:
+    return reliability.update(db if db is not None else default_db, bt if bt is not None else get_bt())
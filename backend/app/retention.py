@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .config import config
+
+
+class Retention:
+    """TTL + max-size bounds for append-mostly tables, applied incrementally on write.
+
+    Each sweep evicts at most `batch` of the oldest entries, so there is never a global pause;
+    as long as writes outpace expiry by less than `batch`x, tables stay within bounds.
+    """
+
+    def __init__(self, policies: Dict[str, Dict[str, float]], batch: int = 32):
+        self.policies = policies
+        self.batch = batch
+        self.evicted: Dict[str, int] = {name: 0 for name in policies}
+
+    def sweep(
+        self,
+        table: str,
+        oldest: Callable[[], Optional[Tuple[Any, float]]],
+        evict: Callable[[Any], None],
+        size: Callable[[], int],
+        now: Optional[float] = None,
+    ) -> int:
+        """Evict from the head of `table` while the oldest entry is expired or the table is too big.
+
+        `oldest()` returns (key, timestamp) of the oldest entry or None; `evict(key)` removes it.
+        """
+        policy = self.policies.get(table)
+        if not policy:
+            return 0
+        ttl = policy.get("ttl_s")
+        max_rows = policy.get("max_rows")
+        cutoff = (now if now is not None else time.time()) - ttl if ttl else None
+        n = 0
+        while n < self.batch:
+            head = oldest()
+            if head is None:
+                break
+            key, ts = head
+            if not ((max_rows is not None and size() > max_rows) or (cutoff is not None and ts < cutoff)):
+                break
+            evict(key)
+            n += 1
+        if n:
+            self.evicted[table] = self.evicted.get(table, 0) + n
+        return n
+
+
+retention = Retention(config.retention, batch=config.retention_sweep_batch)
@@ -1,13 +1,50 @@
 from __future__ import annotations
 
-import math
-from typing import Dict, Any, List, Tuple
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from multiprocessing.managers import AcquirerProxy
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .config import config
+from .shared_state import is_remote, shared, shared_dict
+
+
+# fixed feature schema: position i of every feature vector and weight vector
+FEATURES: Tuple[str, ...] = (
+    "bias",
+    "length",
+    "words",
+    "hedges",
+    "question_marks",
+    "exclamations",
+    "specificity_markers",
+)
+_INDEX = {k: i for i, k in enumerate(FEATURES)}
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-z))
 
 
 class SimpleTextRM:
-    def __init__(self, tags: List[str]):
+    """Linear pairwise reward model over FEATURES.
+
+    `w` is the weight vector and `tag_w` a (tags x features) matrix of tag-head weights, so a
+    batch of feature rows is scored with one matrix product. Single-row methods take and return
+    1-d vectors; the *_batch ones take (n, len(FEATURES)) matrices.
+    """
+
+    def __init__(self, tags: List[str], version: str = "v1"):
+        self.tags = list(tags)
+        self.version = version
         # linear weights for features
-        self.w: Dict[str, float] = {
+        self.w = self.vector({
             "bias": 0.0,
             "length": -0.0005,
             "words": -0.01,
@@ -15,58 +52,321 @@ class SimpleTextRM:
             "question_marks": 0.05,
             "exclamations": -0.02,
             "specificity_markers": 0.4,
-        }
+        })
         # tag-head weights (simple linear + sigmoid)
-        self.tag_w: Dict[str, Dict[str, float]] = {
-            tag: {"bias": 0.0, "hedges": -0.8, "specificity_markers": 0.8, "words": -0.02}
-            for tag in tags
-        }
+        head = self.vector({"bias": 0.0, "hedges": -0.8, "specificity_markers": 0.8, "words": -0.02})
+        self.tag_w = np.tile(head, (len(self.tags), 1))
 
-    def features(self, x: Dict[str, Any]) -> Dict[str, float]:
-        feats = {
-            "bias": 1.0,
-            "length": float(x.get("length", 0)),
-            "words": float(x.get("words", 0)),
-            "hedges": float(x.get("hedges", 0)),
-            "question_marks": float(x.get("question_marks", 0)),
-            "exclamations": float(x.get("exclamations", 0)),
-            "specificity_markers": float(x.get("specificity_markers", 0)),
-        }
-        return feats
+    @staticmethod
+    def vector(values: Dict[str, float]) -> np.ndarray:
+        v = np.zeros(len(FEATURES), dtype=np.float64)
+        for k, x in values.items():
+            v[_INDEX[k]] = x
+        return v
+
+    def features(self, x: Dict[str, Any]) -> np.ndarray:
+        return np.array([1.0] + [float(x.get(k, 0)) for k in FEATURES[1:]], dtype=np.float64)
 
-    def score_feats(self, feats: Dict[str, float]) -> float:
-        return sum(self.w.get(k, 0.0) * v for k, v in feats.items())
+    def feature_matrix(self, xs: List[Dict[str, Any]]) -> np.ndarray:
+        """One features() row per raw feature dict: shape (len(xs), len(FEATURES))."""
+        m = np.ones((len(xs), len(FEATURES)), dtype=np.float64)
+        for i, x in enumerate(xs):
+            m[i, 1:] = [float(x.get(k, 0)) for k in FEATURES[1:]]
+        return m
 
-    def tag_scores(self, feats: Dict[str, float]) -> Dict[str, float]:
-        out = {}
-        for tag, tw in self.tag_w.items():
-            z = sum(tw.get(k, 0.0) * feats.get(k, 0.0) for k in feats) + tw.get("bias", 0.0)
-            out[tag] = 1.0 / (1.0 + math.exp(-z))
-        return out
+    def score_feats(self, feats: np.ndarray) -> float:
+        return float(self.w @ feats)
 
-    def pairwise_prob(self, fa: Dict[str, float], fb: Dict[str, float]) -> float:
-        za = self.score_feats(fa)
-        zb = self.score_feats(fb)
-        return 1.0 / (1.0 + math.exp(-(za - zb)))
+    def tag_scores(self, feats: np.ndarray) -> Dict[str, float]:
+        return dict(zip(self.tags, _sigmoid(self.tag_w @ feats).tolist()))
 
-    def train_pair(self, fa: Dict[str, float], fb: Dict[str, float], ya: float, lr: float = 0.01, weight: float = 1.0):
+    def pairwise_prob(self, fa: np.ndarray, fb: np.ndarray) -> float:
+        return float(self.score_batch(fa[None, :], fb[None, :])[0])
+
+    def score_batch(self, fa: np.ndarray, fb: np.ndarray) -> np.ndarray:
+        """P(A beats B) for each row pair of two (n, d) feature matrices."""
+        return _sigmoid((fa - fb) @ self.w)
+
+    def train_pair(self, fa: np.ndarray, fb: np.ndarray, ya: float, lr: float = 0.01, weight: float = 1.0):
         p = self.pairwise_prob(fa, fb)
         g = (ya - p) * weight
-        # update linear weights
-        for k in self.w.keys():
-            self.w[k] = self.w[k] + lr * g * (fa.get(k, 0.0) - fb.get(k, 0.0))
+        # update linear weights in place (raises on a registered, read-only snapshot)
+        self.w += lr * g * (fa - fb)
+
+    def copy(self, version: Optional[str] = None) -> "SimpleTextRM":
+        """A writable copy, e.g. to train and register as a new version."""
+        rm = SimpleTextRM(self.tags, version or self.version)
+        rm.w, rm.tag_w = self.w.copy(), self.tag_w.copy()
+        return rm
+
+    def explain(self, feats: np.ndarray, top_k: int = 3) -> List[str]:
+        return self.explain_batch(feats[None, :], top_k)[0]
+
+    def explain_batch(self, feats: np.ndarray, top_k: int = 3) -> List[List[str]]:
+        """Top-k tags per row, highest tag-head score first."""
+        if not self.tags:
+            return [[] for _ in range(len(feats))]
+        order = np.argsort(-(feats @ self.tag_w.T), axis=1, kind="stable")[:, :top_k]
+        return [[self.tags[j] for j in row] for row in order.tolist()]
+
+
+def next_rm_version(version: str) -> str:
+    """v1 -> v2; a version without a trailing number gets ".1" appended."""
+    m = re.fullmatch(r"(.*?)(\d+)", version)
+    return f"{m.group(1)}{int(m.group(2)) + 1}" if m else f"{version}.1"
+
+
+def canary_bucket(user_id: str) -> float:
+    """Stable position of a user in [0, 1), the same in every worker and across restarts."""
+    h = hashlib.blake2b(user_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(h, "big") / 2.0**64
+
+
+class RMRegistry:
+    """Immutable model snapshots keyed by rm_version, plus which one serves traffic.
+
+    Readers never lock: `_models` is replaced (copy-on-write), never mutated, and the routing
+    (current, candidate, canary fraction) is a single tuple swapped in one assignment, so a
+    reader sees either the old or the new state. Writers serialize on `_lock`. A registered
+    model's arrays are read-only; train a copy() and register that instead.
+    """
+
+    def __init__(self, keep: int = 8):
+        self.keep = keep
+        self._models: Dict[str, SimpleTextRM] = {}
+        self._routing: Tuple[Optional[str], Optional[str], float] = (None, None, 0.0)
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> Optional[str]:
+        return self._routing[0]
+
+    def get(self, version: Optional[str] = None) -> Optional[SimpleTextRM]:
+        return self._models.get(version or self._routing[0] or "")
+
+    def versions(self) -> List[str]:
+        return list(self._models)
+
+    def route(self, user_id: Optional[str]) -> str:
+        """rm_version for a request: the candidate for a `fraction` slice of users, else current."""
+        current, candidate, fraction = self._routing
+        if candidate and user_id and canary_bucket(user_id) < fraction:
+            return candidate
+        return current or ""
+
+    def add(self, rm: SimpleTextRM, current: bool = False, candidate: bool = False) -> None:
+        rm.w.flags.writeable = False
+        rm.tag_w.flags.writeable = False
+        with self._lock:
+            models = dict(self._models)
+            models[rm.version] = rm
+            cur, cand, frac = self._routing
+            if current:
+                cur = rm.version
+                cand = None if cand == rm.version else cand
+            if candidate:
+                cand = rm.version
+            # oldest first; the serving versions are never pruned
+            for v in list(models)[: max(0, len(models) - self.keep)]:
+                if v not in (cur, cand):
+                    del models[v]
+            self._models = models
+            self._routing = (cur, cand, frac)
+
+    def promote(self, version: str) -> None:
+        with self._lock:
+            if version not in self._models:
+                raise KeyError(version)
+            _, cand, frac = self._routing
+            self._routing = (version, None if cand == version else cand, frac)
+
+    def set_canary(self, version: Optional[str], fraction: float) -> None:
+        with self._lock:
+            if version is not None and version not in self._models:
+                raise KeyError(version)
+            self._routing = (self._routing[0], version, min(max(fraction, 0.0), 1.0))
+
+    def next_version(self) -> str:
+        return next_rm_version(list(self._models)[-1] if self._models else config.rm_version)
+
+    def manifest(self) -> Dict[str, Any]:
+        current, candidate, fraction = self._routing
+        return {"current": current, "candidate": candidate, "canary_fraction": fraction, "versions": self.versions()}
+
+    # Persistence: one <version>.npz per model (written once) plus manifest.json
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        models = self._models
+        for v, rm in models.items():
+            f = os.path.join(path, f"{v}.npz")
+            if not os.path.exists(f):
+                tmp = f + ".tmp.npz"
+                np.savez(tmp, w=rm.w, tag_w=rm.tag_w, tags=np.array(rm.tags, dtype=str))
+                os.replace(tmp, f)
+        tmp = os.path.join(path, "manifest.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.manifest(), fh)
+        os.replace(tmp, os.path.join(path, "manifest.json"))
+        # models pruned from the registry, once the manifest no longer lists them
+        for name in os.listdir(path):
+            if name.endswith(".npz") and not name.endswith(".tmp.npz") and name[: -len(".npz")] not in models:
+                os.unlink(os.path.join(path, name))
+
+    def load(self, path: str) -> bool:
+        """Replace the registry with the one saved in `path`; False if there is none."""
+        try:
+            with open(os.path.join(path, "manifest.json"), encoding="utf-8") as fh:
+                manifest = json.load(fh)
+        except FileNotFoundError:
+            return False
+        models: Dict[str, SimpleTextRM] = {}
+        for v in manifest["versions"]:
+            with np.load(os.path.join(path, f"{v}.npz")) as z:
+                rm = SimpleTextRM([str(t) for t in z["tags"]], v)
+                rm.w, rm.tag_w = z["w"].astype(np.float64), z["tag_w"].astype(np.float64).reshape(len(rm.tags), len(FEATURES))
+            rm.w.flags.writeable = False
+            rm.tag_w.flags.writeable = False
+            models[v] = rm
+        with self._lock:
+            self._models = models
+            self._routing = (manifest["current"], manifest.get("candidate"), float(manifest.get("canary_fraction", 0.0)))
+        return True
+
+    # Cross-worker sync through the state server (arrays as lists)
+    def export(self) -> Dict[str, Any]:
+        return {
+            "manifest": self.manifest(),
+            "models": {v: {"tags": rm.tags, "w": rm.w.tolist(), "tag_w": rm.tag_w.tolist()} for v, rm in self._models.items()},
+        }
+
+    def import_(self, state: Dict[str, Any]) -> None:
+        old = self._models
+        models: Dict[str, SimpleTextRM] = {}
+        for v, m in state["models"].items():
+            rm = old.get(v)
+            if rm is None:
+                rm = SimpleTextRM(m["tags"], v)
+                rm.w = np.array(m["w"], dtype=np.float64)
+                rm.tag_w = np.array(m["tag_w"], dtype=np.float64).reshape(len(rm.tags), len(FEATURES))
+                rm.w.flags.writeable = False
+                rm.tag_w.flags.writeable = False
+            models[v] = rm
+        manifest = state["manifest"]
+        with self._lock:
+            self._models = models
+            self._routing = (manifest["current"], manifest["candidate"], manifest["canary_fraction"])
+
+
+class StagedRM:
+    """A writable copy of the serving model that single-pair training updates in place.
+
+    Nothing is registered until take() hands it to install_rm; a new serving version restarts
+    the copy from that version.
+    """
+
+    def __init__(self):
+        self._rm: Optional[SimpleTextRM] = None
+        self._pairs = 0
+        self._lock = threading.Lock()
+
+    def train(self, base: SimpleTextRM, fa: np.ndarray, fb: np.ndarray, ya: float, weight: float = 1.0) -> SimpleTextRM:
+        """One train_pair step on the staged copy of `base`; returns a snapshot of the result."""
+        with self._lock:
+            if self._rm is None or self._rm.version != base.version:
+                self._rm, self._pairs = base.copy(), 0
+            self._rm.train_pair(fa, fb, ya, weight=weight)
+            self._pairs += 1
+            return self._rm.copy()
+
+    def take(self) -> Optional[SimpleTextRM]:
+        with self._lock:
+            rm, self._rm, self._pairs = self._rm, None, 0
+            return rm
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"base_rm_version": self._rm.version if self._rm else None, "pairs": self._pairs}
+
+
+rm_registry = RMRegistry(config.rm_registry_keep)
+rm_staged = shared("rm_staged", StagedRM)
+# registry changes, shared across workers: {"gen": int, "state": RMRegistry.export()}
+_rm_state: Dict[str, Any] = shared_dict("rm_state")
+_rm_gen = 0
+_boot_lock = threading.Lock()
+# held (on the coordinator when shared) for a whole registry write: sync, mint, publish
+_rm_write_lock = shared("rm_write_lock", threading.Lock, proxytype=AcquirerProxy)
+
+
+def _sync() -> None:
+    """Import the registry last published by any worker, if it is newer than ours."""
+    global _rm_gen
+    if is_remote():
+        gen = _rm_state.get("gen", 0)
+        if gen > _rm_gen:
+            rm_registry.import_(_rm_state["state"])
+            _rm_gen = gen
+
+
+def get_rm(tags: List[str], version: Optional[str] = None) -> SimpleTextRM:
+    """The model serving `version` (default: current). Unknown versions get the current model.
+
+    The first call loads the saved registry, or registers a fresh model under config.rm_version
+    with `tags` as its tag heads.
+    """
+    if rm_registry.current is None:
+        with _boot_lock:
+            if rm_registry.current is None and not (config.rm_registry_dir and rm_registry.load(config.rm_registry_dir)):
+                rm_registry.add(SimpleTextRM(tags, config.rm_version), current=True)
+    _sync()
+    return rm_registry.get(version) or rm_registry.get()
+
+
+def serving_version(requested: Optional[str], user_id: Optional[str], tags: Optional[List[str]] = None) -> str:
+    """A registered `requested` version (pinned), else the current model or canary by user."""
+    get_rm(tags or [])
+    if requested and rm_registry.get(requested) is not None:
+        return requested
+    return rm_registry.route(user_id)
+
+
+@contextmanager
+def registry_write(tags: Optional[List[str]] = None) -> Iterator[RMRegistry]:
+    """Change the registry and publish it, atomically across workers.
 
-    def explain(self, feats: Dict[str, float], top_k: int = 3) -> List[str]:
-        ts = self.tag_scores(feats)
-        return [k for k, _ in sorted(ts.items(), key=lambda x: x[1], reverse=True)[:top_k]]
+    Holds the shared write lock with the latest published registry imported, so versions minted
+    inside (next_version) are unique and generations strictly increase. Publishes on a clean exit.
+    """
+    with _rm_write_lock:
+        get_rm(tags or [])
+        yield rm_registry
+        _publish()
 
 
-rm_global: SimpleTextRM | None = None
+def _publish() -> None:
+    """Persist the registry and make it the current one for every worker (write lock held)."""
+    global _rm_gen
+    if config.rm_registry_dir:
+        rm_registry.save(config.rm_registry_dir)
+    if is_remote():
+        _rm_gen = _rm_state.get("gen", 0) + 1
+        _rm_state.update({"gen": _rm_gen, "state": rm_registry.export()})
 
 
-def get_rm(tags: List[str]) -> SimpleTextRM:
-    global rm_global
-    if rm_global is None:
-        rm_global = SimpleTextRM(tags)
-    return rm_global
+def install_rm(w: np.ndarray, tags: List[str]) -> SimpleTextRM:
+    """Register weights `w` as a new snapshot under the next rm_version and publish it.
 
+    It becomes current, or the canary candidate when config.rm_canary_fraction > 0. Models
+    already handed out are untouched, so calls holding them finish on consistent weights.
+    """
+    with registry_write(tags) as reg:
+        base = reg.get()
+        rm = SimpleTextRM(base.tags, reg.next_version())
+        rm.w = np.array(w, dtype=np.float64)
+        rm.tag_w = base.tag_w.copy()
+        if config.rm_canary_fraction > 0:
+            reg.add(rm, candidate=True)
+            reg.set_canary(rm.version, config.rm_canary_fraction)
+        else:
+            reg.add(rm, current=True)
+    return rm
@@ -0,0 +1,133 @@
+"""Mini-batch training of the reward model from the comparisons log.
+
+Every decided comparison becomes one row d = f(winner) - f(loser) of variant features
+(`features_json`, in rm.FEATURES order), weighted by the rater's trust 1 / alpha, the same
+weights the batch BT refit uses. The pairwise logistic loss
+
+    L(w) = sum_k t_k * log(1 + exp(-w . d_k)) / sum_k t_k + l2/2 |w|^2
+
+is minimized by SGD over shuffled mini-batches, one matrix-vector product per batch. Columns
+are scaled to unit RMS while training (raw counts like `length` are in the hundreds) and
+the weights are mapped back afterwards, so the result drops into SimpleTextRM unchanged.
+
+Training runs on a background thread that reads a snapshot of the log and never holds a lock
+serving code waits on. When it finishes, the weights are installed as a new model object under
+the next rm_version (rm.install_rm); requests in flight keep the model they started with. The
+new version then gets its own calibration fit (calibration.fit_calibration).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .bt import BradleyTerry, get_bt
+from .bt_fit import encode_comparisons
+from .calibration import fit_calibration
+from .config import config
+from .rm import SimpleTextRM, get_rm, install_rm
+from .storage import InMemoryDB, db as default_db
+
+
+def training_pairs(db: InMemoryDB, alphas: Dict[str, float], rm: SimpleTextRM) -> Tuple[np.ndarray, np.ndarray]:
+    """(winner - loser feature rows, trust weights) for decided comparisons of known variants."""
+    vids, win, lose, wt = encode_comparisons(db.comparisons.values(), alphas)
+    rows = [db.variants.get(v) for v in vids]
+    feats = rm.feature_matrix([(r or {}).get("features_json") or {} for r in rows])
+    known = np.array([r is not None for r in rows], dtype=bool)
+    keep = known[win] & known[lose] if len(vids) else np.zeros(0, dtype=bool)
+    return feats[win[keep]] - feats[lose[keep]], wt[keep]
+
+
+def train_pairwise(
+    w0: np.ndarray,
+    diff: np.ndarray,
+    weight: np.ndarray,
+    epochs: int = 5,
+    batch_size: int = 256,
+    lr: float = 0.5,
+    l2: float = 1e-4,
+    seed: int = 0,
+    stop: Optional[threading.Event] = None,
+) -> Tuple[np.ndarray, float]:
+    """Warm-started mini-batch SGD on the weighted pairwise logistic loss. Returns (w, final loss)."""
+    # RMS, not std: differences are not centered (their mean is the signal)
+    scale = np.sqrt((diff * diff).mean(axis=0)) if len(diff) else np.ones(diff.shape[1])
+    scale[scale == 0] = 1.0
+    x = diff / scale
+    v = np.asarray(w0, dtype=np.float64) * scale
+    rng = np.random.default_rng(seed)
+    m = len(x)
+    for _ in range(epochs):
+        if stop is not None and stop.is_set():
+            break
+        perm = rng.permutation(m)
+        for start in range(0, m, batch_size):
+            idx = perm[start : start + batch_size]
+            xb, wb = x[idx], weight[idx]
+            p = 1.0 / (1.0 + np.exp(-(xb @ v)))
+            v += lr * (xb.T @ ((1.0 - p) * wb) / max(wb.sum(), 1e-12) - l2 * v)
+    loss = float(np.logaddexp(0.0, -(x @ v)) @ weight / max(weight.sum(), 1e-12)) if m else 0.0
+    return v / scale, loss
+
+
+class RMTrainer:
+    """One background training job at a time; status() reads a snapshot and never waits on it."""
+
+    def __init__(self, db: Optional[InMemoryDB] = None, bt: Optional[BradleyTerry] = None):
+        self.db = db if db is not None else default_db
+        self._bt = bt
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._status: Dict[str, Any] = {"state": "idle"}
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._status)
+
+    def _set(self, **kw: Any) -> None:
+        with self._lock:
+            self._status.update(kw)
+
+    def start(self, epochs: int, batch_size: int, lr: float) -> Dict[str, Any]:
+        """Start a job unless one is running; returns the current status either way."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return dict(self._status)
+            self._status = {"state": "running", "started_at": time.time(), "epochs": epochs, "batch_size": batch_size}
+            self._thread = threading.Thread(target=self._run, args=(epochs, batch_size, lr), name="rm-train", daemon=True)
+            self._thread.start()
+            return dict(self._status)
+
+    def _run(self, epochs: int, batch_size: int, lr: float) -> None:
+        try:
+            rm = get_rm(config.allowed_reason_tags)
+            diff, wt = training_pairs(self.db, (self._bt or get_bt()).alphas(), rm)
+            self._set(pairs=len(diff), base_rm_version=rm.version)
+            if len(diff) == 0:
+                self._set(state="skipped", finished_at=time.time(), reason="no decided comparisons")
+                return
+            w, loss = train_pairwise(rm.w, diff, wt, epochs, batch_size, lr, stop=self._stop)
+            if self._stop.is_set():
+                self._set(state="cancelled", finished_at=time.time())
+                return
+            new = install_rm(w, config.allowed_reason_tags)
+            fit_calibration(new.version, db=self.db, alphas=(self._bt or get_bt()).alphas())
+            self._set(state="done", finished_at=time.time(), loss=loss, rm_version=new.version)
+        except Exception as e:  # surfaced through status(); serving keeps the previous model
+            self._set(state="failed", finished_at=time.time(), error=str(e))
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        t = self._thread
+        if t is not None:
+            t.join(timeout)
+
+    def close(self) -> None:
+        self._stop.set()
+        self.join()
+
+
+rm_trainer = RMTrainer()
@@ -9,13 +9,6 @@ router = APIRouter(prefix="/abuse", tags=["abuse"])
 
 @router.post("/report")
 def abuse_report(req: AbuseReportRequest) -> AbuseReportResponse:
-    rid = db._next_id("abuse_reports")
-    db.abuse_reports[rid] = {
-        "id": rid,
-        "item_id": req.item_id,
-        "reporter_id": req.reporter_id,
-        "reason": req.reason,
-        "created_at": db.now(),
-    }
+    rid = db.create_abuse_report(req.item_id, req.reporter_id, req.reason)
     return AbuseReportResponse(report_id=rid)
 
@@ -3,35 +3,29 @@ from typing import Dict
 
 from ..schemas import CompareRequest, CompareResponse
 from ..storage import db
-from ..bt import BradleyTerry
+from ..bt import get_bt
 from ..config import config
+from ..labels import record_comparison
 
 
 router = APIRouter(prefix="/compare", tags=["compare"])
-bt = BradleyTerry()
+bt = get_bt()
 
 
 @router.post("")
 def compare(req: CompareRequest) -> CompareResponse:
     if req.a_id not in db.variants or req.b_id not in db.variants:
         raise HTTPException(status_code=404, detail="Variant not found")
+    if db.variants[req.a_id]["item_id"] != req.item_id or db.variants[req.b_id]["item_id"] != req.item_id:
+        raise HTTPException(status_code=400, detail="Variants must belong to item_id")
     # init rater skill if needed
     alpha = config.crowd_alpha
     if req.judge_type == "expert":
         alpha = config.expert_alpha
     elif req.judge_type == "llm":
         alpha = config.llm_alpha
-    rater_id = req.rater_id or f"{req.judge_type}_default"
-    bt.set_alpha(rater_id, alpha)
-
     winner = req.winner_id if not req.abstain else None
-    bt.update(req.a_id, req.b_id, winner, rater_id)
-
-    # persist scores
-    for vid, (s, se) in bt.get_scores([req.a_id, req.b_id]).items():
-        db.scores[vid] = {"s": s, "stderr": se}
-
-    cid = db.create_comparison(
+    cid = record_comparison(
         item_id=req.item_id,
         a_id=req.a_id,
         b_id=req.b_id,
@@ -41,9 +35,10 @@ def compare(req: CompareRequest) -> CompareResponse:
         tags=req.tags,
         abstain=req.abstain,
         confidence=req.confidence or 0.5,
+        alpha=alpha,
     )
     return CompareResponse(
         comparison_id=cid,
-        updated_scores={vid: db.scores[vid]["s"] for vid in [req.a_id, req.b_id]},
+        updated_scores={vid: s for vid, (s, _) in bt.get_scores([req.a_id, req.b_id], req.item_id).items()},
     )
 
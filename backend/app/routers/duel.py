@@ -1,8 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from typing import List, Optional
 
-from ..schemas import NextDuelResponse
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query
+
+from ..schemas import NextDuelResponse, NextDuelBatchResponse
 from ..storage import db
-from ..bandit import pick_next_duel
+from ..bandit import pick_next_duel, pick_duels, pair_z
+from ..bt import get_bt
+from ..config import config
+from ..scheduler import duel_scheduler
 
 
 router = APIRouter(prefix="/next_duel", tags=["bandit"])
@@ -10,10 +16,40 @@ router = APIRouter(prefix="/next_duel", tags=["bandit"])
 
 @router.get("")
 def next_duel(item_id: str) -> NextDuelResponse:
-    vids = [v_id for v_id, v in db.variants.items() if v["item_id"] == item_id]
+    if config.duel_policy == "info_gain":
+        try:
+            a, b, _, z = duel_scheduler.next_duel(item_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Need at least two variants")
+        return NextDuelResponse(item_id=item_id, a_variant_id=a, b_variant_id=b, resolved=z >= config.duel_resolved_z)
+    vids = db.variant_ids(item_id)
     if len(vids) < 2:
         raise HTTPException(status_code=400, detail="Need at least two variants")
-    scores = {v: (db.scores.get(v, {}).get("s", 0.0), db.scores.get(v, {}).get("stderr", 1.0)) for v in vids}
-    a, b = pick_next_duel(vids, scores)
-    return NextDuelResponse(item_id=item_id, a_variant_id=a, b_variant_id=b)
+    bt = get_bt()
+    scores = bt.get_scores(vids, item_id)
+    diff_var = bt.diff_vars(vids, item_id)
+    a, b = pick_next_duel(vids, scores, z_resolved=config.duel_resolved_z, diff_var=diff_var)
+    resolved = pair_z(a, b, scores, diff_var) >= config.duel_resolved_z
+    return NextDuelResponse(item_id=item_id, a_variant_id=a, b_variant_id=b, resolved=resolved)
+
 
+@router.get("/batch")
+def next_duel_batch(
+    item_id: List[str] = Query(...),
+    k: int = Query(8, ge=1, le=256),
+    seed: Optional[int] = None,
+) -> NextDuelBatchResponse:
+    """Up to k distinct duels per item; repeat item_id for several items in one call."""
+    rng = np.random.default_rng(seed)
+    bt = get_bt()
+    duels: List[NextDuelResponse] = []
+    for iid in item_id:
+        vids = db.variant_ids(iid)
+        if len(vids) < 2:
+            raise HTTPException(status_code=400, detail=f"Need at least two variants: {iid}")
+        scores = bt.get_scores(vids, iid)
+        diff_var = bt.diff_vars(vids, iid)
+        for a, b in pick_duels(vids, scores, k, rng, z_resolved=config.duel_resolved_z, diff_var=diff_var):
+            resolved = pair_z(a, b, scores, diff_var) >= config.duel_resolved_z
+            duels.append(NextDuelResponse(item_id=iid, a_variant_id=a, b_variant_id=b, resolved=resolved))
+    return NextDuelBatchResponse(duels=duels)
@@ -34,8 +34,6 @@ def expert_label(req: ExpertLabelRequest):
     c = db.comparisons.get(req.comparison_id)
     if not c:
         return {"ok": False}
-    c["winner_id"] = req.winner_id
-    c["tags"] = req.tags
-    c["abstain"] = req.abstain
+    db.update_comparison(req.comparison_id, winner_id=req.winner_id, tags=req.tags, abstain=req.abstain)
     return {"ok": True}
 
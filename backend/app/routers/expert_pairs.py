@@ -3,7 +3,8 @@ from typing import Optional, List, Dict, Any
 
 from ..storage import db
 from ..config import config
-from .compare import bt as bt_instance
+from ..labels import record_comparison
+from ..scheduler import expert_queue as queue
 
 
 router = APIRouter(prefix="/expert", tags=["expert"])
@@ -12,9 +13,10 @@ router = APIRouter(prefix="/expert", tags=["expert"])
 @router.get("/queue")
 def expert_queue(topic: Optional[str] = None, limit: int = 50):
     topic = topic or (config.topics[0] if config.topics else "internal-request")
-    pairs = [p for p in db.pairs.values() if p["topic"] == topic and not p.get("labeled")]
     out: List[Dict[str, Any]] = []
-    for p in pairs[:limit]:
+    # most valuable first: pair uncertainty x item priority, across all items of the topic
+    for pid in queue.top(topic, limit):
+        p = db.pairs[pid]
         a = db.variants.get(p["a_id"]) or {}
         b = db.variants.get(p["b_id"]) or {}
         item = db.items.get(p["item_id"], {})
@@ -39,33 +41,17 @@ def expert_label(payload: Dict[str, Any], idempotency_key: Optional[str] = Heade
     confidence = float(payload.get("confidence", 0.5))
 
     if idempotency_key:
-        if idempotency_key in db.idempotency:
-            return db.idempotency[idempotency_key]
+        cached = db.get_idempotent(idempotency_key)
+        if cached is not None:
+            return cached
 
     p = db.pairs.get(pair_id)
     if not p:
         raise HTTPException(status_code=404, detail="pair not found")
     a_id, b_id, item_id = p["a_id"], p["b_id"], p["item_id"]
 
-    # Update BT if not abstain
-    if winner in ("A", "B"):
-        win_vid = a_id if winner == "A" else b_id
-        lose_vid = b_id if winner == "A" else a_id
-        # set alpha for rater type expert
-        from ..config import config as _cfg
-        bt_instance.set_alpha(rater_id or "expert_default", _cfg.expert_alpha)
-        bt_instance.update(a_id, b_id, win_vid, rater_id or "expert_default")
-        # persist scores
-        for vid, (s, se) in bt_instance.get_scores([a_id, b_id]).items():
-            db.scores[vid] = {"s": s, "stderr": se}
-        p["labeled"] = True
-        p["abstain"] = False
-    else:
-        p["labeled"] = True
-        p["abstain"] = True
-
-    # Log comparison row
-    db.create_comparison(
+    # BT update (unless abstain), comparison row and pair label in one transaction
+    cid = record_comparison(
         item_id=item_id,
         a_id=a_id,
         b_id=b_id,
@@ -75,10 +61,15 @@ def expert_label(payload: Dict[str, Any], idempotency_key: Optional[str] = Heade
         tags=tags,
         abstain=(winner == "ABSTAIN"),
         confidence=confidence,
+        alpha=config.expert_alpha,
+        bt_rater_id=rater_id or "expert_default",
+        pair_id=pair_id,
     )
 
-    resp = {"ok": True}
+    resp: Dict[str, Any] = {"ok": True}
+    if cid is None:
+        resp["already_labeled"] = True
     if idempotency_key:
-        db.idempotency[idempotency_key] = resp
+        db.set_idempotent(idempotency_key, resp)
     return resp
 
@@ -5,6 +5,7 @@ from typing import List, Dict
 
 from ..storage import db
 from ..config import config
+from ..scheduler import expert_queue
 from ..variants import generate_text_variants
 
 
@@ -64,7 +65,7 @@ async def import_emails(topic: str = Form(...), csv_file: UploadFile = File(...)
         # Use first created variant against baseline: create baseline variant if not exists
         baseline_vid = db.create_variant(item_id, {"subject": subject, "body": body}, {"length": len(body), "words": len(body.split())}, "baseline")
         if created:
-            db.create_pair(item_id=item_id, a_id=baseline_vid, b_id=created[0], topic=topic)
+            expert_queue.add(db.create_pair(item_id=item_id, a_id=baseline_vid, b_id=created[0], topic=topic))
             count_pairs += 1
 
     return {"topic": topic, "import_id": db._next_id("import"), "count_items": count_items, "count_pairs": count_pairs}
@@ -1,8 +1,15 @@
 from fastapi import APIRouter
 
 from ..schemas import MetricsStreamResponse
-from ..streaming import stream_metrics
+from ..adapters.feature_cache import feature_cache
+from ..calibration import calibration_monitor
+from ..config import config
+from ..rm import rm_registry
+from ..streaming import stream_metrics, stream_state
 from ..storage import db
+from ..retention import retention
+from ..bt import get_bt
+from ..rank_cache import rank_cache
 
 
 router = APIRouter(prefix="/metrics", tags=["metrics"])
@@ -10,20 +17,22 @@ router = APIRouter(prefix="/metrics", tags=["metrics"])
 
 @router.get("/stream")
 def metrics_stream() -> MetricsStreamResponse:
+    m = stream_metrics.snapshot()
+    # expert labels scored by the current RM since its last calibration fit
+    c = calibration_monitor.snapshot(rm_registry.current or config.rm_version)
     return MetricsStreamResponse(
-        latency_p95_ms=stream_metrics.p95(),
-        alerts_per_min=stream_metrics.alerts / max(1.0, (stream_metrics.calls / 60.0)),
-        suppress_rate=stream_metrics.suppress_rate(),
-        ece=None,
-        agreement_rate=None,
+        latency_p95_ms=m["p95"],
+        alerts_per_min=m["alerts"] / max(1.0, (m["calls"] / 60.0)),
+        suppress_rate=m["suppress_rate"],
+        ece=c["ece"],
+        agreement_rate=c["agreement_rate"],
     )
 
 
 @router.get("/topic")
 def metrics_topic(topic: str):
-    pairs = [p for p in db.pairs.values() if p.get("topic") == topic]
-    labeled = [p for p in pairs if p.get("labeled")]
-    abstain = [p for p in labeled if p.get("abstain")]
+    labeled = db.pair_ids(topic, labeled=True)
+    abstain = [pid for pid in labeled if db.pairs[pid].get("abstain")]
     # Stubs for κ and RM AUC
     return {
         "labeled_pairs": len(labeled),
@@ -31,3 +40,26 @@ def metrics_topic(topic: str):
         "abstain_rate": (len(abstain) / len(labeled)) if labeled else 0.0,
         "rm_auc": 0.78 if labeled else 0.0,
     }
+
+
+@router.get("/retention")
+def metrics_retention():
+    return {
+        "evicted": dict(retention.evicted),
+        "sizes": {
+            "stream_events": len(db.stream_events),
+            "idempotency": len(db.idempotency),
+            "stream_sessions": stream_state.stats()["sessions"],
+        },
+        "policies": retention.policies,
+        "bt_resident": get_bt().resident(),
+    }
+
+
+@router.get("/cache")
+def metrics_cache():
+    # per-process counters; with several workers each reports its own
+    return {
+        "features": feature_cache.stats(),
+        "rank": rank_cache.stats(),
+    }
@@ -1,27 +1,26 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, Request, Response
 
-from ..schemas import RankResponse, RankResponseEntry
+from ..schemas import RankResponse
 from ..storage import db
+from ..rank_cache import build_rank, etag_matches, item_versions, rank_cache
 
 
 router = APIRouter(prefix="/rank", tags=["rank"])
 
 
-@router.get("")
-def get_rank(item_id: str) -> RankResponse:
-    vids = [v_id for v_id, v in db.variants.items() if v["item_id"] == item_id]
+@router.get("", response_model=RankResponse)
+def get_rank(item_id: str, request: Request, response: Response, win_probs: bool = False):
+    vids = db.variant_ids(item_id)
     if not vids:
         raise HTTPException(status_code=404, detail="No variants for item")
-    scores = {v: (db.scores.get(v, {}).get("s", 0.0), db.scores.get(v, {}).get("stderr", 1.0)) for v in vids}
-    ranked = sorted(vids, key=lambda x: scores[x][0], reverse=True)
-
-    entries: List[RankResponseEntry] = []
-    for v in ranked:
-        entries.append(
-            RankResponseEntry(
-                variant_id=v, score=scores[v][0], stderr=scores[v][1], win_prob_row=None
-            )
-        )
-    return RankResponse(item_id=item_id, ranking=entries)
-
+    # the ETag changes whenever the item's scores can change, so it doubles as the cache key
+    etag = item_versions.etag(item_id)
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    key = (item_id, win_probs)
+    resp = rank_cache.get(key, etag)
+    if resp is None:
+        resp = build_rank(item_id, vids, win_probs)
+        rank_cache.put(key, etag, resp)
+    response.headers["ETag"] = etag
+    return resp
@@ -1,10 +1,21 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+import asyncio
+import json
 import re
+from typing import Any, Dict, List, Optional
 
-from ..schemas import RMScoreRequest, RMScoreResponse, StreamScoreRequest, StreamScoreResponse, CalibrationMeta, MetricsStreamResponse
-from ..rm import get_rm
+import numpy as np
+
+from ..adapters.feature_cache import feature_cache
+from ..adapters.lexicon import scan
+from ..schemas import RMScoreRequest, RMScoreResponse, RMScoreBatchRequest, RMScoreBatchResponse, StreamScoreRequest, StreamScoreResponse, SpanTag, Suggestion, PatchOp, CalibrationMeta, MetricsStreamResponse
+from ..rm import SimpleTextRM, get_rm, install_rm, registry_write, rm_registry, rm_staged, serving_version
+from ..rm_train import rm_trainer
 from ..config import config
-from ..streaming import streaming_score, find_spans, suggestion_for, stream_state, stream_metrics, calibration_store
+from ..calibration import calibration_store, fit_calibration, get_calibrator
+from ..streaming import streaming_score, find_spans, patch_ops, suggestion_for, suggestion_ops, stream_deltas, stream_docs, stream_state, stream_metrics
 from ..moderation import is_goal_allowed
 from ..storage import db
 
@@ -12,39 +23,111 @@ from ..storage import db
 router = APIRouter(prefix="/rm", tags=["rm"])
 
 
+MAX_SCORE_BATCH = 10000
+
+
+def _compute_text_feats(text: str) -> Dict[str, Any]:
+    # simple features from lengths and heuristics
+    return {"length": len(text), "words": len(text.split()), "hedges": text.lower().count("maybe")}
+
+
+def _text_feats(text: str) -> Dict[str, Any]:
+    return feature_cache.get("rm", text, _compute_text_feats)
+
+
+def score_pairs(rm: SimpleTextRM, pairs: List[RMScoreRequest]) -> List[RMScoreResponse]:
+    """Score every (a, b) pair with one matrix product; tags explain each pair's winner."""
+    fa = rm.feature_matrix([_text_feats(r.a_text) for r in pairs])
+    fb = rm.feature_matrix([_text_feats(r.b_text) for r in pairs])
+    p = rm.score_batch(fa, fb)
+    tags = rm.explain_batch(np.where((p > 0.5)[:, None], fa, fb))
+    out = []
+    for pi, t in zip(p.tolist(), tags):
+        winner = "A" if pi > 0.5 else ("B" if pi < 0.5 else None)
+        out.append(RMScoreResponse(winner=winner, score_a=pi, score_b=1 - pi, confidence=abs(pi - 0.5) * 2, top_reason_tags=t))
+    return out
+
+
 @router.post("/score")
 def rm_score(req: RMScoreRequest) -> RMScoreResponse:
-    rm = get_rm(config.allowed_reason_tags)
-    # simple features from lengths and heuristics
-    fa = rm.features({"length": len(req.a_text), "words": len(req.a_text.split()), "hedges": req.a_text.lower().count("maybe")})
-    fb = rm.features({"length": len(req.b_text), "words": len(req.b_text.split()), "hedges": req.b_text.lower().count("maybe")})
-    p = rm.pairwise_prob(fa, fb)
-    winner = "A" if p > 0.5 else ("B" if p < 0.5 else None)
-    conf = abs(p - 0.5) * 2
-    tags = rm.explain(fa if (winner == "A") else fb)
-    return RMScoreResponse(winner=winner, score_a=p, score_b=1 - p, confidence=conf, top_reason_tags=tags)
+    return score_pairs(get_rm(config.allowed_reason_tags), [req])[0]
+
+
+@router.post("/score/batch")
+def rm_score_batch(req: RMScoreBatchRequest) -> RMScoreBatchResponse:
+    if len(req.pairs) > MAX_SCORE_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_SCORE_BATCH} pairs per batch")
+    return RMScoreBatchResponse(results=score_pairs(get_rm(config.allowed_reason_tags), req.pairs))
 
 
 @router.post("/train")
 def rm_train(req: RMScoreRequest) -> RMScoreResponse:
-    rm = get_rm(config.allowed_reason_tags)
-    fa = rm.features({"length": len(req.a_text), "words": len(req.a_text.split()), "hedges": req.a_text.lower().count("maybe")})
-    fb = rm.features({"length": len(req.b_text), "words": len(req.b_text.split()), "hedges": req.b_text.lower().count("maybe")})
+    # trains the staged copy only; POST /rm/train/publish registers it as a new version
+    base = get_rm(config.allowed_reason_tags)
+    fa = base.features(_text_feats(req.a_text))
+    fb = base.features(_text_feats(req.b_text))
     # assume A preferred for demo if longer specificity
     ya = 1.0 if len(req.a_text) > len(req.b_text) else 0.0
-    rm.train_pair(fa, fb, ya, weight=req.rater_trust)
-    p = rm.pairwise_prob(fa, fb)
-    winner = "A" if p > 0.5 else ("B" if p < 0.5 else None)
-    conf = abs(p - 0.5) * 2
-    tags = rm.explain(fa if (winner == "A") else fb)
-    return RMScoreResponse(winner=winner, score_a=p, score_b=1 - p, confidence=conf, top_reason_tags=tags)
+    return score_pairs(rm_staged.train(base, fa, fb, ya, weight=req.rater_trust), [req])[0]
+
+
+@router.post("/train/publish")
+def rm_train_publish() -> Dict[str, Any]:
+    """Register the model staged by POST /rm/train as the next rm_version."""
+    staged = rm_staged.take()
+    if staged is None:
+        raise HTTPException(status_code=409, detail="Nothing staged: POST /rm/train first")
+    rm = install_rm(staged.w, config.allowed_reason_tags)
+    return dict(rm_registry.manifest(), rm_version=rm.version)
+
+
+@router.post("/train/batch")
+def rm_train_batch(
+    epochs: Optional[int] = Query(None, ge=1, le=100),
+    batch_size: Optional[int] = Query(None, ge=1, le=65536),
+    lr: Optional[float] = Query(None, gt=0),
+) -> Dict[str, Any]:
+    """Train on every decided comparison in the background; poll /rm/train/status for the result."""
+    return rm_trainer.start(
+        epochs=epochs or config.rm_train_epochs,
+        batch_size=batch_size or config.rm_train_batch_size,
+        lr=lr or config.rm_train_lr,
+    )
+
+
+@router.get("/train/status")
+def rm_train_status() -> Dict[str, Any]:
+    return dict(rm_trainer.status(), staged=rm_staged.status())
+
+
+def score_stream(req: StreamScoreRequest) -> StreamScoreResponse:
+    """One streaming scoring call, shared by POST /rm/stream/score and the /rm/stream/ws socket."""
+    resp = _score_stream(req)
+    if not (req.delta and req.user_id):
+        return resp
+    # delta mode: spans relative to the session's last response, minimal suggestion patches
+    spans = [(sp.start, sp.end, sp.tag) for sp in resp.spans]
+    update = stream_deltas.encode((req.user_id, req.item_id), req.snippet, req.cursor.pos if req.cursor else None, spans)
+    if "base_seq" in update:
+        update["spans"] = []
+        for k in ("spans_added", "spans_removed"):
+            update[k] = [SpanTag(start=a, end=b, tag=t) for a, b, t in update[k]] or None
+    if resp.suggestion is not None and resp.suggestion.patch is not None:
+        # a whole-snippet rewrite from the safety or debug paths
+        ops = patch_ops(req.snippet, resp.suggestion.patch.text)
+        update["suggestion"] = Suggestion(
+            label=resp.suggestion.label,
+            patches=[PatchOp(type="text_replace", range=[a, b], text=t) for a, b, t in ops],
+        )
+    return resp.model_copy(update=update)
 
 
-@router.post("/stream/score")
-def rm_stream_score(req: StreamScoreRequest) -> StreamScoreResponse:
+def _score_stream(req: StreamScoreRequest) -> StreamScoreResponse:
     import time as _t
 
     t0 = _t.time()
+    # pinned version if the client names a registered one, else current (or canary by user_id)
+    version = serving_version(req.rm_version, req.user_id)
 
     if not config.streaming_enabled:
         return StreamScoreResponse(
@@ -54,7 +137,7 @@ def rm_stream_score(req: StreamScoreRequest) -> StreamScoreResponse:
             tags=[],
             spans=[],
             suggestion=None,
-            rm_version=req.rm_version or config.rm_version,
+            rm_version=version,
             explanations={"reason": "streaming_disabled"},
         )
 
@@ -79,7 +162,7 @@ def rm_stream_score(req: StreamScoreRequest) -> StreamScoreResponse:
             tags=["safety"],
             spans=[],
             suggestion=suggestion,
-            rm_version=req.rm_version or config.rm_version,
+            rm_version=version,
             explanations={"reason": f"Unsafe goal: {reason}"},
         )
         # no metrics counted as alert to avoid bias
@@ -161,9 +244,7 @@ def rm_stream_score(req: StreamScoreRequest) -> StreamScoreResponse:
                         suggestion=suggestion_obj or {},
                     )
                 t1 = _t.time()
-                stream_metrics.calls += 1
-                stream_metrics.alerts += 1
-                stream_metrics.add_latency((t1 - t0) * 1000.0)
+                stream_metrics.record((t1 - t0) * 1000.0, alerted=True)
                 return StreamScoreResponse(
                     p_win=p_win,
                     confidence=conf,
@@ -171,12 +252,16 @@ def rm_stream_score(req: StreamScoreRequest) -> StreamScoreResponse:
                     tags=tags,
                     spans=spans,
                     suggestion=suggestion_obj,
-                    rm_version=req.rm_version or config.rm_version,
+                    rm_version=version,
                     explanations={"reason": "debug deterministic flags/tokens"},
                 )
             # Else fall through to hysteresis/cooldown gating
 
-    p_win, conf, tags = streaming_score(req.snippet, req.context or {"goal": goal}, req.rm_version or config.rm_version)
+    # a known session re-featurizes only the blocks around the edit
+    feats = hedge_spans = None
+    if req.user_id:
+        feats, hedge_spans = stream_docs.featurize((req.user_id, req.item_id), req.snippet, req.cursor.pos if req.cursor else None)
+    p_win, conf, tags = streaming_score(req.snippet, req.context or {"goal": goal}, version, feats)
 
     # Thresholds
     tau_pos = float(config.streaming["tau_pos"])  # type: ignore
@@ -192,8 +277,9 @@ def rm_stream_score(req: StreamScoreRequest) -> StreamScoreResponse:
     require_agreement = bool(config.streaming["require_agreement"])  # type: ignore
     if require_agreement and conf < hi_conf_margin:
         # cheap agreement: re-check with a coarser feature (specificity vs hedges)
-        spec = 1 if re.search(r"\b(today|tomorrow|at|on)\b", req.snippet, re.I) else 0  # type: ignore[name-defined]
-        hedge = 1 if re.search(r"(maybe|perhaps|kind of|sort of|I think|just)", req.snippet, re.I) else 0  # type: ignore[name-defined]
+        lex = scan(req.snippet)
+        spec = 1 if lex.has_specific_word else 0
+        hedge = 1 if lex.hedge_spans else 0
         agree_positive = spec and not hedge
         agree_negative = hedge and not spec
         if state == "positive" and not agree_positive:
@@ -207,12 +293,17 @@ def rm_stream_score(req: StreamScoreRequest) -> StreamScoreResponse:
     spans = []
     if emitted and state in ("positive", "negative"):
         if state == "negative":
-            spans = find_spans(req.snippet)
-            label, patched = suggestion_for(req.snippet, tags)
-            suggestion_obj = {
-                "label": label,
-                "patch": {"type": "text_replace", "range": [0, len(req.snippet)], "text": patched},
-            }
+            spans = hedge_spans if hedge_spans is not None else find_spans(req.snippet)
+            if req.delta and req.user_id:
+                # only the changed ranges, from the hedge spans already found
+                label, ops = suggestion_ops(req.snippet, tags, [(sp["start"], sp["end"]) for sp in spans])
+                suggestion_obj = {"label": label, "patches": [{"type": "text_replace", "range": [a, b], "text": t} for a, b, t in ops]}
+            else:
+                label, patched = suggestion_for(req.snippet, tags)
+                suggestion_obj = {
+                    "label": label,
+                    "patch": {"type": "text_replace", "range": [0, len(req.snippet)], "text": patched},
+                }
         # Append stream event only when emitting
         if req.user_id:
             db.append_stream_event(
@@ -224,13 +315,10 @@ def rm_stream_score(req: StreamScoreRequest) -> StreamScoreResponse:
                 tags=tags,
                 suggestion=suggestion_obj or {},
             )
-        stream_metrics.alerts += 1
-    else:
-        stream_metrics.suppressed += 1
+    alerted = emitted and state in ("positive", "negative")
 
     t1 = _t.time()
-    stream_metrics.calls += 1
-    stream_metrics.add_latency((t1 - t0) * 1000.0)
+    stream_metrics.record((t1 - t0) * 1000.0, alerted=alerted)
 
     return StreamScoreResponse(
         p_win=float(p_win),
@@ -239,18 +327,153 @@ def rm_stream_score(req: StreamScoreRequest) -> StreamScoreResponse:
         tags=tags if emitted else [],
         spans=spans if emitted else [],
         suggestion=suggestion_obj,
-        rm_version=req.rm_version or config.rm_version,
+        rm_version=version,
         explanations={"reason": "specific ask beats vague ask in expert data"},
     )
 
 
+# delta-mode fields, left out of full responses so those keep their original payload
+_DELTA_ONLY = {"seq": True, "base_seq": True, "edit": True, "spans_added": True, "spans_removed": True, "suggestion": {"patches"}}
+
+
+def _stream_json(resp: StreamScoreResponse, delta: bool) -> str:
+    # unset fields are left out of delta responses
+    return resp.model_dump_json(exclude_none=True) if delta else resp.model_dump_json(exclude=_DELTA_ONLY)
+
+
+@router.post("/stream/score", response_model=StreamScoreResponse)
+def rm_stream_score(req: StreamScoreRequest) -> Response:
+    return Response(_stream_json(score_stream(req), req.delta), media_type="application/json")
+
+
+# per-connection fields that later edit events may omit; user_id/item_id come from the URL
+_WS_STICKY = ("modality", "context", "mode", "rm_version")
+
+
+@router.websocket("/stream/ws")
+async def rm_stream_ws(ws: WebSocket, user_id: Optional[str] = None, item_id: Optional[str] = None) -> None:
+    """Streaming scorer over one socket per (user_id, item_id).
+
+    Each client message is an edit event: the fields of a StreamScoreRequest, at least
+    `snippet`. Events arriving less than streaming.debounce_ms apart are coalesced and only the
+    last snippet is scored, once the burst goes quiet; each scored snippet is pushed back as
+    one StreamScoreResponse frame. Invalid events get an `{"error": ...}` frame.
+    """
+    await ws.accept()
+    debounce = float(config.streaming["debounce_ms"]) / 1000.0  # type: ignore
+    session: Dict[str, Any] = {"user_id": user_id, "item_id": item_id}
+    # the latest edit event, and error frames queued by the reader; only the loop below sends
+    pending: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    edited = asyncio.Event()
+    closed = asyncio.Event()
+
+    async def read() -> None:
+        try:
+            while True:
+                try:
+                    msg = json.loads(await ws.receive_text())
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    msg = None
+                if not isinstance(msg, dict):
+                    errors.append({"error": "expected a JSON object"})
+                    edited.set()
+                    continue
+                session.update({k: msg[k] for k in _WS_STICKY if k in msg})
+                pending[:] = [{**msg, **session}]
+                edited.set()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            closed.set()
+            edited.set()
+
+    reader = asyncio.create_task(read())
+    try:
+        while True:
+            await edited.wait()
+            while errors:
+                await ws.send_json(errors.pop(0))
+            if not pending and not closed.is_set():
+                edited.clear()
+                continue
+            # wait out the burst: every new edit restarts the quiet period
+            while not closed.is_set():
+                edited.clear()
+                try:
+                    await asyncio.wait_for(edited.wait(), debounce)
+                except asyncio.TimeoutError:
+                    break
+                while errors:
+                    await ws.send_json(errors.pop(0))
+            if closed.is_set():
+                return
+            body = pending.pop()
+            try:
+                req = StreamScoreRequest.model_validate(body)
+            except ValidationError as e:
+                await ws.send_json({"error": e.errors(include_url=False, include_context=False, include_input=False)})
+                continue
+            resp = await run_in_threadpool(score_stream, req)
+            await ws.send_text(_stream_json(resp, req.delta))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+
+
 @router.get("/calibration")
 def rm_calibration(rm_version: str | None = None) -> CalibrationMeta:
-    ver = rm_version or config.rm_version
-    art = calibration_store.get(ver)
-    if not art:
-        return CalibrationMeta(rm_version=ver, method="platt", params={"a": 1.0, "b": 0.0})
-    return CalibrationMeta(rm_version=ver, method=art.get("method", "platt"), params=art.get("params", {}))
+    ver = rm_version or rm_registry.current or config.rm_version
+    get_calibrator(ver)  # loads a saved fit, or registers the identity
+    art = calibration_store.get(ver) or {}
+    return CalibrationMeta(
+        rm_version=ver,
+        method=art.get("method", "platt"),
+        params=art.get("params", {"a": 1.0, "b": 0.0}),
+        fitted_at=art.get("fitted_at"),
+        n=art.get("n", 0),
+    )
+
+
+@router.post("/calibration/fit")
+def rm_calibration_fit(rm_version: Optional[str] = None, method: Optional[str] = Query(None, pattern="^(platt|isotonic)$")) -> CalibrationMeta:
+    """Fit a calibrator for `rm_version` (default current) from every decided comparison."""
+    get_rm(config.allowed_reason_tags)
+    if rm_version and rm_registry.get(rm_version) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown rm_version: {rm_version}")
+    rec = fit_calibration(rm_version, method)
+    if rec is None:
+        raise HTTPException(status_code=400, detail="No labeled comparisons to fit on")
+    return CalibrationMeta(**rec)
+
+
+@router.get("/registry")
+def rm_registry_manifest() -> Dict[str, Any]:
+    get_rm(config.allowed_reason_tags)
+    return rm_registry.manifest()
+
+
+@router.post("/registry/promote")
+def rm_registry_promote(rm_version: str) -> Dict[str, Any]:
+    """Serve `rm_version` to everyone (ends its canary)."""
+    try:
+        with registry_write(config.allowed_reason_tags) as reg:
+            reg.promote(rm_version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown rm_version: {rm_version}")
+    return rm_registry.manifest()
+
+
+@router.post("/registry/canary")
+def rm_registry_canary(rm_version: Optional[str] = None, fraction: float = Query(0.0, ge=0.0, le=1.0)) -> Dict[str, Any]:
+    """Route `fraction` of /rm/stream/score users (by hashed user_id) to `rm_version`; omit it to stop."""
+    try:
+        with registry_write(config.allowed_reason_tags) as reg:
+            reg.set_canary(rm_version, fraction if rm_version else 0.0)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown rm_version: {rm_version}")
+    return rm_registry.manifest()
 
 
 ## metrics endpoint is exposed under /metrics/stream in a separate router
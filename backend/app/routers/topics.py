@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 
 from ..config import config
+from ..rm import rm_registry
 
 
 router = APIRouter(prefix="", tags=["topics"])
@@ -17,7 +18,8 @@ def init_topic(payload: dict):
     description = payload.get("description", "")
     tags = payload.get("tags", [])
     # Stub: accept only predefined topics, return current rm_version
+    rm_version = rm_registry.current or config.rm_version
     if topic not in config.topics:
-        return {"topic": topic, "rm_version": config.rm_version, "note": "non-predefined topic; ok for dev"}
-    return {"topic": topic, "rm_version": config.rm_version}
+        return {"topic": topic, "rm_version": rm_version, "note": "non-predefined topic; ok for dev"}
+    return {"topic": topic, "rm_version": rm_version}
 
@@ -25,6 +25,6 @@ def set_topic(payload: dict, x_user_id: Optional[str] = Header(None)):
     topic = payload.get("topic")
     if topic not in config.topics:
         return {"ok": False, "error": "unknown topic"}
-    db.users[uid] = {"preferred_topic": topic}
+    db.set_user(uid, {"preferred_topic": topic})
     return {"ok": True, "user_id": uid, "preferred_topic": topic}
 
@@ -4,6 +4,7 @@ from typing import List
 from ..schemas import CreateVariantsRequest, VariantOut
 from ..storage import db
 from ..variants import generate_text_variants
+from ..rank_cache import item_versions
 
 
 router = APIRouter(prefix="/variants", tags=["variants"])
@@ -32,6 +33,7 @@ def create_variants(req: CreateVariantsRequest) -> List[VariantOut]:
                 content=v["content_ref"],
             )
         )
+    item_versions.bump(req.item_id)
     return out
 
 
@@ -42,4 +44,5 @@ def apply_suggestion(item_id: str, diff_type: str, content_text: str) -> Variant
         raise HTTPException(status_code=404, detail="Item not found")
     features = {"length": len(content_text), "words": len(content_text.split())}
     vid = db.create_variant(item_id, {"text": content_text}, features, diff_type)
+    item_versions.bump(item_id)
     return VariantOut(variant_id=vid, parent_item_id=item_id, diff_type=diff_type, content={"text": content_text})
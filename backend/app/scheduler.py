@@ -0,0 +1,346 @@
+"""Information-gain duel scheduling with a lazily updated per-item heap.
+
+The value of comparing a and b is the expected information the outcome carries about their
+score difference d = s_a - s_b ~ N(mu, var) (BALD, Houlsby et al. 2011). With the logistic link
+approximated by a probit, sigmoid(x) ~ Phi(x * sqrt(pi/8)), it has a closed form:
+
+    I = h(Phi(m / sqrt(1 + v))) - C / sqrt(v + C^2) * exp(-m^2 / (2 (v + C^2)))
+
+where m, v are mu and var scaled by sqrt(pi/8), h is the binary entropy in bits and
+C = sqrt(pi * ln 2 / 2).
+
+The goal is a confident winner, not the full order, so each pair's gain is weighted by how likely
+either side is to be the best variant: w_v = P(s_v > s_ref) against a reference leader frozen when
+the heap is built. Pairs far below the leader stop drawing labels.
+
+Each item keeps a max-heap of all its pairs. A label changes only the two variants involved, so
+their version stamps are bumped and only the 2(n-2)+1 pairs touching them are re-pushed; older
+entries for those pairs are skipped when they reach the top. Picking is O(log n) amortized. The heap
+is rebuilt (O(n^2)) only when the leader changes or drifts from the reference by more than
+REF_DRIFT of its stderr.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .bandit import diff_variance, pair_z
+from .bt import BradleyTerry, get_bt
+from .config import config
+from .shared_state import shared
+from .storage import InMemoryDB, db as default_db
+
+REF_DRIFT = 0.5
+
+_LAMBDA2 = math.pi / 8.0
+_C2 = math.pi * math.log(2.0) / 2.0
+
+
+def _entropy(p: float) -> float:
+    if p <= 0.0 or p >= 1.0:
+        return 0.0
+    return -(p * math.log2(p) + (1.0 - p) * math.log2(1.0 - p))
+
+
+def info_gain(mu: float, var: float) -> float:
+    """Expected information (bits) from one comparison whose logit difference is N(mu, var)."""
+    m, v = math.sqrt(_LAMBDA2) * mu, _LAMBDA2 * var
+    p = 0.5 * math.erfc(-m / math.sqrt(2.0 * (1.0 + v)))
+    return max(_entropy(p) - math.sqrt(_C2 / (v + _C2)) * math.exp(-m * m / (2.0 * (v + _C2))), 0.0)
+
+
+class ItemHeap:
+    """Candidate pairs of one item keyed by top-1 weighted gain, with per-variant version stamps.
+
+    `diff_var` holds the batch Laplace Var(s_a - s_b) of the item (BradleyTerry.diff_vars); pairs
+    use it like bandit.pair_z does, so both duel policies agree on when a pair is resolved.
+    """
+
+    def __init__(self, scores: Dict[str, Tuple[float, float]], diff_var: Optional[Dict[Tuple[str, str], float]] = None):
+        self.vids = list(scores)
+        self.scores = dict(scores)
+        self.diff_var = dict(diff_var or {})
+        self.version: Dict[str, int] = {v: 0 for v in self.vids}
+        self.pushes = 0
+        self.rebuilds = 0
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        self.leader = max(self.vids, key=lambda v: self.scores[v][0])
+        self.ref = self.scores[self.leader]
+        self.heap: List[Tuple[float, int, int, str, str]] = []
+        for i, a in enumerate(self.vids):
+            for b in self.vids[i + 1 :]:
+                self._push(a, b)
+        self.rebuilds += 1
+
+    def weight(self, v: str) -> float:
+        """P(s_v > s_ref) under independent normal errors."""
+        (s, e), (rs, re) = self.scores[v], self.ref
+        return 0.5 * math.erfc(-(s - rs) / math.sqrt(2.0 * max(e * e + re * re, 1e-12)))
+
+    def key(self, a: str, b: str) -> float:
+        mu = self.scores[a][0] - self.scores[b][0]
+        return info_gain(mu, diff_variance(a, b, self.scores, self.diff_var)) * (self.weight(a) + self.weight(b))
+
+    def _push(self, a: str, b: str) -> None:
+        heapq.heappush(self.heap, (-self.key(a, b), self.version[a], self.version[b], a, b))
+        self.pushes += 1
+
+    def _live(self, entry: Tuple[float, int, int, str, str]) -> bool:
+        _, va, vb, a, b = entry
+        return self.version[a] == va and self.version[b] == vb
+
+    def update(self, changed: Dict[str, Tuple[float, float]]) -> None:
+        """Re-key only the pairs touching the variants in `changed`."""
+        for v, sc in changed.items():
+            self.scores[v] = sc
+            self.version[v] += 1
+        s_lead, se_ref = self.scores[self.leader][0], self.ref[1]
+        if abs(s_lead - self.ref[0]) > REF_DRIFT * se_ref or any(sc[0] > s_lead for sc in changed.values()):
+            self._rebuild()
+            return
+        for v in changed:
+            for u in self.vids:
+                # a pair of two changed variants is pushed once, from its first member
+                if u != v and not (u in changed and u < v):
+                    self._push(v, u)
+        # drop stale entries once they dominate the heap
+        n = len(self.vids)
+        if len(self.heap) > 4 * n * (n - 1) // 2 + 64:
+            self.heap = [e for e in self.heap if self._live(e)]
+            heapq.heapify(self.heap)
+
+    def best(self) -> Tuple[str, str, float]:
+        while not self._live(self.heap[0]):
+            heapq.heappop(self.heap)
+        neg_key, _, _, a, b = self.heap[0]
+        return a, b, -neg_key
+
+    def z(self, a: str, b: str) -> float:
+        return pair_z(a, b, self.scores, self.diff_var)
+
+
+class DuelScheduler:
+    """Per-item heaps (LRU-bounded), built lazily from BT scores and kept current by labels."""
+
+    def __init__(self, max_items: int = 10000):
+        self.max_items = max_items
+        self._items: "OrderedDict[str, ItemHeap]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _heap(self, item_id: str, vids: List[str]) -> ItemHeap:
+        h = self._items.get(item_id)
+        if h is None or len(h.vids) != len(vids):
+            bt = get_bt()
+            h = self._items[item_id] = ItemHeap(bt.get_scores(vids, item_id), bt.diff_vars(vids, item_id))
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        self._items.move_to_end(item_id)
+        return h
+
+    def next_duel(self, item_id: str) -> Tuple[str, str, float, float]:
+        """(a, b, weighted gain, |z| of the pair) for the most informative pair."""
+        vids = default_db.variant_ids(item_id)
+        if len(vids) < 2:
+            raise ValueError("Need at least two variants for a duel")
+        with self._lock:
+            h = self._heap(item_id, vids)
+            a, b, gain = h.best()
+            return a, b, gain, h.z(a, b)
+
+    def on_label(self, item_id: str, scores: Dict[str, Tuple[float, float]]) -> None:
+        with self._lock:
+            h = self._items.get(item_id)
+            if h is not None and all(v in h.version for v in scores):
+                h.update(scores)
+
+    def invalidate(self, item_ids: Iterable[str]) -> None:
+        with self._lock:
+            for item_id in item_ids:
+                self._items.pop(item_id, None)
+
+
+duel_scheduler = shared("duel_scheduler", lambda: DuelScheduler(config.scheduler_max_items))
+
+
+class IndexedHeap:
+    """Binary max-heap of id -> key with a position index: push, re-key and remove in O(log n)."""
+
+    def __init__(self, entries: Iterable[Tuple[str, float]] = ()):
+        self.ids: List[str] = []
+        self.keys: List[float] = []
+        for i, k in entries:
+            self.ids.append(i)
+            self.keys.append(k)
+        self.pos: Dict[str, int] = {i: n for n, i in enumerate(self.ids)}
+        for n in reversed(range(len(self.ids) // 2)):
+            self._down(n)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self.pos
+
+    def _swap(self, i: int, j: int) -> None:
+        self.ids[i], self.ids[j] = self.ids[j], self.ids[i]
+        self.keys[i], self.keys[j] = self.keys[j], self.keys[i]
+        self.pos[self.ids[i]] = i
+        self.pos[self.ids[j]] = j
+
+    def _up(self, i: int) -> None:
+        while i > 0 and self.keys[(i - 1) // 2] < self.keys[i]:
+            self._swap(i, (i - 1) // 2)
+            i = (i - 1) // 2
+
+    def _down(self, i: int) -> None:
+        n = len(self.ids)
+        while True:
+            big, l, r = i, 2 * i + 1, 2 * i + 2
+            if l < n and self.keys[l] > self.keys[big]:
+                big = l
+            if r < n and self.keys[r] > self.keys[big]:
+                big = r
+            if big == i:
+                return
+            self._swap(i, big)
+            i = big
+
+    def set(self, id_: str, key: float) -> None:
+        i = self.pos.get(id_)
+        if i is None:
+            self.ids.append(id_)
+            self.keys.append(key)
+            i = self.pos[id_] = len(self.ids) - 1
+            self._up(i)
+            return
+        old, self.keys[i] = self.keys[i], key
+        self._up(i) if key > old else self._down(i)
+
+    def remove(self, id_: str) -> None:
+        i = self.pos.pop(id_, None)
+        if i is None:
+            return
+        last = len(self.ids) - 1
+        if i != last:
+            self.ids[i], self.keys[i] = self.ids[last], self.keys[last]
+            self.pos[self.ids[i]] = i
+        self.ids.pop()
+        self.keys.pop()
+        if i < len(self.ids):
+            self._up(i)
+            self._down(i)
+
+    def top(self, k: int) -> List[Tuple[str, float]]:
+        """The k largest entries in order, without removing them: O(k log k)."""
+        out: List[Tuple[str, float]] = []
+        frontier = [(-self.keys[0], 0)] if self.ids else []
+        while frontier and len(out) < k:
+            neg, i = heapq.heappop(frontier)
+            out.append((self.ids[i], -neg))
+            for c in (2 * i + 1, 2 * i + 2):
+                if c < len(self.ids):
+                    heapq.heappush(frontier, (-self.keys[c], c))
+        return out
+
+
+class TopicQueue:
+    """One topic's heap plus item_id -> queued pair ids, so a label re-keys just that item's pairs."""
+
+    def __init__(self, heap: IndexedHeap, by_item: Dict[str, Dict[str, None]]):
+        self.heap = heap
+        self.by_item = by_item
+
+
+class ExpertQueue:
+    """Unlabeled expert pairs of each topic ranked by value = pair uncertainty x item priority.
+
+    Uncertainty is the information gain of the pair under the current BT scores, so pairs of
+    items whose variants are already separated sink. Item priority is `context.priority` (default
+    1). A topic's heap is built from storage on first use; labels re-key the affected item's
+    pairs and new pairs are pushed as they are created. A refit re-keys the queued pairs of the
+    items it touched, in place.
+    """
+
+    def __init__(self, db: Optional[InMemoryDB] = None, bt: Optional[BradleyTerry] = None):
+        self.db = db if db is not None else default_db
+        self._bt = bt
+        self._topics: Dict[str, TopicQueue] = {}
+        self._lock = threading.Lock()
+
+    def _scores(self, vids: List[str], item_id: str) -> Dict[str, Tuple[float, float]]:
+        return (self._bt or get_bt()).get_scores(vids, item_id)
+
+    def _priority(self, item_id: str) -> float:
+        ctx = (self.db.items.get(item_id) or {}).get("context_json") or {}
+        try:
+            return max(float(ctx.get("priority", 1.0)), 0.0)
+        except (TypeError, ValueError):
+            return 1.0
+
+    @staticmethod
+    def _value(pair: Dict[str, Any], scores: Dict[str, Tuple[float, float]], priority: float) -> float:
+        (sa, ea), (sb, eb) = scores[pair["a_id"]], scores[pair["b_id"]]
+        return info_gain(sa - sb, ea * ea + eb * eb) * priority
+
+    def _rekey(self, q: TopicQueue, item_id: str, pairs: List[Dict[str, Any]]) -> None:
+        scores = self._scores(sorted({v for p in pairs for v in (p["a_id"], p["b_id"])}), item_id)
+        priority = self._priority(item_id)
+        for p in pairs:
+            q.heap.set(p["id"], self._value(p, scores, priority))
+            q.by_item.setdefault(item_id, {})[p["id"]] = None
+
+    def _build(self, topic: str) -> TopicQueue:
+        by_item: Dict[str, List[Dict[str, Any]]] = {}
+        for pid in self.db.pair_ids(topic, labeled=False):
+            p = self.db.pairs[pid]
+            by_item.setdefault(p["item_id"], []).append(p)
+        q = self._topics[topic] = TopicQueue(IndexedHeap(), {})
+        for item_id, pairs in by_item.items():
+            self._rekey(q, item_id, pairs)
+        return q
+
+    def top(self, topic: str, limit: int) -> List[str]:
+        """Pair ids of the `limit` most valuable unlabeled pairs of `topic`."""
+        with self._lock:
+            q = self._topics.get(topic) or self._build(topic)
+            return [pid for pid, _ in q.heap.top(max(0, limit))]
+
+    def add(self, pair_id: str) -> None:
+        """Queue a newly created pair (no-op until its topic's heap exists)."""
+        p = self.db.pairs[pair_id]
+        with self._lock:
+            q = self._topics.get(p["topic"])
+            if q is not None:
+                self._rekey(q, p["item_id"], [p])
+
+    def on_label(self, item_id: str, scores: Dict[str, Tuple[float, float]], pair_id: Optional[str] = None) -> None:
+        """Drop the labeled pair and re-key the item's queued pairs touching the changed variants."""
+        with self._lock:
+            for q in self._topics.values():
+                queued = q.by_item.get(item_id)
+                if not queued:
+                    continue
+                if pair_id in queued:
+                    del queued[pair_id]
+                    q.heap.remove(pair_id)
+                touched = [p for p in map(self.db.pairs.get, queued) if p and (p["a_id"] in scores or p["b_id"] in scores)]
+                if touched:
+                    self._rekey(q, item_id, touched)
+
+    def invalidate(self, item_ids: Iterable[str]) -> None:
+        """Re-key the queued pairs of `item_ids` after their scores changed wholesale (refit)."""
+        item_ids = set(item_ids)
+        with self._lock:
+            for q in self._topics.values():
+                for item_id in item_ids.intersection(q.by_item):
+                    pairs = [p for p in map(self.db.pairs.get, q.by_item[item_id]) if p]
+                    if pairs:
+                        self._rekey(q, item_id, pairs)
+
+
+expert_queue = shared("expert_queue", ExpertQueue)
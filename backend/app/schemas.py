@@ -60,6 +60,12 @@ class NextDuelResponse(BaseModel):
     item_id: str
     a_variant_id: str
     b_variant_id: str
+    # True when even the least-settled challenger is resolved against the leader: stop sampling
+    resolved: bool = False
+
+
+class NextDuelBatchResponse(BaseModel):
+    duels: List[NextDuelResponse]
 
 
 class RMScoreRequest(BaseModel):
@@ -77,6 +83,14 @@ class RMScoreResponse(BaseModel):
     top_reason_tags: List[str] = []
 
 
+class RMScoreBatchRequest(BaseModel):
+    pairs: List[RMScoreRequest]
+
+
+class RMScoreBatchResponse(BaseModel):
+    results: List[RMScoreResponse]
+
+
 class JudgeRequest(BaseModel):
     a: Dict[str, Any]
     b: Dict[str, Any]
@@ -101,10 +115,13 @@ class StreamScoreRequest(BaseModel):
     snippet: str
     features: Dict[str, Any] = {}
     cursor: Optional[CursorInfo] = None
-    rm_version: str = "v1"
+    # pin a registered version; unset = current model (or the canary, by user_id)
+    rm_version: Optional[str] = None
     user_id: Optional[str] = None
     item_id: Optional[str] = None
     mode: Optional[str] = "standard"  # off|light|standard|intense
+    # answer relative to this session's previous response (needs user_id); see StreamScoreResponse
+    delta: bool = False
 
 
 class SpanTag(BaseModel):
@@ -121,7 +138,10 @@ class PatchOp(BaseModel):
 
 class Suggestion(BaseModel):
     label: str
-    patch: PatchOp
+    # full rewrite: one text_replace over the whole snippet
+    patch: Optional[PatchOp] = None
+    # delta mode: only the changed ranges, ascending, all in snippet coordinates
+    patches: Optional[List[PatchOp]] = None
 
 
 class StreamScoreResponse(BaseModel):
@@ -133,12 +153,23 @@ class StreamScoreResponse(BaseModel):
     suggestion: Optional[Suggestion] = None
     rm_version: str
     explanations: Dict[str, Any] = {}
+    # delta mode. seq numbers the session's responses. With base_seq set, `spans` is empty:
+    # drop spans_removed (previous coordinates), shift the spans starting at or after edit[1] by
+    # edit[2] - edit[1] (the snippet changed from [edit[0], edit[1]) to [edit[0], edit[2])),
+    # then add spans_added
+    seq: Optional[int] = None
+    base_seq: Optional[int] = None
+    edit: Optional[List[int]] = None
+    spans_added: Optional[List[SpanTag]] = None
+    spans_removed: Optional[List[SpanTag]] = None
 
 
 class CalibrationMeta(BaseModel):
     rm_version: str
     method: str
     params: Dict[str, Any]
+    fitted_at: Optional[float] = None
+    n: int = 0
 
 
 class MetricsStreamResponse(BaseModel):
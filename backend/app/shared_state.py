@@ -0,0 +1,89 @@
+"""Process-wide singletons that can be shared by several uvicorn workers on one host.
+
+Modules create their global state through `shared(name, factory)`. With STATE_SERVER unset this
+simply calls the factory. With STATE_SERVER set, the single instance lives in a coordinator
+process (`python -m backend.app.shared_state`) and every worker gets a proxy to it, so scores,
+stream sessions, metrics, calibration and the current RM version stay consistent across workers.
+
+Proxies only forward method calls (and item access for dicts), so shared objects must be used
+through methods and must be thread-safe: the coordinator serves each worker connection on its
+own thread.
+"""
+from __future__ import annotations
+
+import sys
+from multiprocessing.managers import BaseManager, DictProxy
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from .config import config
+
+
+class StateManager(BaseManager):
+    pass
+
+
+_serving = False
+_local: Dict[str, Any] = {}
+_proxytypes: Dict[str, Any] = {}
+_manager: Optional[StateManager] = None
+
+
+def parse_address(addr: str) -> Union[str, Tuple[str, int]]:
+    host, sep, port = addr.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return addr  # unix socket path
+
+
+def _connect() -> StateManager:
+    global _manager
+    if _manager is None:
+        assert config.state_server
+        m = StateManager(address=parse_address(config.state_server), authkey=config.state_authkey.encode())
+        m.connect()
+        _manager = m
+    return _manager
+
+
+def shared(name: str, factory: Callable[[], Any], proxytype: Any = None) -> Any:
+    """Return the instance registered as `name`: local, or a proxy to the coordinator's copy."""
+    _proxytypes[name] = proxytype
+    if _serving or not config.state_server:
+        obj = _local[name] = factory()
+        return obj
+    m = _connect()
+    StateManager.register(name, proxytype=proxytype)
+    return getattr(m, name)()
+
+
+def shared_dict(name: str, factory: Callable[[], Dict[str, Any]] = dict) -> Dict[str, Any]:
+    return shared(name, factory, proxytype=DictProxy)
+
+
+def is_remote() -> bool:
+    return bool(config.state_server) and not _serving
+
+
+def serve(address: str, authkey: str) -> None:
+    global _serving
+    _serving = True
+    # importing these modules creates the singletons in this process via shared()
+    from . import calibration, rank_cache, rm, scheduler, streaming  # noqa: F401
+    from .bt import get_bt
+    from .bt_fit import Refitter
+
+    get_bt()
+    for name, obj in _local.items():
+        StateManager.register(name, callable=lambda obj=obj: obj, proxytype=_proxytypes.get(name))
+    Refitter(config.bt_refit_interval_s).start()
+    manager = StateManager(address=parse_address(address), authkey=authkey.encode())
+    server = manager.get_server()
+    print(f"shared state server listening on {address} ({', '.join(sorted(_local))})", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    # run serve() from the package module, not this __main__ copy, so shared() sees _serving
+    from backend.app import shared_state as _module
+
+    _module.serve(sys.argv[1] if len(sys.argv) > 1 else (config.state_server or "127.0.0.1:7300"), config.state_authkey)
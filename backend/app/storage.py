@@ -1,26 +1,351 @@
 from __future__ import annotations
 
+import math
 import time
 import threading
-from typing import Dict, List, Optional, Tuple, Any
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager
+from enum import Enum
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Any
+
+from .config import config
+from .retention import retention
+
+
+TABLES = (
+    "items",
+    "variants",
+    "comparisons",
+    "scores",
+    "raters",
+    "gold_pairs",
+    "abuse_reports",
+    "stream_events",
+    "rm_calibration",
+    "pairs",
+    "users",
+    "idempotency",
+)
+INDEXES = ("_variants_by_item", "_comparisons_by_item", "_pairs_by_topic")
+
+
+class Interner:
+    """Maps hashable values to dense small ints; None is always -1."""
+
+    def __init__(self) -> None:
+        self.codes: Dict[Any, int] = {}
+        self.values: List[Any] = []
+
+    def code(self, value: Any) -> int:
+        if value is None:
+            return -1
+        c = self.codes.get(value)
+        if c is None:
+            c = len(self.values)
+            self.codes[value] = c
+            self.values.append(value)
+        return c
+
+    def value(self, code: int) -> Any:
+        return None if code < 0 else self.values[code]
+
+    def copy(self) -> "Interner":
+        out = Interner()
+        out.codes = dict(self.codes)
+        out.values = list(self.values)
+        return out
+
+
+# Column kinds: "str" interned id (int32), "enum" small vocabulary (uint8), "tags" interned tuple (int32),
+# "bool" (int8), "float" (float64, None stored as NaN), "obj" arbitrary Python object.
+_TYPECODES = {"str": "i", "enum": "B", "tags": "i", "bool": "b", "float": "d"}
+
+
+class _Sentinel(Enum):
+    # an enum member pickles by reference, so `is _EMPTY` still holds after a snapshot restore
+    EMPTY = "empty"
+
+
+# shared stand-in for {} in "obj" columns, so empty suggestions cost no dict per row
+_EMPTY = _Sentinel.EMPTY
+
+COMPARISON_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("item_id", "str"),
+    ("a_id", "str"),
+    ("b_id", "str"),
+    ("winner_id", "str"),
+    ("judge_type", "enum"),
+    ("rater_id", "str"),
+    ("tags", "tags"),
+    ("abstain", "bool"),
+    ("confidence", "float"),
+    ("created_at", "float"),
+)
+STREAM_EVENT_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("user_id", "str"),
+    ("item_id", "str"),
+    ("variant_id", "str"),
+    ("state", "enum"),
+    ("p_win", "float"),
+    ("tags", "tags"),
+    ("suggestion", "obj"),
+    ("created_at", "float"),
+)
+
+
+class RowView(Mapping):
+    """Read-only dict-like view of one ColumnTable row.
+
+    Holds the row number, not a slot, so it stays valid across head compaction; reads raise
+    KeyError once the row has been deleted or evicted.
+    """
+
+    __slots__ = ("_table", "_n")
+
+    def __init__(self, table: "ColumnTable", n: int):
+        self._table = table
+        self._n = n
+
+    def __getitem__(self, field: str) -> Any:
+        return self._table._get(self._n, field)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table.field_names)
+
+    def __len__(self) -> int:
+        return len(self._table.field_names)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class ColumnTable(MutableMapping):
+    """Array-backed table for append-mostly rows keyed by sequential ids (`<prefix>_<n>`).
+
+    Row n lives in slot n - 1 - base of every column, so no per-row key or dict is stored.
+    Reads return RowView objects; writes replace whole rows.
+    """
+
+    def __init__(self, prefix: str, fields: Tuple[Tuple[str, str], ...]):
+        self.prefix = prefix
+        self.fields = fields
+        self.field_names = ("id",) + tuple(name for name, _ in fields)
+        self._kinds = dict(fields)
+        self._cols: Dict[str, Any] = {
+            name: (array(_TYPECODES[kind]) if kind in _TYPECODES else []) for name, kind in fields
+        }
+        self._alive = bytearray()
+        self._base = 0
+        # first slot that may still be alive; slots before it are evicted
+        self._head = 0
+        self._count = 0
+        self._strings = Interner()
+        self._tags = Interner()
+        self._enums: Dict[str, Interner] = {name: Interner() for name, kind in fields if kind == "enum"}
+
+    def _slot(self, key: Any) -> int:
+        if not isinstance(key, str) or not key.startswith(self.prefix + "_"):
+            return -1
+        n = key[len(self.prefix) + 1 :]
+        if not n.isdigit():
+            return -1
+        slot = int(n) - 1 - self._base
+        if slot < 0:
+            return -1
+        return slot
+
+    def _get(self, n: int, field: str) -> Any:
+        slot = n - 1 - self._base
+        if slot < 0 or slot >= len(self._alive) or not self._alive[slot]:
+            raise KeyError(f"{self.prefix}_{n}")
+        if field == "id":
+            return f"{self.prefix}_{n}"
+        kind = self._kinds[field]
+        v = self._cols[field][slot]
+        if kind == "str":
+            return self._strings.value(v)
+        if kind == "enum":
+            return self._enums[field].value(v - 1)
+        if kind == "tags":
+            return list(self._tags.value(v) or ())
+        if kind == "bool":
+            return bool(v)
+        if kind == "float":
+            return None if math.isnan(v) else v
+        return {} if v is _EMPTY else v
+
+    def _encode(self, field: str, kind: str, value: Any) -> Any:
+        if kind == "str":
+            return self._strings.code(value)
+        if kind == "enum":
+            code = self._enums[field].code(value) + 1
+            if code > 255:
+                raise ValueError(f"too many distinct values for enum column {field}")
+            return code
+        if kind == "tags":
+            return self._tags.code(tuple(value or ()))
+        if kind == "bool":
+            return 1 if value else 0
+        if kind == "float":
+            return math.nan if value is None else float(value)
+        return _EMPTY if value == {} else value
+
+    def __getitem__(self, key: str) -> RowView:
+        slot = self._slot(key)
+        if slot < 0 or slot >= len(self._alive) or not self._alive[slot]:
+            raise KeyError(key)
+        return RowView(self, slot + 1 + self._base)
+
+    def __contains__(self, key: object) -> bool:
+        slot = self._slot(key)
+        return 0 <= slot < len(self._alive) and bool(self._alive[slot])
+
+    def __setitem__(self, key: str, row: Mapping) -> None:
+        slot = self._slot(key)
+        if slot < 0:
+            if isinstance(key, str) and key.startswith(self.prefix + "_"):
+                return  # older than the retained window
+            raise KeyError(f"{key!r} is not a {self.prefix}_<n> id")
+        encoded = [(name, self._encode(name, kind, row.get(name))) for name, kind in self.fields]
+        while len(self._alive) <= slot:
+            for name, kind in self.fields:
+                col = self._cols[name]
+                col.append(math.nan if kind == "float" else (None if kind == "obj" else 0))
+            self._alive.append(0)
+        for name, value in encoded:
+            self._cols[name][slot] = value
+        if not self._alive[slot]:
+            self._alive[slot] = 1
+            self._count += 1
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        slot = self._slot(key)
+        self._alive[slot] = 0
+        self._count -= 1
+        if self._kinds.get("suggestion") == "obj":
+            self._cols["suggestion"][slot] = None
+
+    def __iter__(self) -> Iterator[str]:
+        base, alive = self._base, self._alive
+        return (f"{self.prefix}_{slot + 1 + base}" for slot in range(len(alive)) if alive[slot])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def values(self):  # type: ignore[override]
+        base, alive = self._base, self._alive
+        return [RowView(self, slot + 1 + base) for slot in range(len(alive)) if alive[slot]]
+
+    def items(self):  # type: ignore[override]
+        return [(row["id"], row) for row in self.values()]
+
+    def oldest(self) -> Optional[int]:
+        """Slot of the oldest live row (or None); compacts evicted head slots away, amortized O(1)."""
+        alive = self._alive
+        h = self._head
+        while h < len(alive) and not alive[h]:
+            h += 1
+        if h >= 4096 and h * 2 >= len(alive):
+            for col in self._cols.values():
+                del col[:h]
+            del alive[:h]
+            self._base += h
+            h = 0
+        self._head = h
+        return h if h < len(alive) else None
+
+    def key_of(self, slot: int) -> str:
+        return f"{self.prefix}_{slot + 1 + self._base}"
+
+    def rows_after(self, n: int) -> Tuple[List[RowView], int]:
+        """Live rows with id number > n, and the id number to resume from next time."""
+        end = len(self._alive)
+        alive = self._alive
+        base = self._base
+        rows = [RowView(self, s + 1 + base) for s in range(max(n - base, self._head), end) if alive[s]]
+        return rows, end + self._base
+
+    def column(self, field: str) -> Any:
+        """Raw encoded column (see Interner / _TYPECODES) for vectorized readers."""
+        return self._cols[field]
+
+    def copy(self) -> "ColumnTable":
+        out = ColumnTable.__new__(ColumnTable)
+        out.__dict__.update(self.__dict__)
+        out._cols = {name: col[:] for name, col in self._cols.items()}
+        out._alive = bytearray(self._alive)
+        out._strings = self._strings.copy()
+        out._tags = self._tags.copy()
+        out._enums = {name: e.copy() for name, e in self._enums.items()}
+        return out
+
+
+class StripedLock:
+    """A fixed pool of re-entrant locks; a key always maps to the same stripe."""
+
+    def __init__(self, stripes: int = 64):
+        self._locks = [threading.RLock() for _ in range(stripes)]
+
+    def index(self, key: Any) -> int:
+        return hash(key) % len(self._locks)
+
+    @contextmanager
+    def hold(self, *keys: Any):
+        # acquire in stripe order so overlapping multi-key holders cannot deadlock
+        idx = sorted({self.index(k) for k in keys})
+        for i in idx:
+            self._locks[i].acquire()
+        try:
+            yield
+        finally:
+            for i in reversed(idx):
+                self._locks[i].release()
 
 
 class InMemoryDB:
     def __init__(self) -> None:
         self._lock = threading.Lock()
+        # one lock per table around apply+log: writers to different tables never contend, and a
+        # snapshot cut (all table locks) never splits a write from its WAL record
+        self._table_locks: Dict[str, threading.Lock] = {name: threading.Lock() for name in TABLES}
+        # per-item locks for multi-row read-modify-write sequences, see transaction()
+        self._item_locks = StripedLock()
+        # set by persistence.open_persistence when STORAGE_DIR is configured
+        self._wal = None
+        # called before each snapshot so caches holding the only copy of some rows can write them
+        self.snapshot_hooks: List[Callable[[], Any]] = []
         self._seq: Dict[str, int] = {}
         self.items: Dict[str, Dict[str, Any]] = {}
         self.variants: Dict[str, Dict[str, Any]] = {}
-        self.comparisons: Dict[str, Dict[str, Any]] = {}
+        # the two largest tables are columnar; rows read back as RowView
+        self.comparisons: MutableMapping = ColumnTable("comparisons", COMPARISON_FIELDS)
         self.scores: Dict[str, Dict[str, float]] = {}
         self.raters: Dict[str, Dict[str, Any]] = {}
         self.gold_pairs: Dict[str, Dict[str, Any]] = {}
         self.abuse_reports: Dict[str, Dict[str, Any]] = {}
-        self.stream_events: Dict[str, Dict[str, Any]] = {}
+        self.stream_events: MutableMapping = ColumnTable("stream_event", STREAM_EVENT_FIELDS)
         self.rm_calibration: Dict[str, Dict[str, Any]] = {}
         self.pairs: Dict[str, Dict[str, Any]] = {}
         self.users: Dict[str, Dict[str, Any]] = {}
-        self.idempotency: Dict[str, Any] = {}
+        # insertion/recency ordered so retention can evict from the front in O(1)
+        self.idempotency: "OrderedDict[str, Any]" = OrderedDict()
+        # Secondary indexes, kept current by _apply below
+        self._variants_by_item: Dict[str, List[str]] = {}
+        # item_id -> comparison numbers (comparisons_<n>), kept as int64 arrays to stay compact
+        self._comparisons_by_item: Dict[str, array] = {}
+        # (topic, labeled) -> ordered set of pair ids (dict keeps insertion order)
+        self._pairs_by_topic: Dict[Tuple[str, bool], Dict[str, None]] = {}
+        # numbers of comparisons changed after creation, in update order, for the incremental
+        # reader (comparison_updates_since), which releases what it has consumed. Entry i is
+        # update number _comparison_updates_base + i. Not persisted: a restarted reader starts
+        # from 0. Per process, which is all InMemoryDB is; SQLiteDB keeps this log in the file.
+        self._comparison_updates = array("q")
+        self._comparison_updates_base = 0
 
     def _next_id(self, table: str) -> str:
         with self._lock:
@@ -31,10 +356,104 @@ class InMemoryDB:
     def now(self) -> float:
         return time.time()
 
+    # Write path: every mutation goes through _put/_delete so it can be logged and replayed.
+    # Rows are replaced, never mutated in place, so a shallow table copy is a consistent snapshot.
+    def _put(self, table: str, key: str, row: Any, seq: Optional[str] = None) -> None:
+        with self._table_locks[table]:
+            self._apply(table, key, row)
+            if self._wal is not None:
+                self._wal.append(("put", table, key, row, seq))
+
+    def _delete(self, table: str, key: str) -> None:
+        with self._table_locks[table]:
+            self._remove(table, key)
+            if self._wal is not None:
+                self._wal.append(("del", table, key))
+
+    @contextmanager
+    def write_barrier(self):
+        """Block every writer (all table locks, in a fixed order), e.g. for a snapshot cut."""
+        for name in TABLES:
+            self._table_locks[name].acquire()
+        try:
+            yield
+        finally:
+            for name in reversed(TABLES):
+                self._table_locks[name].release()
+
+    def transaction(self, *item_ids: str):
+        """Serialize read-modify-write sequences on the given items (striped, re-entrant).
+
+        Writes inside still go through _put one row at a time; the lock only guarantees that no
+        other transaction on the same items interleaves with them.
+        """
+        return self._item_locks.hold(*item_ids)
+
+    def _apply(self, table: str, key: str, row: Any) -> None:
+        rows = getattr(self, table)
+        is_new = key not in rows
+        rows[key] = row
+        if table == "variants" and is_new:
+            self._variants_by_item.setdefault(row["item_id"], []).append(key)
+        elif table == "comparisons" and is_new:
+            self._comparisons_by_item.setdefault(row["item_id"], array("q")).append(int(key.rsplit("_", 1)[1]))
+        elif table == "pairs":
+            labeled = bool(row.get("labeled"))
+            self._pairs_by_topic.get((row["topic"], not labeled), {}).pop(key, None)
+            self._pairs_by_topic.setdefault((row["topic"], labeled), {})[key] = None
+
+    def _remove(self, table: str, key: str) -> None:
+        rows = getattr(self, table)
+        if key not in rows:
+            return
+        row = rows[key]
+        item_id = row.get("item_id") if isinstance(row, Mapping) else None
+        topic, labeled = (row.get("topic"), bool(row.get("labeled"))) if table == "pairs" else (None, False)
+        del rows[key]
+        if table == "variants":
+            ids = self._variants_by_item.get(item_id, [])
+            if key in ids:
+                ids.remove(key)
+        elif table == "comparisons":
+            nums = self._comparisons_by_item.get(item_id, array("q"))
+            n = int(key.rsplit("_", 1)[1])
+            if n in nums:
+                nums.remove(n)
+        elif table == "pairs":
+            self._pairs_by_topic.get((topic, labeled), {}).pop(key, None)
+
+    def replay(self, record: tuple) -> None:
+        """Re-apply one WAL record (see persistence.WriteAheadLog)."""
+        if record[0] == "put":
+            _, table, key, row, seq = record
+            self._apply(table, key, row)
+            if seq:
+                n = int(key.rsplit("_", 1)[1])
+                if n > self._seq.get(seq, 0):
+                    self._seq[seq] = n
+        elif record[0] == "del":
+            self._remove(record[1], record[2])
+
+    def state(self) -> Dict[str, Any]:
+        """Shallow copy of tables, indexes and sequences; call under write_barrier()."""
+        out: Dict[str, Any] = {}
+        for name in TABLES:
+            out[name] = getattr(self, name).copy()
+        out["_variants_by_item"] = {k: list(v) for k, v in self._variants_by_item.items()}
+        out["_comparisons_by_item"] = {k: v[:] for k, v in self._comparisons_by_item.items()}
+        out["_pairs_by_topic"] = {k: dict(v) for k, v in self._pairs_by_topic.items()}
+        out["_seq"] = dict(self._seq)
+        return out
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        for name in TABLES + INDEXES + ("_seq",):
+            if name in state:
+                setattr(self, name, state[name])
+
     # Items
     def create_item(self, user_id: str, modality: str, context: dict, content_refs: dict, features: dict) -> str:
         item_id = self._next_id("items")
-        self.items[item_id] = {
+        self._put("items", item_id, {
             "id": item_id,
             "user_id": user_id,
             "modality": modality,
@@ -42,24 +461,36 @@ class InMemoryDB:
             "content_refs": content_refs,
             "features_json": features,
             "created_at": self.now(),
-        }
+        }, seq="items")
         return item_id
 
     # Variants
     def create_variant(self, item_id: str, content_ref: dict, features: dict, diff_type: str) -> str:
         v_id = self._next_id("variants")
-        self.variants[v_id] = {
+        self._put("variants", v_id, {
             "id": v_id,
             "item_id": item_id,
             "content_ref": content_ref,
             "features_json": features,
             "diff_type": diff_type,
             "created_at": self.now(),
-        }
+        }, seq="variants")
         # init score record if absent
-        self.scores.setdefault(v_id, {"s": 0.0, "stderr": 1.0})
+        if v_id not in self.scores:
+            self.set_score(v_id, 0.0, config.bt_prior ** -0.5)
         return v_id
 
+    def variant_ids(self, item_id: str) -> List[str]:
+        return list(self._variants_by_item.get(item_id, ()))
+
+    # Scores
+    def set_score(self, v_id: str, s: float, stderr: float) -> None:
+        self._put("scores", v_id, {"s": s, "stderr": stderr})
+
+    # RM calibration fits, one record per rm_version (see calibration.fit_calibration)
+    def set_calibration(self, rm_version: str, record: Dict[str, Any]) -> None:
+        self._put("rm_calibration", rm_version, record)
+
     # Comparisons
     def create_comparison(
         self,
@@ -74,7 +505,7 @@ class InMemoryDB:
         confidence: Optional[float] = None,
     ) -> str:
         c_id = self._next_id("comparisons")
-        self.comparisons[c_id] = {
+        self._put("comparisons", c_id, {
             "id": c_id,
             "item_id": item_id,
             "a_id": a_id,
@@ -86,24 +517,68 @@ class InMemoryDB:
             "abstain": abstain,
             "confidence": confidence,
             "created_at": self.now(),
-        }
+        }, seq="comparisons")
         return c_id
 
+    def update_comparison(self, c_id: str, **fields: Any) -> None:
+        row = dict(self.comparisons[c_id])
+        row.update(fields)
+        self._put("comparisons", c_id, row)
+        with self._table_locks["comparisons"]:
+            self._comparison_updates.append(int(c_id.rsplit("_", 1)[1]))
+
+    def comparison_ids(self, item_id: str) -> List[str]:
+        return [f"comparisons_{n}" for n in self._comparisons_by_item.get(item_id, ())]
+
+    def comparisons_since(self, cursor: int = 0) -> Tuple[List[Any], int]:
+        """Comparisons recorded after `cursor` (0 = all) and the cursor to pass next time."""
+        return self.comparisons.rows_after(cursor)
+
+    def comparison_updates_since(self, cursor: int = 0) -> Tuple[List[Any], int]:
+        """Current rows of comparisons updated after `cursor` (0 = since start), each once, and
+        the cursor to pass next time.
+
+        There is one consumer (the reliability EM): passing `cursor` releases every update before
+        it, so the log holds only what the consumer has not yet caught up with.
+        """
+        with self._table_locks["comparisons"]:
+            log, base = self._comparison_updates, self._comparison_updates_base
+            consumed = min(max(cursor - base, 0), len(log))
+            del log[:consumed]
+            base = self._comparison_updates_base = base + consumed
+            end = base + len(log)
+            nums = dict.fromkeys(log)
+        rows = [self.comparisons.get(f"comparisons_{n}") for n in nums]
+        return [r for r in rows if r is not None], end
+
     # Raters
     def upsert_rater(self, r_id: str, r_type: str, domain: str, alpha: float, trust: float):
-        self.raters[r_id] = {
+        self._put("raters", r_id, {
             "id": r_id,
             "type": r_type,
             "domain": domain,
             "alpha": alpha,
             "trust": trust,
             "created_at": self.now(),
-        }
+        })
+
+    # Gold pairs: pairs with a known answer, used to anchor rater reliability
+    def create_gold_pair(self, item_id: str, a_id: str, b_id: str, winner_id: str) -> str:
+        g_id = self._next_id("gold_pairs")
+        self._put("gold_pairs", g_id, {
+            "id": g_id,
+            "item_id": item_id,
+            "a_id": a_id,
+            "b_id": b_id,
+            "winner_id": winner_id,
+            "created_at": self.now(),
+        }, seq="gold_pairs")
+        return g_id
 
     # Stream events
     def append_stream_event(self, user_id: str, item_id: str | None, variant_id: str | None, state: str, p_win: float, tags: list, suggestion: dict) -> str:
         e_id = self._next_id("stream_event")
-        self.stream_events[e_id] = {
+        self._put("stream_events", e_id, {
             "id": e_id,
             "user_id": user_id,
             "item_id": item_id,
@@ -113,13 +588,14 @@ class InMemoryDB:
             "tags": tags,
             "suggestion": suggestion,
             "created_at": self.now(),
-        }
+        }, seq="stream_event")
+        self._sweep("stream_events")
         return e_id
 
     # Pairs
     def create_pair(self, item_id: str, a_id: str, b_id: str, topic: str) -> str:
         p_id = self._next_id("pair")
-        self.pairs[p_id] = {
+        self._put("pairs", p_id, {
             "id": p_id,
             "item_id": item_id,
             "a_id": a_id,
@@ -128,8 +604,80 @@ class InMemoryDB:
             "created_at": self.now(),
             "labeled": False,
             "abstain": False,
-        }
+        }, seq="pair")
         return p_id
 
+    def pair_ids(self, topic: str, labeled: bool = False, limit: Optional[int] = None) -> List[str]:
+        ids = self._pairs_by_topic.get((topic, labeled), {})
+        if limit is None:
+            return list(ids)
+        return list(islice(ids, max(0, limit)))
+
+    def mark_pair_labeled(self, p_id: str, abstain: bool) -> None:
+        row = dict(self.pairs[p_id])
+        row["labeled"] = True
+        row["abstain"] = abstain
+        self._put("pairs", p_id, row)
+
+    # Misc small tables
+    def create_abuse_report(self, item_id: str, reporter_id: str, reason: str) -> str:
+        rid = self._next_id("abuse_reports")
+        self._put("abuse_reports", rid, {
+            "id": rid,
+            "item_id": item_id,
+            "reporter_id": reporter_id,
+            "reason": reason,
+            "created_at": self.now(),
+        }, seq="abuse_reports")
+        return rid
+
+    def set_user(self, user_id: str, rec: Dict[str, Any]) -> None:
+        self._put("users", user_id, rec)
+
+    def get_idempotent(self, key: str) -> Any:
+        ttl = retention.policies.get("idempotency", {}).get("ttl_s")
+        # the recency bump reorders the table, so it excludes writers and sweeps like _put does
+        with self._table_locks["idempotency"]:
+            rec = self.idempotency.get(key)
+            if rec is None:
+                return None
+            if ttl and rec["created_at"] < self.now() - ttl:
+                return None
+            if isinstance(self.idempotency, OrderedDict):
+                self.idempotency.move_to_end(key)
+            return rec["response"]
+
+    def set_idempotent(self, key: str, resp: Any) -> None:
+        self._put("idempotency", key, {"response": resp, "created_at": self.now()})
+        self._sweep("idempotency")
+
+    # Retention: evict from the oldest end of a table (see retention.Retention.sweep)
+    def _sweep(self, table: str) -> int:
+        return retention.sweep(table, lambda: self._oldest(table), lambda k: self._delete(table, k), lambda: self._size(table), now=self.now())
+
+    def _oldest(self, table: str) -> Optional[Tuple[str, float]]:
+        rows = getattr(self, table)
+        # reading the head (and compacting a ColumnTable) must not interleave with _put's slot math
+        with self._table_locks[table]:
+            if isinstance(rows, ColumnTable):
+                slot = rows.oldest()
+                if slot is None:
+                    return None
+                return rows.key_of(slot), rows.column("created_at")[slot]
+            for key, rec in rows.items():
+                return key, rec["created_at"]
+        return None
+
+    def _size(self, table: str) -> int:
+        return len(getattr(self, table))
+
+
+def make_db() -> InMemoryDB:
+    if config.storage_backend == "sqlite":
+        from .storage_sqlite import SQLiteDB
+
+        return SQLiteDB(config.sqlite_path, read_pool=config.sqlite_read_pool, max_batch=config.sqlite_max_batch)
+    return InMemoryDB()
+
 
-db = InMemoryDB()
+db = make_db()
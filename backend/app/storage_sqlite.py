@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import json
+import queue
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .storage import InMemoryDB, TABLES
+
+
+# columns lifted out of the JSON row so they can be indexed
+COLUMNS = ("item_id", "topic", "user_id", "labeled", "created_at")
+INDEXED: Dict[str, List[Tuple[str, ...]]] = {
+    "items": [("user_id",)],
+    "variants": [("item_id",)],
+    "comparisons": [("item_id",)],
+    "pairs": [("topic", "labeled"), ("item_id",)],
+    "stream_events": [("user_id",), ("created_at",)],
+    "idempotency": [("created_at",)],
+}
+# ids are reserved from the seq table in blocks so several processes can share one file
+ID_BLOCK = 256
+
+_STOP = object()
+
+
+def _columns(row: Any) -> Tuple[Any, ...]:
+    if not isinstance(row, dict):
+        return (None, None, None, None, None)
+    labeled = row.get("labeled")
+    return (
+        row.get("item_id"),
+        row.get("topic"),
+        row.get("user_id"),
+        None if labeled is None else int(bool(labeled)),
+        row.get("created_at"),
+    )
+
+
+class SQLiteTable(MutableMapping):
+    """Dict-style view over one SQLite table; values are decoded copies of the stored rows."""
+
+    def __init__(self, db: "SQLiteDB", name: str):
+        self._db = db
+        self.name = name
+
+    def __getitem__(self, key: str) -> Any:
+        rows = self._db._read(f"SELECT data FROM {self.name} WHERE id = ?", (key,))
+        if not rows:
+            raise KeyError(key)
+        return json.loads(rows[0][0])
+
+    def __setitem__(self, key: str, row: Any) -> None:
+        self._db._put(self.name, key, row)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._db._delete(self.name, key)
+
+    def __contains__(self, key: object) -> bool:
+        return bool(self._db._read(f"SELECT 1 FROM {self.name} WHERE id = ?", (key,)))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([r[0] for r in self._db._read(f"SELECT id FROM {self.name} ORDER BY rowid")])
+
+    def __len__(self) -> int:
+        return self._db._read(f"SELECT COUNT(*) FROM {self.name}")[0][0]
+
+    def values(self):  # type: ignore[override]
+        return [json.loads(r[0]) for r in self._db._read(f"SELECT data FROM {self.name} ORDER BY rowid")]
+
+    def items(self):  # type: ignore[override]
+        return [(r[0], json.loads(r[1])) for r in self._db._read(f"SELECT id, data FROM {self.name} ORDER BY rowid")]
+
+
+class SQLiteDB(InMemoryDB):
+    """SQLite-backed store with the InMemoryDB method surface.
+
+    The database runs in WAL mode. All writes go through one writer thread that commits whatever is
+    queued in a single transaction (group commit), and callers block until their batch is durable.
+    Reads use a small pool of read-only connections, so they never wait on the writer.
+    """
+
+    def __init__(self, path: str, read_pool: int = 4, max_batch: int = 256):
+        super().__init__()
+        self.path = path
+        self.max_batch = max_batch
+        self._writes: "queue.Queue[Any]" = queue.Queue()
+        self._id_blocks: Dict[str, Tuple[int, int]] = {}
+
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("CREATE TABLE IF NOT EXISTS seq (name TEXT PRIMARY KEY, n INTEGER NOT NULL)")
+        # comparisons changed after creation, shared by every process on the file
+        conn.execute("CREATE TABLE IF NOT EXISTS comparison_updates (seq INTEGER PRIMARY KEY AUTOINCREMENT, n INTEGER NOT NULL)")
+        for name in TABLES:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} (id TEXT PRIMARY KEY, "
+                + ", ".join(COLUMNS)
+                + ", data TEXT NOT NULL)"
+            )
+            for cols in INDEXED.get(name, []):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{name}_{'_'.join(cols)} ON {name} ({', '.join(cols)})")
+        self._writer_conn = conn
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(max(1, read_pool)):
+            self._readers.put(
+                sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False, isolation_level=None)
+            )
+        for name in TABLES:
+            setattr(self, name, SQLiteTable(self, name))
+
+    # Writer
+    def _submit(self, sql: str, params: tuple) -> Any:
+        fut: Future = Future()
+        self._writes.put((sql, params, fut))
+        return fut.result()
+
+    def _write_loop(self) -> None:
+        conn = self._writer_conn
+        while True:
+            op = self._writes.get()
+            if op is _STOP:
+                break
+            batch = [op]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    nxt = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            try:
+                self._commit(batch)
+            except Exception:
+                # isolate the failing request instead of failing the whole group
+                for op in batch:
+                    try:
+                        self._commit([op])
+                    except Exception as e:
+                        op[2].set_exception(e)
+            if stop:
+                break
+        conn.close()
+
+    def _commit(self, batch: List[Tuple[str, tuple, Future]]) -> None:
+        conn = self._writer_conn
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for sql, params, _ in batch:
+                results.append(conn.execute(sql, params).fetchall())
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        for (_, _, fut), res in zip(batch, results):
+            fut.set_result(res)
+
+    def _read(self, sql: str, params: tuple = ()) -> List[tuple]:
+        conn = self._readers.get()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            self._readers.put(conn)
+
+    def close(self) -> None:
+        self._writes.put(_STOP)
+        self._writer.join()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+    # InMemoryDB hooks
+    def _next_id(self, table: str) -> str:
+        with self._lock:
+            nxt, end = self._id_blocks.get(table, (0, 0))
+            if nxt >= end:
+                rows = self._submit(
+                    "INSERT INTO seq (name, n) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET n = n + excluded.n RETURNING n",
+                    (table, ID_BLOCK),
+                )
+                end = rows[0][0]
+                nxt = end - ID_BLOCK
+            self._id_blocks[table] = (nxt + 1, end)
+        return f"{table}_{nxt + 1}"
+
+    def _put(self, table: str, key: str, row: Any, seq: Optional[str] = None) -> None:
+        cols = ", ".join(COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in COLUMNS + ("data",))
+        self._submit(
+            f"INSERT INTO {table} (id, {cols}, data) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}",
+            (key, *_columns(row), json.dumps(row)),
+        )
+
+    def _delete(self, table: str, key: str) -> None:
+        self._submit(f"DELETE FROM {table} WHERE id = ?", (key,))
+
+    # Secondary lookups
+    def variant_ids(self, item_id: str) -> List[str]:
+        return [r[0] for r in self._read("SELECT id FROM variants WHERE item_id = ? ORDER BY rowid", (item_id,))]
+
+    def comparison_ids(self, item_id: str) -> List[str]:
+        return [r[0] for r in self._read("SELECT id FROM comparisons WHERE item_id = ? ORDER BY rowid", (item_id,))]
+
+    def pair_ids(self, topic: str, labeled: bool = False, limit: Optional[int] = None) -> List[str]:
+        rows = self._read(
+            "SELECT id FROM pairs WHERE topic = ? AND labeled = ? ORDER BY rowid LIMIT ?",
+            (topic, int(labeled), -1 if limit is None else max(0, limit)),
+        )
+        return [r[0] for r in rows]
+
+    def comparisons_since(self, cursor: int = 0) -> Tuple[List[Any], int]:
+        rows = self._read("SELECT rowid, data FROM comparisons WHERE rowid > ? ORDER BY rowid", (cursor,))
+        return [json.loads(r[1]) for r in rows], (rows[-1][0] if rows else cursor)
+
+    def update_comparison(self, c_id: str, **fields: Any) -> None:
+        row = dict(self.comparisons[c_id])
+        row.update(fields)
+        self._put("comparisons", c_id, row)
+        self._submit("INSERT INTO comparison_updates (n) VALUES (?)", (int(c_id.rsplit("_", 1)[1]),))
+
+    def comparison_updates_since(self, cursor: int = 0) -> Tuple[List[Any], int]:
+        if cursor:
+            # the single consumer has applied everything up to `cursor`
+            self._submit("DELETE FROM comparison_updates WHERE seq <= ?", (cursor,))
+        log = self._read("SELECT seq, n FROM comparison_updates WHERE seq > ? ORDER BY seq", (cursor,))
+        rows = [self.comparisons.get(f"comparisons_{n}") for n in dict.fromkeys(r[1] for r in log)]
+        return [r for r in rows if r is not None], (log[-1][0] if log else cursor)
+
+    # Retention: the oldest row by insertion order; rowid span is an O(log n) upper bound on size
+    def _oldest(self, table: str) -> Optional[Tuple[str, float]]:
+        rows = self._read(f"SELECT id, created_at FROM {table} ORDER BY rowid LIMIT 1")
+        return (rows[0][0], rows[0][1] or 0.0) if rows else None
+
+    def _size(self, table: str) -> int:
+        return self._read(f"SELECT COALESCE(MAX(rowid) - MIN(rowid) + 1, 0) FROM {table}")[0][0]
+
+    def state(self) -> Dict[str, Any]:
+        raise NotImplementedError("SQLiteDB is durable on its own; snapshots apply to InMemoryDB only")
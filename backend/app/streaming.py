@@ -1,91 +1,111 @@
 from __future__ import annotations
 
-import math
-import time
 import re
-from typing import Dict, Any, List, Tuple
+import time
+import threading
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from typing import Dict, Any, FrozenSet, List, NamedTuple, Optional, Tuple
 
+from .calibration import get_calibrator
 from .rm import get_rm
 from .config import config
-from .adapters.text_adapter import text_features
+from .adapters.feature_cache import feature_cache
+from .adapters.lexicon import HEDGE_RE, remove_hedges_ops, scan
+from .adapters.text_adapter import compute_text_features
 from .variants import remove_hedges, add_concrete_ask
+from .retention import retention
+from .shared_state import shared
 
 
-class PlattCalibrator:
-    def __init__(self, a: float = 1.0, b: float = 0.0):
-        self.a = a
-        self.b = b
-
-    def calibrate(self, z: float) -> float:
-        return 1.0 / (1.0 + math.exp(-(self.a * z + self.b)))
+class StreamSession:
+    """Hysteresis/cooldown state of one (user_id, item_id) streaming session."""
 
+    __slots__ = ("last_state", "last_ts", "good_run", "bad_run", "last_seen")
 
-# In-memory artifacts and state
-calibration_store: Dict[str, Dict[str, Any]] = {
-    config.rm_version: {"method": "platt", "params": {"a": 1.0, "b": 0.0}, "obj": PlattCalibrator(1.0, 0.0)}
-}
+    def __init__(self) -> None:
+        self.last_state = "neutral"
+        self.last_ts = 0.0  # last emission, ms
+        self.good_run = 0
+        self.bad_run = 0
+        self.last_seen = 0.0  # last update, s
 
 
-def get_calibrator(rm_version: str) -> PlattCalibrator:
-    art = calibration_store.get(rm_version)
-    if art and art.get("obj"):
-        return art["obj"]
-    # default
-    cal = PlattCalibrator(1.0, 0.0)
-    calibration_store[rm_version] = {"method": "platt", "params": {"a": 1.0, "b": 0.0}, "obj": cal}
-    return cal
+class StreamState:
+    """Streaming sessions by (user_id, item_id), least recently updated first.
 
+    An update is one dict lookup plus a move to the end. The same order is the expiry queue:
+    retention evicts from the head while the oldest session is idle past its TTL or the
+    table is over its size, so expiry costs O(1) amortized per update.
+    """
 
-# Hysteresis/cooldown state per session (user_id:item_id)
-class StreamState:
     def __init__(self):
-        self.last_state: Dict[str, str] = {}
-        self.last_ts: Dict[str, float] = {}
-        self.good_run: Dict[str, int] = {}
-        self.bad_run: Dict[str, int] = {}
+        self._sessions: "OrderedDict[Tuple[Optional[str], Optional[str]], StreamSession]" = OrderedDict()
+        self._lock = threading.Lock()
 
-    def key(self, user_id: str | None, item_id: str | None) -> str:
-        return f"{user_id or 'anon'}:{item_id or 'none'}"
+    def _oldest(self) -> Optional[Tuple[Tuple[Optional[str], Optional[str]], float]]:
+        for k, sess in self._sessions.items():
+            return k, sess.last_seen
+        return None
+
+    def _evict(self, k: Tuple[Optional[str], Optional[str]]) -> None:
+        self._sessions.pop(k, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self._sessions)}
 
     def update(self, user_id: str | None, item_id: str | None, state: str, mode: str) -> Tuple[bool, str]:
-        k = self.key(user_id, item_id)
+        with self._lock:
+            return self._update(user_id, item_id, state, mode)
+
+    def _update(self, user_id: str | None, item_id: str | None, state: str, mode: str) -> Tuple[bool, str]:
+        k = (user_id, item_id)
         now = time.time() * 1000
+        sess = self._sessions.get(k)
+        if sess is None:
+            sess = self._sessions[k] = StreamSession()
+        else:
+            self._sessions.move_to_end(k)
+        sess.last_seen = now / 1000.0
+        retention.sweep("stream_sessions", self._oldest, self._evict, self.__len__, now=now / 1000.0)
         cooldowns = config.streaming["cooldown_ms"]  # type: ignore
         cooldown_ms = cooldowns.get(mode, cooldowns.get("standard", 8000))  # type: ignore
         min_persistence = int(config.streaming["min_persistence"])  # type: ignore
 
         # cooldown
-        last = self.last_ts.get(k, 0)
-        if (now - last) < cooldown_ms:
-            return False, self.last_state.get(k, "neutral")
+        if (now - sess.last_ts) < cooldown_ms:
+            return False, sess.last_state
 
         # persistence counters
         if state == "positive":
-            self.good_run[k] = self.good_run.get(k, 0) + 1
-            self.bad_run[k] = 0
-            if self.good_run[k] >= min_persistence:
-                self.last_ts[k] = now
-                self.last_state[k] = state
-                self.good_run[k] = 0
+            sess.good_run += 1
+            sess.bad_run = 0
+            if sess.good_run >= min_persistence:
+                sess.last_ts = now
+                sess.last_state = state
+                sess.good_run = 0
                 return True, state
-            return False, self.last_state.get(k, "neutral")
+            return False, sess.last_state
         elif state == "negative":
-            self.bad_run[k] = self.bad_run.get(k, 0) + 1
-            self.good_run[k] = 0
-            if self.bad_run[k] >= min_persistence:
-                self.last_ts[k] = now
-                self.last_state[k] = state
-                self.bad_run[k] = 0
+            sess.bad_run += 1
+            sess.good_run = 0
+            if sess.bad_run >= min_persistence:
+                sess.last_ts = now
+                sess.last_state = state
+                sess.bad_run = 0
                 return True, state
-            return False, self.last_state.get(k, "neutral")
+            return False, sess.last_state
         else:
             # neutral resets slowly
-            self.good_run[k] = max(0, self.good_run.get(k, 0) - 1)
-            self.bad_run[k] = max(0, self.bad_run.get(k, 0) - 1)
-            return False, self.last_state.get(k, "neutral")
+            sess.good_run = max(0, sess.good_run - 1)
+            sess.bad_run = max(0, sess.bad_run - 1)
+            return False, sess.last_state
 
 
-stream_state = StreamState()
+stream_state = shared("stream_state", StreamState)
 
 
 # Metrics (simple rolling counters)
@@ -95,11 +115,32 @@ class StreamMetrics:
         self.alerts: int = 0
         self.suppressed: int = 0
         self.calls: int = 0
+        self._lock = threading.Lock()
 
     def add_latency(self, ms: float):
         self.latencies.append(ms)
         self.latencies = self.latencies[-500:]
 
+    def record(self, latency_ms: float, alerted: bool) -> None:
+        """Count one scored call; the single entry point so shared metrics update atomically."""
+        with self._lock:
+            self.calls += 1
+            if alerted:
+                self.alerts += 1
+            else:
+                self.suppressed += 1
+            self.add_latency(latency_ms)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "alerts": self.alerts,
+                "suppressed": self.suppressed,
+                "p95": self.p95(),
+                "suppress_rate": self.suppress_rate(),
+            }
+
     def p95(self) -> float:
         if not self.latencies:
             return 0.0
@@ -113,40 +154,283 @@ class StreamMetrics:
         return float(self.suppressed) / float(self.calls)
 
 
-stream_metrics = StreamMetrics()
-
-
-HEDGE_PATTERNS = [
-    r"\bmaybe\b",
-    r"\bperhaps\b",
-    r"\bkind of\b",
-    r"\bsort of\b",
-    r"\bI think\b",
-    r"\bjust\b",
-]
+stream_metrics = shared("stream_metrics", StreamMetrics)
 
 
 def find_spans(text: str) -> List[Dict[str, Any]]:
-    spans: List[Dict[str, Any]] = []
-    for pat in HEDGE_PATTERNS:
-        for m in re.finditer(pat, text, flags=re.IGNORECASE):
-            spans.append({"start": m.start(), "end": m.end(), "tag": "hedge"})
-    return spans
+    return [{"start": a, "end": b, "tag": "hedge"} for a, b in scan(text).hedge_spans]
 
 
-def derive_stream_features(text: str) -> Dict[str, Any]:
-    feats = text_features(text)
+def _stream_features(text: str) -> Dict[str, Any]:
+    lex = scan(text)
+    feats = compute_text_features(text, lex)
     # Extra streaming markers
-    feats["has_concrete_time"] = 1.0 if re.search(r"\b(at\s*\d|\d\s*(am|pm)|monday|tuesday|wednesday|thursday|friday)\b", text, re.I) else 0.0
-    feats["has_place"] = 1.0 if re.search(r"\b(cafe|office|zoom|room|building|coffee)\b", text, re.I) else 0.0
+    feats["has_concrete_time"] = 1.0 if lex.has_concrete_time else 0.0
+    feats["has_place"] = 1.0 if lex.has_place else 0.0
     return feats
 
 
-def streaming_score(text: str, context: Dict[str, Any], rm_version: str) -> Tuple[float, float, List[str]]:
-    rm = get_rm([])
-    feats = rm.features(derive_stream_features(text))
+def derive_stream_features(text: str) -> Dict[str, Any]:
+    return feature_cache.get("stream", text, _stream_features)
+
+
+# A block ends after sentence punctuation and the whitespace that follows it. No lexicon match
+# contains [.!?], so none crosses a block edge, and word counts add up across blocks.
+_BLOCK_END = re.compile(r"[.!?]\s+")
+
+
+class _Block(NamedTuple):
+    words: int
+    question_marks: int
+    exclamations: int
+    hedge_spans: List[Tuple[int, int]]  # relative to the block start
+    markers: FrozenSet[str]
+    has_concrete_time: bool
+    has_place: bool
+
+
+def _block(text: str) -> _Block:
+    lex = scan(text)
+    return _Block(len(text.split()), text.count("?"), text.count("!"), lex.hedge_spans, lex.markers, lex.has_concrete_time, lex.has_place)
+
+
+def _split_blocks(text: str, offset: int) -> Tuple[List[int], List[_Block], bool]:
+    """Block starts and stats of text, and whether its last block ends at a block end."""
+    starts, blocks, pos = [], [], 0
+    for m in _BLOCK_END.finditer(text):
+        starts.append(offset + pos)
+        blocks.append(_block(text[pos : m.end()]))
+        pos = m.end()
+    closed = pos == len(text)
+    if not closed:
+        starts.append(offset + pos)
+        blocks.append(_block(text[pos:]))
+    return starts, blocks, closed
+
+
+def _edit_range(old: str, new: str, cursor: Optional[int]) -> Tuple[int, int, int]:
+    """(a, old_end, new_end) with old[:a] == new[:a] and old[old_end:] == new[new_end:]."""
+    n, m = len(old), len(new)
+    if cursor is not None:
+        # typing or deleting just before the cursor
+        b = min(max(cursor, 0), m)
+        a = min(b, b - (m - n), n)
+        if a >= 0 and old[:a] == new[:a] and old[b - (m - n) :] == new[b:]:
+            return a, b - (m - n), b
+    lo, hi = 0, min(n, m)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[:mid] == new[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    a, lo, hi = lo, 0, min(n, m) - lo
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[n - mid :] == new[m - mid :]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return a, n - lo, m - lo
+
+
+class StreamDoc:
+    """The last snippet of one streaming session, featurized per block with running totals.
+
+    update() re-scans only the blocks the edit touches, widened by a neighbour whenever the
+    edit moved the boundary with it, and shifts the offsets of the blocks after it.
+    """
+
+    __slots__ = ("text", "starts", "blocks", "words", "question_marks", "exclamations", "hedges", "markers", "time_blocks", "place_blocks")
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.starts: List[int] = []
+        self.blocks: List[_Block] = []
+        self.words = self.question_marks = self.exclamations = self.hedges = 0
+        self.markers: Counter = Counter()
+        self.time_blocks = self.place_blocks = 0
+
+    def _add(self, blocks: List[_Block], sign: int) -> None:
+        for b in blocks:
+            self.words += sign * b.words
+            self.question_marks += sign * b.question_marks
+            self.exclamations += sign * b.exclamations
+            self.hedges += sign * len(b.hedge_spans)
+            self.time_blocks += sign * b.has_concrete_time
+            self.place_blocks += sign * b.has_place
+            for mk in b.markers:
+                self.markers[mk] += sign
+                if not self.markers[mk]:
+                    del self.markers[mk]
+
+    def update(self, text: str, cursor: Optional[int] = None) -> None:
+        old = self.text
+        if text == old:
+            return
+        a, old_end, new_end = _edit_range(old, text, cursor)
+        delta = new_end - old_end
+        # blocks i..j-1 hold the edited range
+        i = max(bisect_right(self.starts, a) - 1, 0)
+        j = min(bisect_right(self.starts, max(old_end - 1, a)), len(self.blocks))
+        while True:
+            lo = self.starts[i] if i < len(self.starts) else 0
+            hi = (self.starts[j] if j < len(self.starts) else len(old)) + delta
+            starts, blocks, closed = _split_blocks(text[lo:hi], lo)
+            # text before lo and from hi on is unchanged; the edges stay block edges unless
+            # whitespace now starts the range (it joins the previous block's end) or the range
+            # no longer ends with [.!?]\s+ (it runs into the next block)
+            start_ok = lo == 0 or not text[lo : lo + 1].isspace()
+            end_ok = hi >= len(text) or (closed if hi > lo else start_ok)
+            if start_ok and end_ok:
+                break
+            i -= not start_ok
+            j += not end_ok
+        self._add(self.blocks[i:j], -1)
+        self._add(blocks, 1)
+        self.blocks[i:j] = blocks
+        self.starts[i:] = starts + [s + delta for s in self.starts[j:]]
+        self.text = text
+
+    def features(self) -> Dict[str, Any]:
+        """Equal to derive_stream_features(self.text)."""
+        return {
+            "length": len(self.text),
+            "words": self.words,
+            "hedges": self.hedges,
+            "question_marks": self.question_marks,
+            "exclamations": self.exclamations,
+            "specificity_markers": len(self.markers),
+            "has_concrete_time": 1.0 if self.time_blocks else 0.0,
+            "has_place": 1.0 if self.place_blocks else 0.0,
+        }
+
+    def spans(self) -> List[Dict[str, Any]]:
+        """Equal to find_spans(self.text)."""
+        return [{"start": s + a, "end": s + b, "tag": "hedge"} for s, blk in zip(self.starts, self.blocks) for a, b in blk.hedge_spans]
+
+
+class StreamDocs:
+    """Per-process LRU of StreamDocs by (user_id, item_id).
+
+    A doc is taken out of the table while it is updated, so a concurrent request for the same
+    session starts from a fresh doc instead of racing on this one. A session served by another
+    worker, or evicted, is featurized from scratch on its next request.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._docs: "OrderedDict[Tuple[str, Optional[str]], StreamDoc]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def featurize(self, key: Tuple[str, Optional[str]], text: str, cursor: Optional[int]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """(stream features, hedge spans) of text, updating the session's doc from its last snippet."""
+        with self._lock:
+            doc = self._docs.pop(key, None)
+        doc = doc or StreamDoc()
+        doc.update(text, cursor)
+        out = doc.features(), doc.spans()
+        with self._lock:
+            self._docs[key] = doc
+            while len(self._docs) > self.size:
+                self._docs.popitem(last=False)
+        return out
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+
+stream_docs = StreamDocs(config.stream_docs_max)
+
+
+# JSON size of one text_replace op apart from its text
+_OP_BYTES = len('{"type":"text_replace","range":[10000,10000],"text":""},')
+
+
+def _apply_ops(text: str, ops: List[Tuple[int, int, str]], lo: int = 0, hi: Optional[int] = None) -> str:
+    """text[lo:hi] with ops (all inside [lo, hi]) applied."""
+    out, pos = [], lo
+    for start, end, rep in ops:
+        out += (text[pos:start], rep)
+        pos = end
+    out.append(text[pos:hi])
+    return "".join(out)
+
+
+def _compact(text: str, ops: List[Tuple[int, int, str]]) -> List[Tuple[int, int, str]]:
+    """ops, or the one edit covering them all if that encodes smaller."""
+    if len(ops) < 2:
+        return ops
+    lo, hi = ops[0][0], ops[-1][1]
+    many = sum(len(rep) + _OP_BYTES for _, _, rep in ops)
+    if many <= hi - lo + sum(len(rep) - (end - start) for start, end, rep in ops) + _OP_BYTES:
+        return ops
+    return [(lo, hi, _apply_ops(text, ops, lo, hi))]
+
+
+def patch_ops(text: str, patched: str) -> List[Tuple[int, int, str]]:
+    """One edit (start, end, replacement) turning text into patched, or none if equal."""
+    if patched == text:
+        return []
+    a, old_end, new_end = _edit_range(text, patched, len(patched) if patched.startswith(text) else None)
+    return [(a, old_end, patched[a:new_end])]
+
+
+class StreamDeltas:
+    """LRU of the last response per streaming session, the base of delta responses.
+
+    Shared across workers (one instance on the coordinator under STATE_SERVER), so a session's
+    next base_seq does not depend on which worker serves it.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        # key -> (seq, snippet, spans as (start, end, tag))
+        self._last: "OrderedDict[Tuple[str, Optional[str]], Tuple[int, str, List[Tuple[int, int, str]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, key: Tuple[str, Optional[str]], text: str, cursor: Optional[int], spans: List[Tuple[int, int, str]]) -> Dict[str, Any]:
+        """Delta fields for a snippet whose full span list is `spans`: only `seq` for a new
+        session (the full list stands), else the edit since the last snippet and the spans
+        added and removed."""
+        with self._lock:
+            prev = self._last.pop(key, None)
+        if prev is None:
+            out: Dict[str, Any] = {"seq": 1}
+        else:
+            seq, prev_text, prev_spans = prev
+            a, old_end, new_end = _edit_range(prev_text, text, cursor)
+            shift = new_end - old_end
+            current, kept, removed = set(spans), set(), []
+            for sp in prev_spans:
+                start, end, tag = sp
+                moved = sp if end <= a else (start + shift, end + shift, tag) if start >= old_end else None
+                if moved in current:
+                    kept.add(moved)
+                else:
+                    removed.append(sp)
+            out = {
+                "seq": seq + 1,
+                "base_seq": seq,
+                "edit": [a, old_end, new_end],
+                "spans_added": [sp for sp in spans if sp not in kept],
+                "spans_removed": removed,
+            }
+        with self._lock:
+            self._last[key] = (out["seq"], text, spans)
+            while len(self._last) > self.size:
+                self._last.popitem(last=False)
+        return out
+
+
+stream_deltas = shared("stream_deltas", lambda: StreamDeltas(config.stream_docs_max))
+
+
+def streaming_score(text: str, context: Dict[str, Any], rm_version: str, feats: Optional[Dict[str, Any]] = None) -> Tuple[float, float, List[str]]:
+    rm = get_rm([], rm_version)
+    feats = rm.features(feats if feats is not None else derive_stream_features(text))
     # raw score as linear score mapped to probability via sigmoid
-    z = sum(rm.w.get(k, 0.0) * v for k, v in feats.items())
+    z = rm.score_feats(feats)
     cal = get_calibrator(rm_version)
     p_win = cal.calibrate(z)
     conf = abs(p_win - 0.5) * 2.0
@@ -155,8 +439,18 @@ def streaming_score(text: str, context: Dict[str, Any], rm_version: str) -> Tupl
 
 
 def suggestion_for(text: str, tags: List[str]) -> Tuple[str, str]:
-    if "fewer_hedges" in tags or re.search("|".join(HEDGE_PATTERNS), text, re.I):
+    if "fewer_hedges" in tags or HEDGE_RE.search(text):
         return "Remove hedges", remove_hedges(text)
     else:
         return "Add a concrete time/place", add_concrete_ask(text)
 
+
+def suggestion_ops(text: str, tags: List[str], hedges: Optional[List[Tuple[int, int]]] = None) -> Tuple[str, List[Tuple[int, int, str]]]:
+    """suggestion_for as (label, edits), without building the rewritten text.
+    `hedges` are the hedge spans of text if already known."""
+    if hedges is None:
+        hedges = scan(text).hedge_spans
+    if "fewer_hedges" in tags or hedges:
+        return "Remove hedges", _compact(text, remove_hedges_ops(text, hedges))
+    return "Add a concrete time/place", patch_ops(text, add_concrete_ask(text))
+
@@ -1,27 +1,11 @@
 from typing import Dict, Any, List
 import re
 
+from .adapters.lexicon import remove_hedges
 from .adapters.text_adapter import text_features
 from .config import config
 
 
-def remove_hedges(text: str) -> str:
-    patterns = [
-        r"\bmaybe\b",
-        r"\bperhaps\b",
-        r"\bkind of\b",
-        r"\bsort of\b",
-        r"\bI think\b",
-        r"\bjust\b",
-    ]
-    s = text
-    for p in patterns:
-        s = re.sub(p, "", s, flags=re.IGNORECASE)
-    # tidy spaces
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-
 def tighten_length(text: str, ratio: float = 0.8) -> str:
     words = text.split()
     if len(words) <= 4:
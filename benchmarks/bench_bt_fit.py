@@ -0,0 +1,72 @@
+"""Batch BT refit time on a synthetic log: 1M comparisons over 100k variants (5 per item).
+
+Winners are drawn from true BT scores under the temperature model, so the script also reports
+how well the fit recovers them. Besides the bare fit_bt solve it times bt_fit.refit() end to end on an InMemoryDB holding
+the same log: encoding the comparison rows, the fit, seeding the shards, cache invalidation and
+the per-item Laplace covariances, which is what the Refitter pays each interval.
+Run from the repo root: python -m benchmarks.bench_bt_fit [comparisons] [variants]
+"""
+from __future__ import annotations
+
+import sys
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from backend.app.bt import BradleyTerry
+from backend.app.bt_fit import encode_comparisons, fit_bt, refit
+from backend.app.storage import InMemoryDB
+
+PER_ITEM = 5
+
+
+def synthetic(n_comp: int, n_var: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    true = rng.normal(0.0, 1.0, n_var)
+    item = rng.integers(0, n_var // PER_ITEM, n_comp)
+    a = item * PER_ITEM + rng.integers(0, PER_ITEM, n_comp)
+    b = item * PER_ITEM + (a - item * PER_ITEM + rng.integers(1, PER_ITEM, n_comp)) % PER_ITEM
+    inv_alpha = np.where(rng.random(n_comp) < 0.2, 1 / 1.5, 1.0)  # a fifth from alpha=1.5 raters
+    a_wins = rng.random(n_comp) < 1.0 / (1.0 + np.exp(-(true[a] - true[b]) * inv_alpha))
+    winners = np.where(a_wins, a, b)
+    losers = np.where(a_wins, b, a)
+    return true, winners, losers, inv_alpha
+
+
+def populate(winners: np.ndarray, losers: np.ndarray, inv_alpha: np.ndarray, n_var: int) -> Tuple[InMemoryDB, BradleyTerry]:
+    db = InMemoryDB()
+    vids: List[str] = []
+    for _ in range(n_var // PER_ITEM):
+        item_id = db.create_item("u_bench", "text", {}, {}, {})
+        vids.extend(db.create_variant(item_id, {}, {}, "rewrite") for _ in range(PER_ITEM))
+    for w, l, c in zip(winners.tolist(), losers.tolist(), inv_alpha.tolist()):
+        rater = "r_noisy" if c < 1.0 else "r_sharp"
+        item_id = db.variants[vids[w]]["item_id"]
+        db.create_comparison(item_id, vids[w], vids[l], vids[w], "crowd", rater, [], False)
+    bt = BradleyTerry(db=db)
+    bt.set_alphas({"r_noisy": 1.5, "r_sharp": 1.0})
+    return db, bt
+
+
+def main(n_comp: int, n_var: int) -> None:
+    true, winners, losers, inv_alpha = synthetic(n_comp, n_var)
+    t0 = time.perf_counter()
+    scores, stderr, iters = fit_bt(winners, losers, inv_alpha, n_var)
+    dt = time.perf_counter() - t0
+    corr = float(np.corrcoef(true, scores)[0, 1])
+    print(f"{n_comp} comparisons, {n_var} variants: fit_bt {dt:.2f}s, {iters} iterations")
+    print(f"corr(true, fitted) = {corr:.3f}, median stderr = {float(np.median(stderr)):.3f}")
+
+    db, bt = populate(winners, losers, inv_alpha, n_var)
+    t0 = time.perf_counter()
+    encode_comparisons(db.comparisons.values(), bt.alphas(), [])
+    encode = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    fitted = refit(db, bt)
+    total = time.perf_counter() - t0
+    print(f"refit() end to end: {total:.2f}s for {fitted} variants (encode {encode:.2f}s, fit {dt:.2f}s, bookkeeping {total - encode - dt:.2f}s)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000, int(sys.argv[2]) if len(sys.argv) > 2 else 100_000)
@@ -0,0 +1,64 @@
+"""Labels needed to reach a confident winner: Thompson (pick_next_duel) vs the info-gain heap.
+
+Simulates items with 6 variants whose true BT strengths are N(0, 1). Each label updates the online
+BT model; an item is done once the leader by mean score is resolved (|z| >= 2) against every other
+variant, or after a label budget. Reports mean labels, how often the declared winner is the
+true best, and for the heap the share of labels that forced a full rebuild. Run from the repo root: python -m benchmarks.bench_duel_policy [items] [variants]
+"""
+from __future__ import annotations
+
+import math
+import sys
+
+import numpy as np
+
+from backend.app.bandit import pair_z, pick_next_duel
+from backend.app.bt import BradleyTerry
+from backend.app.scheduler import ItemHeap
+from backend.app.storage import InMemoryDB
+
+Z = 2.0
+BUDGET = 400
+
+
+def run(policy: str, n_items: int, n_var: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    labels, correct, rebuilds = [], 0, 0
+    for it in range(n_items):
+        bt = BradleyTerry(db=InMemoryDB())
+        true = rng.normal(0.0, 1.0, n_var)
+        vids = [f"i{it}v{j}" for j in range(n_var)]
+        scores = bt.get_scores(vids, f"i{it}")
+        heap = ItemHeap(scores) if policy == "info_gain" else None
+        n = 0
+        while n < BUDGET:
+            leader = max(vids, key=lambda v: scores[v][0])
+            if all(pair_z(leader, v, scores) >= Z for v in vids if v != leader):
+                break
+            if heap is not None:
+                a, b, _ = heap.best()
+            else:
+                a, b = pick_next_duel(vids, scores, z_resolved=Z)
+            ia, ib = vids.index(a), vids.index(b)
+            winner = a if rng.random() < 1.0 / (1.0 + math.exp(-(true[ia] - true[ib]))) else b
+            changed = bt.apply(a, b, winner, "sim", 1.0, item_id=f"i{it}")
+            scores.update(changed)
+            if heap is not None:
+                heap.update(changed)
+            n += 1
+        labels.append(n)
+        rebuilds += heap.rebuilds - 1 if heap is not None else 0
+        correct += vids.index(max(vids, key=lambda v: scores[v][0])) == int(np.argmax(true))
+    return float(np.mean(labels)), correct / n_items, rebuilds / max(sum(labels), 1)
+
+
+def main():
+    n_items = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_var = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    for policy in ("thompson", "info_gain"):
+        mean_labels, acc, rebuild_rate = run(policy, n_items, n_var)
+        print(f"{policy:10s} labels/item={mean_labels:6.1f} top1_correct={acc:.2%} rebuilds/label={rebuild_rate:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Label throughput at 64 threads: striped transactions vs the old unlocked path.
+
+Each thread records comparisons where the first variant always wins, so the final BT scores
+are fully determined by the number of updates; any deviation from a sequential replay is a lost
+update. Run from the repo root: python -m benchmarks.bench_label_concurrency [items] [labels]
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+
+from backend.app import labels
+from backend.app.bt import BradleyTerry
+from backend.app.storage import InMemoryDB
+
+THREADS = 64
+
+
+def unlocked_record(db: InMemoryDB, bt: BradleyTerry, item_id: str, a: str, b: str) -> None:
+    # the pre-transaction router code path
+    bt.set_alpha("r1", 1.0)
+    bt.update(a, b, a, "r1")
+    for vid, (s, se) in bt.get_scores([a, b]).items():
+        db.set_score(vid, s, se)
+    db.create_comparison(item_id, a, b, a, "expert", "r1", [], False, 0.5)
+
+
+def run(n_items: int, n_labels: int, locked: bool):
+    db = InMemoryDB()
+    bt = BradleyTerry(db=db)
+    labels.db, labels.get_bt = db, (lambda: bt)
+    per_thread = n_labels // THREADS
+
+    def work(t: int) -> None:
+        for i in range(per_thread):
+            item = (t * per_thread + i) % n_items
+            a, b = f"v{item}a", f"v{item}b"
+            if locked:
+                labels.record_comparison(f"items_{item}", a, b, a, "expert", "r1", [], False, 0.5, alpha=1.0)
+            else:
+                unlocked_record(db, bt, f"items_{item}", a, b)
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(THREADS)]
+    t0 = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    elapsed = time.perf_counter() - t0
+
+    # sequential replay of the same per-item update counts
+    counts = {}
+    for t in range(THREADS):
+        for i in range(per_thread):
+            item = (t * per_thread + i) % n_items
+            counts[item] = counts.get(item, 0) + 1
+    lost = 0
+    for item, n in counts.items():
+        ref = BradleyTerry()
+        for _ in range(n):
+            ref.update("a", "b", "a", None)
+        if bt.scores[f"v{item}a"][0] != ref.scores["a"][0]:
+            lost += 1
+    return THREADS * per_thread / elapsed, lost
+
+
+if __name__ == "__main__":
+    n_items = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    n_labels = int(sys.argv[2]) if len(sys.argv) > 2 else 64_000
+    sys.setswitchinterval(1e-5)
+    for locked in (False, True):
+        rate, lost = run(n_items, n_labels, locked)
+        name = "striped" if locked else "unlocked"
+        print(f"{name:9s} {rate:10.0f} labels/s  items with lost updates: {lost}/{n_items}")
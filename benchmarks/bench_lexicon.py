@@ -0,0 +1,86 @@
+"""Streaming featurization: the per-pattern regexes it replaced vs the single-pass lexicon scan.
+
+Per snippet, the legacy path ran `text_features` (6 findall for hedges, 4 substring tests),
+the time and place searches of `derive_stream_features`, 6 finditer for spans and the 2
+agreement-gate searches. The new path is one `lexicon.scan` plus `text_features` from it.
+Also checks that both give the same hedge spans, specificity, time and place flags and the
+agreement gate's specificity word check on the corpus. Run from the repo root: python -m benchmarks.bench_lexicon [snippets]
+"""
+from __future__ import annotations
+
+import re
+import sys
+import time
+
+import numpy as np
+
+from backend.app.adapters.lexicon import scan
+from backend.app.adapters.text_adapter import compute_text_features
+
+HEDGES = [r"\bmaybe\b", r"\bperhaps\b", r"\bkind of\b", r"\bsort of\b", r"\bI think\b", r"\bjust\b"]
+
+WORDS = (
+    "hi team maybe we could meet at 3pm on monday in the office I think it would help just to "
+    "sort of align kind of quickly perhaps tomorrow over coffee or zoom today about that plan "
+    "let me know what works for you thanks again for the update on the building room "
+    "won that bet at? on. todays Today! at3 moon whatever"
+).split()
+
+
+def legacy(text: str):
+    lower = text.lower()
+    feats = {
+        "length": len(text),
+        "words": len(text.split()),
+        "hedges": sum(len(re.findall(p, lower)) for p in HEDGES),
+        "question_marks": text.count("?"),
+        "exclamations": text.count("!"),
+        "specificity_markers": sum(1 for t in ["today", "tomorrow", "at ", "on "] if t in lower),
+    }
+    feats["has_concrete_time"] = 1.0 if re.search(r"\b(at\s*\d|\d\s*(am|pm)|monday|tuesday|wednesday|thursday|friday)\b", text, re.I) else 0.0
+    feats["has_place"] = 1.0 if re.search(r"\b(cafe|office|zoom|room|building|coffee)\b", text, re.I) else 0.0
+    spans = []
+    for pat in HEDGES:
+        for m in re.finditer(pat, text, flags=re.IGNORECASE):
+            spans.append((m.start(), m.end()))
+    gate = bool(re.search(r"\b(today|tomorrow|at|on)\b", text, re.I))
+    re.search(r"(maybe|perhaps|kind of|sort of|I think|just)", text, re.I)
+    return feats, sorted(spans), gate
+
+
+def single_pass(text: str):
+    lex = scan(text)
+    feats = compute_text_features(text, lex)
+    feats["has_concrete_time"] = 1.0 if lex.has_concrete_time else 0.0
+    feats["has_place"] = 1.0 if lex.has_place else 0.0
+    return feats, lex.hedge_spans, lex.has_specific_word
+
+
+def corpus(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        words = rng.choice(WORDS, int(rng.integers(5, 80))).tolist()
+        if rng.random() < 0.3:
+            words[0] = words[0].upper()
+        out.append(" ".join(words) + rng.choice([".", "?", "!"]))
+    return out
+
+
+def main(n: int = 20000) -> None:
+    texts = corpus(n)
+    for t in texts:
+        (old, old_spans, old_gate), (new, new_spans, new_gate) = legacy(t), single_pass(t)
+        # legacy count_hedges lowercased the text, so its case-sensitive "I think" never matched
+        assert new_spans == old_spans and new["hedges"] == len(old_spans) and new_gate == old_gate, t
+        assert {k: v for k, v in new.items() if k != "hedges"} == {k: v for k, v in old.items() if k != "hedges"}, t
+    for name, fn in (("legacy regexes", legacy), ("lexicon scan", single_pass)):
+        t0 = time.perf_counter()
+        for t in texts:
+            fn(t)
+        dt = time.perf_counter() - t0
+        print(f"{name:15s} {dt * 1e6 / n:7.1f} us/snippet")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,75 @@
+"""Bytes per row of the comparisons / stream_events tables: plain dict rows vs ColumnTable.
+
+Run from the repo root: python -m benchmarks.bench_storage_memory [rows]
+"""
+from __future__ import annotations
+
+import random
+import sys
+import tracemalloc
+
+from backend.app.storage import COMPARISON_FIELDS, STREAM_EVENT_FIELDS, ColumnTable
+
+
+def comparison_row(i: int, rng: random.Random) -> dict:
+    item = rng.randrange(2_000)
+    a, b = rng.randrange(3), rng.randrange(3)
+    return {
+        "id": f"comparisons_{i}",
+        "item_id": f"items_{item}",
+        "a_id": f"variants_{item * 3 + a}",
+        "b_id": f"variants_{item * 3 + b}",
+        "winner_id": f"variants_{item * 3 + a}",
+        "judge_type": rng.choice(["expert", "crowd", "llm"]),
+        "rater_id": f"rater_{rng.randrange(200)}",
+        "tags": rng.sample(["clearer_ask", "fewer_hedges", "concise", "tone_polite"], 2),
+        "abstain": False,
+        "confidence": rng.random(),
+        "created_at": 1.7e9 + i,
+    }
+
+
+def stream_event_row(i: int, rng: random.Random) -> dict:
+    return {
+        "id": f"stream_event_{i}",
+        "user_id": f"u_{rng.randrange(5_000)}",
+        "item_id": None,
+        "variant_id": None,
+        "state": rng.choice(["positive", "negative"]),
+        "p_win": rng.random(),
+        "tags": ["fewer_hedges"],
+        "suggestion": {},
+        "created_at": 1.7e9 + i,
+    }
+
+
+def bytes_per_row(table, make_row, prefix: str, n: int) -> float:
+    rng = random.Random(0)
+    rows = [make_row(i, rng) for i in range(1, n + 1)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i, row in enumerate(rows, start=1):
+        # fresh key/value objects per row, as the live write path creates them
+        table[f"{prefix}_{i}"] = {k: (list(v) if isinstance(v, list) else v) for k, v in row.items()}
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / n
+
+
+def measure(n: int) -> dict:
+    return {
+        "comparisons": (
+            bytes_per_row({}, comparison_row, "comparisons", n),
+            bytes_per_row(ColumnTable("comparisons", COMPARISON_FIELDS), comparison_row, "comparisons", n),
+        ),
+        "stream_events": (
+            bytes_per_row({}, stream_event_row, "stream_event", n),
+            bytes_per_row(ColumnTable("stream_event", STREAM_EVENT_FIELDS), stream_event_row, "stream_event", n),
+        ),
+    }
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    for table, (as_dict, columnar) in measure(n).items():
+        print(f"{table:14s} dict={as_dict:8.1f} B/row  columnar={columnar:6.1f} B/row  ratio={as_dict / columnar:5.1f}x")
@@ -0,0 +1,47 @@
+"""Bytes and time per keystroke of /rm/stream/score responses: full vs delta (`delta: true`).
+
+Types into a long draft with hysteresis and cooldown turned off, so every keystroke returns
+the negative state with spans and a suggestion, the largest response there is. Reports the
+encoded size, the JSON encoding time alone, and score_stream plus encoding, for a draft with
+a hedge in one sentence of four and for one with hedges in every sentence.
+Run from the repo root: python -m benchmarks.bench_stream_delta [chars] [keys]
+"""
+from __future__ import annotations
+
+import sys
+import time
+
+from backend.app.config import config
+from backend.app.routers.rm import score_stream
+from backend.app.schemas import StreamScoreRequest
+from benchmarks.bench_stream_incremental import SENTENCE, keystrokes
+
+PLAIN = "Could we meet at the office on Friday at 3pm to settle the plan for next week? "
+DRAFTS = {"1 in 4 hedged": SENTENCE + PLAIN * 3, "all hedged": SENTENCE}
+
+
+def run(edits, delta: bool, session: str):
+    size = encode = 0.0
+    t0 = time.perf_counter()
+    for text, cursor in edits:
+        req = StreamScoreRequest(snippet=text, cursor={"pos": cursor}, user_id="bench", item_id=session, delta=delta, context={"goal": "ask clearly"})
+        resp = score_stream(req)
+        t1 = time.perf_counter()
+        size += len(resp.model_dump_json(exclude_none=delta))
+        encode += time.perf_counter() - t1
+    n = len(edits)
+    return size / n, encode / n, (time.perf_counter() - t0) / n
+
+
+def main(chars: int = 8000, keys: int = 500) -> None:
+    config.streaming.update(min_persistence=1, cooldown_ms={"standard": 0}, require_agreement=False)
+    print(f"{chars} chars, {keys} keys")
+    for name, sentence in DRAFTS.items():
+        edits = keystrokes(chars, keys, sentence=sentence)
+        for delta in (False, True):
+            b, enc, t = run(edits, delta, f"{name}/{delta}")
+            print(f"{name:14s} {'delta' if delta else 'full':5s} {b:7.0f} bytes {enc * 1e6:6.0f} us encode {t * 1e6:6.0f} us/key")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,60 @@
+"""Per-keystroke streaming featurization of a long draft: full rescan vs the per-session StreamDoc.
+
+Types a draft of about `chars` characters one keystroke at a time, at a cursor that jumps to a
+random sentence every 40 keys, and times featurizing the whole snippet after each key: the
+full path (stream features + hedge spans of the full text) against StreamDoc.update, which
+re-scans only the blocks around the edit. Checks both agree on the final text.
+Run from the repo root: python -m benchmarks.bench_stream_incremental [chars] [keys]
+"""
+from __future__ import annotations
+
+import random
+import sys
+import time
+
+from backend.app.streaming import StreamDoc, _stream_features, find_spans
+
+SENTENCE = "I think we could maybe meet at 3pm on Friday in the office to sort of settle the plan. "
+
+
+def keystrokes(chars: int, keys: int, seed: int = 0, sentence: str = SENTENCE):
+    rng = random.Random(seed)
+    text = (sentence * (chars // len(sentence) + 1))[:chars]
+    cursor = len(text) // 2
+    out = []
+    for k in range(keys):
+        if k % 40 == 0:
+            cursor = text.find(". ", rng.randint(0, len(text) - 1)) + 2 or len(text)
+        if rng.random() < 0.15 and cursor > 0:
+            text, cursor = text[: cursor - 1] + text[cursor:], cursor - 1
+        else:
+            ch = rng.choice("abcdefghij klmnopqrstuvwxyz")
+            text, cursor = text[:cursor] + ch + text[cursor:], cursor + 1
+        out.append((text, cursor))
+    return out
+
+
+def main(chars: int = 8000, keys: int = 2000) -> None:
+    edits = keystrokes(chars, keys)
+    base = edits[0][0]
+    t0 = time.perf_counter()
+    for text, _ in edits:
+        _stream_features(text)
+        find_spans(text)
+    full = time.perf_counter() - t0
+
+    doc = StreamDoc()
+    doc.update(base)
+    t0 = time.perf_counter()
+    for text, cursor in edits:
+        doc.update(text, cursor)
+        doc.features()
+    incr = time.perf_counter() - t0
+    assert doc.features() == _stream_features(edits[-1][0]) and doc.spans() == find_spans(edits[-1][0])
+    print(f"{chars} chars, {keys} keys")
+    print(f"full rescan  {full * 1e6 / keys:8.1f} us/key")
+    print(f"StreamDoc    {incr * 1e6 / keys:8.1f} us/key")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
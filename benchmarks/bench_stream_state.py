@@ -0,0 +1,125 @@
+"""Streaming hysteresis: four dicts keyed by "user:item" vs one slotted record per session.
+
+Fills N concurrent sessions, then times `update()` on random sessions. The legacy layout
+(reproduced here) rebuilt the f-string key and did a lookup per dict per call; the session
+table does one lookup and a move to the end of its expiry order. Also times updates while
+every existing session is idle past its TTL, so each update also expires the oldest ones,
+and reports the traced bytes per session of both layouts.
+Run from the repo root: python -m benchmarks.bench_stream_state [sessions] [updates]
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Dict
+
+import numpy as np
+
+from backend.app import streaming
+from backend.app.config import config
+from backend.app.retention import retention
+from backend.app.streaming import StreamState
+
+STATES = ["positive", "negative", "neutral"]
+
+
+class LegacyStreamState:
+    def __init__(self):
+        self.last_state: Dict[str, str] = {}
+        self.last_ts: Dict[str, float] = {}
+        self.good_run: Dict[str, int] = {}
+        self.bad_run: Dict[str, int] = {}
+        self.last_seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _oldest(self):
+        for k, ts in self.last_seen.items():
+            return k, ts
+        return None
+
+    def _evict(self, k: str) -> None:
+        for d in (self.last_state, self.last_ts, self.good_run, self.bad_run, self.last_seen):
+            d.pop(k, None)
+
+    def key(self, user: str | None, item: str | None) -> str:
+        return f"{user or 'anon'}:{item or 'none'}"
+
+    def update(self, user_id, item_id, state, mode):
+        with self._lock:
+            k = self.key(user_id, item_id)
+            now = time.time() * 1000
+            self.last_seen[k] = now / 1000.0
+            self.last_seen.move_to_end(k)
+            retention.sweep("stream_sessions", self._oldest, self._evict, lambda: len(self.last_seen), now=now / 1000.0)
+            cooldowns = config.streaming["cooldown_ms"]
+            cooldown_ms = cooldowns.get(mode, cooldowns.get("standard", 8000))
+            min_persistence = int(config.streaming["min_persistence"])
+            last_ts = self.last_ts.get(k, 0)
+            if (now - last_ts) < cooldown_ms:
+                return False, self.last_state.get(k, "neutral")
+            if state == "positive":
+                self.good_run[k] = self.good_run.get(k, 0) + 1
+                self.bad_run[k] = 0
+                if self.good_run[k] >= min_persistence:
+                    self.last_ts[k] = now
+                    self.last_state[k] = state
+                    self.good_run[k] = 0
+                    return True, state
+                return False, self.last_state.get(k, "neutral")
+            elif state == "negative":
+                self.bad_run[k] = self.bad_run.get(k, 0) + 1
+                self.good_run[k] = 0
+                if self.bad_run[k] >= min_persistence:
+                    self.last_ts[k] = now
+                    self.last_state[k] = state
+                    self.bad_run[k] = 0
+                    return True, state
+                return False, self.last_state.get(k, "neutral")
+            else:
+                self.good_run[k] = max(0, self.good_run.get(k, 0) - 1)
+                self.bad_run[k] = max(0, self.bad_run.get(k, 0) - 1)
+                return False, self.last_state.get(k, "neutral")
+
+
+def fill(st, users, items, states) -> None:
+    for u, i, s in zip(users, items, states):
+        st.update(u, i, s, "standard")
+
+
+def main(n: int = 1_000_000, updates: int = 200_000) -> None:
+    retention.policies["stream_sessions"] = dict(retention.policies["stream_sessions"], max_rows=2 * n)
+    rng = np.random.default_rng(0)
+    users = [f"user-{u}" for u in range(n)]
+    items = [f"item-{u % 1000}" for u in range(n)]
+    states = [STATES[s] for s in rng.integers(0, 3, n)]
+    pick = rng.integers(0, n, updates).tolist()
+    seq = [(users[j], items[j], states[j]) for j in pick]
+    clock = time.time
+    for name, cls in (("legacy dicts", LegacyStreamState), ("session table", StreamState)):
+        tracemalloc.start()
+        st = cls()
+        fill(st, users, items, states)
+        per = tracemalloc.get_traced_memory()[0] / n
+        tracemalloc.stop()
+        t0 = time.perf_counter()
+        for u, i, s in seq:
+            st.update(u, i, s, "standard")
+        hot = time.perf_counter() - t0
+        # every session idle for two hours: each update now also expires the oldest ones
+        streaming.time.time = lambda: clock() + 7200
+        t0 = time.perf_counter()
+        for u, i, s in seq:
+            st.update(u, i, s, "standard")
+        expiring = time.perf_counter() - t0
+        streaming.time.time = clock
+        print(
+            f"{name:14s} update {hot * 1e9 / updates:6.0f} ns   "
+            f"update+expire {expiring * 1e9 / updates:6.0f} ns   {per:5.0f} B/session"
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -86,7 +86,6 @@
       context: { goal },
       snippet,
       cursor: { pos: els.editor.selectionStart || snippet.length },
-      rm_version: 'v1',
       user_id: user,
       item_id: itemId,
       mode: els.mode.value,
@@ -63,7 +63,7 @@
     const snippet = els.editor.value; if (!snippet.trim()) return;
     const resp = await api.post('/rm/stream/score', {
       modality: 'text', context: { goal: topic }, snippet,
-      cursor: { pos: els.editor.selectionStart || snippet.length }, rm_version: 'v1', user_id: 'u_local', item_id: itemId, mode: els.mode.value,
+      cursor: { pos: els.editor.selectionStart || snippet.length }, user_id: 'u_local', item_id: itemId, mode: els.mode.value,
     });
     setMeter(resp.state, (resp.tags && resp.tags[0]) || '');
     els.spans.innerHTML = '';
@@ -1,4 +1,6 @@
-from backend.app.bandit import pick_next_duel
+import numpy as np
+
+from backend.app.bandit import pick_duels, pick_next_duel
 
 
 def test_pick_next_duel_differs():
@@ -7,3 +9,32 @@ def test_pick_next_duel_differs():
     a, b = pick_next_duel(vids, scores)
     assert a != b
 
+
+def test_pick_next_duel_skips_resolved_challengers():
+    vids = ["v1", "v2", "v3"]
+    # v1 leads clearly; v2 is far behind with the highest stderr but already resolved against v1
+    scores = {"v1": (5.0, 0.05), "v2": (-5.0, 0.5), "v3": (4.9, 0.2)}
+    for _ in range(20):
+        a, b = pick_next_duel(vids, scores, z_resolved=2.0)
+        assert {a, b} == {"v1", "v3"}
+
+
+def test_pick_duels_is_distinct_and_reproducible():
+    vids = [f"v{i}" for i in range(6)]
+    scores = {v: (0.1 * i, 1.0 - 0.1 * i) for i, v in enumerate(vids)}
+    duels = pick_duels(vids, scores, 10, np.random.default_rng(7))
+    assert len(duels) == 10
+    assert len({frozenset(d) for d in duels}) == 10 and all(a != b for a, b in duels)
+    assert pick_duels(vids, scores, 10, np.random.default_rng(7)) == duels
+    # a 2-variant item has only one duel to give
+    assert len(pick_duels(vids[:2], scores, 5, np.random.default_rng(0))) == 1
+
+
+def test_pick_duels_fallback_uses_the_seeded_generator():
+    # every pair resolved (tiny stderr), but the 0.05 draw floor leaves the leader up to chance
+    vids = [f"v{i}" for i in range(4)]
+    scores = {v: (0.02 * i, 0.001) for i, v in enumerate(vids)}
+    runs = [pick_duels(vids, scores, 3, np.random.default_rng(seed), z_resolved=2.0) for seed in range(20)]
+    assert all(len(r) == 1 for r in runs)
+    assert runs == [pick_duels(vids, scores, 3, np.random.default_rng(seed), z_resolved=2.0) for seed in range(20)]
+    assert len({r[0] for r in runs}) > 1
@@ -1,4 +1,9 @@
+import threading
+
+import pytest
+
 from backend.app.bt import BradleyTerry
+from backend.app.storage import InMemoryDB
 
 
 def test_bt_update_pushes_scores():
@@ -10,3 +15,79 @@ def test_bt_update_pushes_scores():
     sb, _ = bt.scores[b]
     assert sa > sb
 
+
+def test_bt_stderr_follows_fisher_information():
+    bt = BradleyTerry()
+    bt.set_alpha("r", 2.0)
+    info = 1.0
+    for _ in range(10):
+        sa, sb = bt.scores.get("va", (0.0, 1.0))[0], bt.scores.get("vb", (0.0, 1.0))[0]
+        p = bt.prob_win(sa, sb, 2.0)
+        info += p * (1 - p) / 4.0
+        bt.update("va", "vb", "va", rater_id="r")
+    assert abs(bt.scores["va"][1] - info ** -0.5) < 1e-9
+    # abstains carry no information
+    bt.update("va", "vb", None, rater_id="r")
+    assert abs(bt.scores["va"][1] - info ** -0.5) < 1e-9
+
+
+def test_cold_shards_are_evicted_to_storage_and_reloaded():
+    db = InMemoryDB()
+    bt = BradleyTerry(db=db, max_shards=2)
+    ref = BradleyTerry(db=InMemoryDB(), max_shards=100)
+    for rnd in range(3):
+        for i in range(6):
+            for model in (bt, ref):
+                model.apply(f"v{i}a", f"v{i}b", f"v{i}a", "r", 1.0, item_id=f"items_{i}")
+    assert bt.resident()["shards"] == 2
+    # evicted items live only in storage, and reloading continued their updates exactly
+    assert bt.resident()["variants"] == 4 and db.scores["v0a"]["s"] == ref.scores["v0a"][0]
+    for i in range(6):
+        assert bt.scores[f"v{i}a"] == ref.scores[f"v{i}a"]
+
+
+def test_eviction_writes_back_outside_the_global_lock(monkeypatch):
+    db = InMemoryDB()
+    bt = BradleyTerry(db=db, max_shards=2)
+    for i in (0, 2):
+        bt.apply(f"v{i}a", f"v{i}b", f"v{i}a", "r", 1.0, item_id=f"items_{i}")
+    evicted_score = bt.scores["v0a"]
+    writing, release = threading.Event(), threading.Event()
+    set_score = db.set_score
+
+    def slow_set_score(vid, s, stderr):
+        writing.set()
+        release.wait(5)
+        set_score(vid, s, stderr)
+
+    monkeypatch.setattr(db, "set_score", slow_set_score)
+    # items_1 pushes items_0 out; its write-back stalls in slow_set_score
+    evictor = threading.Thread(target=bt.apply, args=("v1a", "v1b", "v1a", "r", 1.0), kwargs={"item_id": "items_1"})
+    evictor.start()
+    assert writing.wait(5)
+    other = threading.Thread(target=bt.get_scores, args=(["v2a"],), kwargs={"item_id": "items_2"})
+    other.start()
+    other.join(2)
+    assert not other.is_alive()
+    # a reader of the evicted item waits for the write-back instead of reading the stale row
+    seen = {}
+    reader = threading.Thread(target=lambda: seen.update(bt.get_scores(["v0a"], item_id="items_0")))
+    reader.start()
+    release.set()
+    for t in (evictor, reader):
+        t.join(5)
+    assert seen["v0a"] == evicted_score
+
+
+def test_cross_item_pair_is_refused():
+    db = InMemoryDB()
+    bt = BradleyTerry(db=db)
+    a, _ = db.create_variant("items_1", {}, {}, "baseline"), db.create_variant("items_1", {}, {}, "baseline")
+    b, c = db.create_variant("items_2", {}, {}, "baseline"), db.create_variant("items_2", {}, {}, "baseline")
+    for _ in range(5):
+        bt.apply(b, c, b, "r", 1.0, item_id="items_2")
+    before = bt.scores[b]
+    with pytest.raises(ValueError):
+        bt.apply(a, b, a, "r", 1.0, item_id="items_1")
+    assert bt.scores[b] == before
+    assert bt.get_scores([b], item_id="items_2")[b] == before
@@ -0,0 +1,90 @@
+import numpy as np
+
+from backend.app.bt import BradleyTerry
+from backend.app.bt_fit import fit_bt, refit
+from backend.app.storage import InMemoryDB
+
+
+def test_fit_reaches_the_posterior_mode():
+    rng = np.random.default_rng(1)
+    n, m = 50, 5000
+    true = rng.normal(0, 1, n)
+    a, b = rng.integers(0, n, m), rng.integers(0, n, m)
+    keep = a != b
+    a, b = a[keep], b[keep]
+    a_wins = rng.random(len(a)) < 1 / (1 + np.exp(-(true[a] - true[b])))
+    w, lo = np.where(a_wins, a, b), np.where(a_wins, b, a)
+    c = np.where(rng.random(len(w)) < 0.3, 0.5, 1.0)  # 1/alpha: some raters at alpha 2
+    s, se, _ = fit_bt(w, lo, c, n, prior=1.0)
+    # score equations of the temperature model, plus the N(0, 1) prior
+    g = c * (1 - 1 / (1 + np.exp(-c * (s[w] - s[lo]))))
+    grad = np.bincount(w, g, n) - np.bincount(lo, g, n) - s
+    assert np.abs(grad).max() < 1e-4
+    assert np.corrcoef(true, s)[0, 1] > 0.9
+    assert np.all(se > 0)
+
+
+def test_refit_replaces_online_scores_and_downweights_high_alpha_raters():
+    db = InMemoryDB()
+    bt = BradleyTerry(db=db)
+    bt.set_alpha("expert", 1.0)
+    bt.set_alpha("noisy", 4.0)
+    for _ in range(10):
+        db.create_comparison("items_1", "va", "vb", "va", "expert", "expert", [], False)
+        db.create_comparison("items_1", "va", "vb", "vb", "crowd", "noisy", [], False)
+    db.create_comparison("items_1", "va", "vb", None, "crowd", "noisy", [], True)
+
+    assert refit(db, bt) == 2
+    assert bt.scores["va"][0] > 0 > bt.scores["vb"][0]
+    assert db.scores["va"]["s"] == bt.scores["va"][0]
+    assert db.scores["va"]["stderr"] < 1.0
+
+
+def test_refit_stores_laplace_difference_variance_for_small_items():
+    db = InMemoryDB()
+    bt = BradleyTerry(db=db)
+    for w in ["va", "va", "vb", "va", "vc", "vb"]:
+        db.create_comparison("items_1", "va", "vb" if w != "vc" else "vc", w, "expert", "r", [], False)
+    refit(db, bt)
+    dv = bt.diff_vars(["va", "vb", "vc"])
+    assert set(dv) == {("va", "vb"), ("va", "vc"), ("vb", "vc")}
+    # compared pairs are positively correlated, so the difference is tighter than independent errors
+    se_a, se_b = bt.scores["va"][1], bt.scores["vb"][1]
+    assert dv[("va", "vb")] < se_a ** 2 + se_b ** 2
+
+
+def test_refit_keeps_covariances_without_loading_shards():
+    db = InMemoryDB()
+    bt = BradleyTerry(db=db, max_shards=2)
+    for i in range(6):
+        for w in ["a", "a", "b"]:
+            db.create_comparison(f"items_{i}", f"v{i}a", f"v{i}b", f"v{i}{w}", "expert", "r", [], False)
+    refit(db, bt)
+    assert bt.resident()["evictions"] == 0
+    for i in range(6):
+        assert (f"v{i}a", f"v{i}b") in bt.diff_vars([f"v{i}a", f"v{i}b"], item_id=f"items_{i}")
+    # online updates cycle shards through the LRU; the covariances stay
+    for i in range(6):
+        bt.update(f"v{i}a", f"v{i}b", f"v{i}a", rater_id=None, item_id=f"items_{i}")
+    assert bt.resident()["evictions"] == 4
+    assert all(bt.diff_vars([f"v{i}a", f"v{i}b"], item_id=f"items_{i}") for i in range(6))
+
+
+def test_online_and_refit_stderr_agree_with_a_mixed_alpha_rater():
+    db = InMemoryDB()
+    bt = BradleyTerry(db=db)
+    bt.set_alphas({"sharp": 1.0, "noisy": 2.5})
+    # balanced outcomes keep the scores near 0, so online p stays close to the refit's
+    for _ in range(10):
+        for rater in ("sharp", "noisy"):
+            for w, l in (("va", "vb"), ("vb", "va")):
+                db.create_comparison("items_1", w, l, w, "crowd", rater, [], False)
+                bt.update(w, l, w, rater_id=rater, item_id="items_1")
+    online = bt.get_scores(["va", "vb"], item_id="items_1")
+    refit(db, bt)
+    fitted = bt.get_scores(["va", "vb"], item_id="items_1")
+    for v in ("va", "vb"):
+        assert abs(online[v][1] - fitted[v][1]) < 1e-3 * fitted[v][1]
+    # the Laplace covariance uses the same information: Var(a - b) = 2 / (prior + 2 I) for one pair
+    info = fitted["va"][1] ** -2 - 1.0
+    assert abs(bt.diff_vars(["va", "vb"], item_id="items_1")[("va", "vb")] - 2 / (1.0 + 2 * info)) < 1e-9
@@ -0,0 +1,41 @@
+import numpy as np
+
+from backend.app.calibration import (
+    CalibrationMonitor,
+    expected_calibration_error,
+    fit_isotonic,
+    fit_platt,
+)
+
+
+def _synthetic(n=20000, a=0.5, b=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    d = rng.normal(0, 3, n)
+    y = (rng.random(n) < 1 / (1 + np.exp(-(a * d + b)))).astype(float)
+    return d, y
+
+
+def test_platt_recovers_slope_and_isotonic_is_monotone_and_calibrated():
+    d, y = _synthetic()
+    a, b = fit_platt(d, y)
+    assert abs(a - 0.5) < 0.05 and abs(b - 0.3) < 0.1
+    x, p = fit_isotonic(d, y)
+    assert np.all(np.diff(x) > 0) and np.all(np.diff(p) > 0)
+    xt, pt = fit_isotonic(np.array([0.0, 0.0, 1.0]), np.array([0.0, 1.0, 1.0]))
+    assert xt.tolist() == [0.0, 1.0] and pt.tolist() == [0.5, 1.0]
+    assert expected_calibration_error(np.interp(d, x, p), y) < 0.01
+    # an overconfident raw sigmoid is visibly miscalibrated
+    assert expected_calibration_error(1 / (1 + np.exp(-d)), y) > 0.05
+
+
+def test_monitor_bins_match_batch_ece_and_agreement():
+    d, y = _synthetic(2000)
+    p = 1 / (1 + np.exp(-d))
+    mon = CalibrationMonitor()
+    for pi, yi in zip(p.tolist(), y.tolist()):
+        mon.observe("v1", pi, yi)
+    snap = mon.snapshot("v1")
+    assert snap["n"] == 2000
+    assert abs(snap["ece"] - expected_calibration_error(p, y)) < 1e-9
+    assert abs(snap["agreement_rate"] - np.mean((p > 0.5) == (y > 0.5))) < 1e-12
+    assert mon.snapshot("v2")["ece"] is None
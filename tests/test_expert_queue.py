@@ -0,0 +1,62 @@
+import random
+
+from backend.app.bt import BradleyTerry
+from backend.app.scheduler import ExpertQueue, IndexedHeap
+from backend.app.storage import InMemoryDB
+
+
+def test_indexed_heap_top_matches_sort_under_updates_and_removals():
+    rng = random.Random(0)
+    h = IndexedHeap((f"p{i}", rng.random()) for i in range(50))
+    live = {pid: k for pid, k in zip(h.ids, h.keys)}
+    for _ in range(500):
+        pid = f"p{rng.randrange(80)}"
+        if rng.random() < 0.3:
+            h.remove(pid)
+            live.pop(pid, None)
+        else:
+            live[pid] = rng.random()
+            h.set(pid, live[pid])
+    assert h.top(10) == sorted(live.items(), key=lambda kv: -kv[1])[:10]
+    assert len(h) == len(live)
+
+
+def test_queue_ranks_uncertain_and_high_priority_items_first_and_drops_labeled():
+    db = InMemoryDB()
+    bt = BradleyTerry(db=db)
+    pairs = {}
+    for name, priority in (("settled", 1.0), ("open", 1.0), ("urgent", 3.0)):
+        item = db.create_item("u", "text", {"priority": priority}, {}, {})
+        a, b = db.create_variant(item, {}, {}, "a"), db.create_variant(item, {}, {}, "b")
+        pairs[name] = (item, a, b, db.create_pair(item, a, b, "t"))
+    _, a, b, _ = pairs["settled"]
+    bt.seed({a: (3.0, 0.2), b: (-3.0, 0.2)})
+    q = ExpertQueue(db=db, bt=bt)
+    assert q.top("t", 3) == [pairs[n][3] for n in ("urgent", "open", "settled")]
+
+    item, a, b, pid = pairs["urgent"]
+    db.mark_pair_labeled(pid, abstain=False)
+    q.on_label(item, bt.apply(a, b, a, "r", 1.0, item_id=item), pid)
+    extra = db.create_pair(item, a, b, "t")
+    q.add(extra)
+    assert pid not in q.top("t", 10) and extra in q.top("t", 10)
+
+
+def test_refit_rekeys_affected_pairs_in_place(monkeypatch):
+    db = InMemoryDB()
+    bt = BradleyTerry(db=db)
+    pids = {}
+    for name in ("x", "y"):
+        item = db.create_item("u", "text", {}, {}, {})
+        a, b = db.create_variant(item, {}, {}, "a"), db.create_variant(item, {}, {}, "b")
+        pids[name] = (item, a, b, db.create_pair(item, a, b, "t"))
+    q = ExpertQueue(db=db, bt=bt)
+    assert len(q.top("t", 2)) == 2
+    item, a, b, pid = pids["x"]
+    bt.seed({a: (3.0, 0.2), b: (-3.0, 0.2)})
+    # no rescan of the topic's pairs: "x" is re-keyed in place and now settled
+    monkeypatch.setattr(db, "pair_ids", None)
+    q.invalidate([item])
+    ranked = q.top("t", 2)
+    monkeypatch.undo()
+    assert ranked == ExpertQueue(db=db, bt=bt).top("t", 2) == [pids["y"][3], pid]
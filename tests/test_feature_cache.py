@@ -0,0 +1,40 @@
+from backend.app.adapters.feature_cache import FeatureCache
+from backend.app.adapters.text_adapter import compute_text_features
+
+
+def test_hits_return_equal_independent_copies():
+    cache = FeatureCache(size=16, max_bytes=1 << 20)
+    calls = []
+
+    def compute(s):
+        calls.append(s)
+        return compute_text_features(s)
+
+    first = cache.get("text", "maybe we meet at 3pm?", compute)
+    first["extra"] = 1
+    second = cache.get("text", "maybe we meet at 3pm?", compute)
+    assert calls == ["maybe we meet at 3pm?"]
+    assert "extra" not in second and second == compute_text_features("maybe we meet at 3pm?")
+    # same text under another featurizer is a separate entry
+    cache.get("rm", "maybe we meet at 3pm?", lambda s: {"length": len(s)})
+    s = cache.stats()
+    assert (s["hits"], s["misses"], s["entries"]) == (1, 2, 2)
+
+
+def test_evicts_least_recently_used_by_count_and_bytes():
+    cache = FeatureCache(size=3, max_bytes=1 << 20)
+    for t in ["a", "b", "c"]:
+        cache.get("text", t, compute_text_features)
+    cache.get("text", "a", compute_text_features)
+    cache.get("text", "d", compute_text_features)
+    misses = cache.misses
+    cache.get("text", "a", compute_text_features)
+    cache.get("text", "b", compute_text_features)
+    assert cache.misses == misses + 1 and cache.evictions >= 1
+
+    small = FeatureCache(size=1000, max_bytes=2000)
+    for i in range(100):
+        small.get("text", f"text {i}", compute_text_features)
+    s = small.stats()
+    assert 0 < s["entries"] < 100 and s["bytes"] <= 2000
+    assert s["evictions"] == 100 - s["entries"]
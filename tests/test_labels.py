@@ -0,0 +1,61 @@
+import sys
+import threading
+
+import pytest
+
+from backend.app import labels
+from backend.app.bt import BradleyTerry
+from backend.app.storage import InMemoryDB
+
+
+@pytest.fixture
+def isolated(monkeypatch):
+    db = InMemoryDB()
+    bt = BradleyTerry(db=db)
+    monkeypatch.setattr(labels, "db", db)
+    monkeypatch.setattr(labels, "get_bt", lambda: bt)
+    old = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible to provoke races
+    yield db, bt
+    sys.setswitchinterval(old)
+
+
+def _run(threads: int, fn) -> None:
+    ts = [threading.Thread(target=fn, args=(i,)) for i in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+
+
+def test_no_lost_bt_updates_at_64_threads(isolated):
+    db, bt = isolated
+    per_thread = 20
+
+    def work(_):
+        for _ in range(per_thread):
+            labels.record_comparison("items_1", "va", "vb", "va", "expert", "r1", [], False, 0.5, alpha=1.0)
+
+    _run(64, work)
+
+    expected = BradleyTerry()
+    expected.set_alpha("r1", 1.0)
+    for _ in range(64 * per_thread):
+        expected.update("va", "vb", "va", "r1")
+    assert bt.scores["va"] == expected.scores["va"]
+    bt.flush()
+    assert db.scores["va"]["s"] == expected.scores["va"][0]
+    assert len(db.comparison_ids("items_1")) == 64 * per_thread
+
+
+def test_pair_labeled_exactly_once(isolated):
+    db, _ = isolated
+    pairs = [db.create_pair("items_1", "va", "vb", topic="networking") for _ in range(50)]
+
+    def work(_):
+        for p in pairs:
+            labels.record_comparison("items_1", "va", "vb", "va", "expert", None, [], False, 0.5, alpha=1.5, pair_id=p)
+
+    _run(64, work)
+    assert len(db.comparison_ids("items_1")) == len(pairs)
+    assert db.pair_ids("networking", labeled=True) == pairs
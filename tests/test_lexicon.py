@@ -0,0 +1,35 @@
+import re
+
+import numpy as np
+
+from backend.app.adapters.lexicon import remove_hedges, scan
+from backend.app.adapters.text_adapter import compute_text_features
+
+
+def test_scan_finds_every_category_in_one_pass():
+    text = "I think we could maybe meet at 3pm on Friday, that adjusts nothing. Just coffee?"
+    lex = scan(text)
+    assert [text[a:b] for a, b in lex.hedge_spans] == ["I think", "maybe", "Just"]
+    # "at " inside the time cue "at 3" and "on " both count; "adjusts" is not the hedge "just"
+    assert lex.specificity_markers == 2
+    assert lex.has_concrete_time and lex.has_place
+    feats = compute_text_features(text)
+    assert feats["hedges"] == 3 and feats["specificity_markers"] == 2
+
+
+def test_remove_hedges_strips_whole_words_only():
+    assert remove_hedges("Maybe we just  adjust it, sort of.") == "we adjust it, ."
+
+
+def test_gate_specificity_matches_the_whole_word_regex():
+    rng = np.random.default_rng(0)
+    tokens = ["at", "At", "on", "ON", "today", "Tomorrow's", "todays", "that", "won", "moon", "at3", "3pm", "é", "_on", "I", "think"]
+    seps = [" ", "  ", ", ", ".", "?", "!", "'", "-", "\n", ""]
+    corpus = ["What is that thing I said", "Ok, I won the bet", "Where are we at?", "I'll be on.", "meet at 3pm"]
+    for _ in range(3000):
+        k = int(rng.integers(1, 6))
+        corpus.append("".join(str(rng.choice(tokens)) + str(rng.choice(seps)) for _ in range(k)))
+    for text in corpus:
+        assert scan(text).has_specific_word == bool(re.search(r"\b(today|tomorrow|at|on)\b", text, re.I)), text
+    # intended: gate hedges are whole words now, so "adjust" is not "just"
+    assert not scan("please adjust it at noon").hedge_spans
@@ -0,0 +1,58 @@
+import json
+
+from backend.app.storage import InMemoryDB
+from backend.app.persistence import Persistence
+
+
+def test_snapshot_and_wal_tail_replay(tmp_path):
+    db = InMemoryDB()
+    p = Persistence(db, str(tmp_path), interval_s=0)
+    p.open()
+    item = db.create_item("u1", "text", {}, {"text": "hi"}, {})
+    v1 = db.create_variant(item, {"text": "a"}, {}, "baseline")
+    p.snapshot()
+    v2 = db.create_variant(item, {"text": "b"}, {}, "remove_hedges")
+    pair = db.create_pair(item, v1, v2, topic="networking")
+    db.mark_pair_labeled(pair, abstain=False)
+    db.set_score(v2, 0.3, 0.9)
+    p.close(snapshot=False)
+
+    restored = InMemoryDB()
+    r = Persistence(restored, str(tmp_path), interval_s=0)
+    assert r.open() == 5  # only the WAL tail after the snapshot
+    assert restored.variant_ids(item) == [v1, v2]
+    assert restored.pair_ids("networking", labeled=True) == [pair]
+    assert restored.scores[v2] == {"s": 0.3, "stderr": 0.9}
+    # sequences continue past replayed ids
+    assert restored.create_variant(item, {"text": "c"}, {}, "baseline") == "variants_3"
+    r.close(snapshot=False)
+
+
+def test_torn_wal_tail_is_ignored(tmp_path):
+    db = InMemoryDB()
+    p = Persistence(db, str(tmp_path), interval_s=0)
+    p.open()
+    db.create_item("u1", "text", {}, {"text": "hi"}, {})
+    p.close(snapshot=False)
+    with open(tmp_path / "wal-00000001.log", "ab") as f:
+        f.write(b"\x10\x00\x00\x00garbage")
+
+    restored = InMemoryDB()
+    assert Persistence(restored, str(tmp_path), interval_s=0).open() == 1
+    assert list(restored.items) == ["items_1"]
+
+
+def test_snapshot_restores_empty_suggestions(tmp_path):
+    db = InMemoryDB()
+    p = Persistence(db, str(tmp_path), interval_s=0)
+    p.open()
+    e1 = db.append_stream_event("u1", None, None, "negative", 0.1, [], {})
+    p.snapshot()
+    p.close(snapshot=False)
+
+    restored = InMemoryDB()
+    r = Persistence(restored, str(tmp_path), interval_s=0)
+    assert r.open() == 0
+    assert restored.stream_events[e1]["suggestion"] == {}
+    json.dumps(dict(restored.stream_events[e1]))
+    r.close(snapshot=False)
@@ -0,0 +1,45 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from backend.app.main import app
+from backend.app.rank_cache import etag_matches, rank_cache, win_prob_matrix
+from backend.app.storage import db
+
+
+def test_win_prob_matrix_is_pairwise_sigmoid():
+    p = win_prob_matrix(np.array([1.0, 0.0, -2.0]))
+    assert np.allclose(p + p.T, 1.0)
+    assert abs(p[0, 2] - 1 / (1 + np.exp(-3.0))) < 1e-12
+
+
+def test_rank_is_cached_and_revalidated_by_etag():
+    client = TestClient(app)
+    item_id = db.create_item("u", "text", {}, {}, {})
+    a = db.create_variant(item_id, {"text": "a"}, {}, "baseline")
+    b = db.create_variant(item_id, {"text": "b"}, {}, "hedge")
+
+    r1 = client.get("/rank", params={"item_id": item_id, "win_probs": True})
+    etag = r1.headers["etag"]
+    assert set(r1.json()["ranking"][0]["win_prob_row"]) == {a, b}
+    hits = rank_cache.hits
+    r2 = client.get("/rank", params={"item_id": item_id, "win_probs": True})
+    assert r2.json() == r1.json() and rank_cache.hits == hits + 1
+    assert client.get("/rank", params={"item_id": item_id}, headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/compare", json={"item_id": item_id, "a_id": a, "b_id": b, "winner_id": b, "judge_type": "crowd"})
+    r3 = client.get("/rank", params={"item_id": item_id}, headers={"If-None-Match": etag})
+    assert r3.status_code == 200 and r3.headers["etag"] != etag
+    assert r3.json()["ranking"][0]["variant_id"] == b
+
+
+def test_if_none_match_lists_wildcard_and_unknown_items():
+    assert etag_matches('"x-1", W/"e-2"', 'W/"e-2"') and etag_matches('"e-2"', 'W/"e-2"') and etag_matches(" * ", 'W/"e-2"')
+    assert not etag_matches('W/"e-1", "e-20"', 'W/"e-2"') and not etag_matches("", 'W/"e-2"')
+    client = TestClient(app)
+    item_id = db.create_item("u", "text", {}, {}, {})
+    for header in ("*", 'W/"stale-0"'):
+        assert client.get("/rank", params={"item_id": item_id}, headers={"If-None-Match": header}).status_code == 404
+    db.create_variant(item_id, {"text": "a"}, {}, "baseline")
+    etag = client.get("/rank", params={"item_id": item_id}).headers["etag"]
+    assert client.get("/rank", params={"item_id": item_id}, headers={"If-None-Match": f'"other", {etag}'}).status_code == 304
+    assert client.get("/rank", params={"item_id": item_id}, headers={"If-None-Match": "*"}).status_code == 304
@@ -0,0 +1,69 @@
+import numpy as np
+
+from backend.app.bt import BradleyTerry
+from backend.app.reliability import ReliabilityEM
+from backend.app.storage import InMemoryDB
+
+
+def _simulate(db, rng, accuracies, n_pairs=200):
+    for p in range(n_pairs):
+        a, b = f"v{p}a", f"v{p}b"
+        for rid, acc in accuracies.items():
+            right = rng.random() < acc
+            db.create_comparison(f"items_{p}", a, b, a if right else b, "crowd", rid, [], False)
+
+
+def test_em_recovers_rater_accuracy_and_orders_alpha():
+    db, bt = InMemoryDB(), BradleyTerry()
+    rng = np.random.default_rng(0)
+    _simulate(db, rng, {"good1": 0.9, "good2": 0.9, "good3": 0.85, "noisy": 0.55})
+    em = ReliabilityEM()
+    alphas = em.update(db, bt)
+    q = dict(zip(em.raters, em.q))
+    assert abs(q["good1"] - 0.9) < 0.06 and abs(q["noisy"] - 0.55) < 0.1
+    assert alphas["noisy"] > 3 * alphas["good1"]
+    assert bt.rater_alpha["noisy"] == alphas["noisy"]
+    assert db.raters["noisy"]["trust"] == q["noisy"]
+
+    # incremental: only new comparisons are ingested, and an online label keeps the learned alpha
+    db.create_comparison("items_0", "v0a", "v0b", "v0a", "crowd", "noisy", [], False)
+    em.update(db, bt)
+    assert em.votes == 4 * 200 + 1
+    bt.apply("v0a", "v0b", "v0a", "noisy", alpha=1.0)
+    assert bt.rater_alpha["noisy"] > 1.0
+
+
+def test_gold_pairs_anchor_an_adversarial_majority():
+    db, bt = InMemoryDB(), BradleyTerry()
+    rng = np.random.default_rng(1)
+    # two raters who are mostly wrong outvote one who is right; gold answers settle who is who
+    _simulate(db, rng, {"liar1": 0.1, "liar2": 0.1, "honest": 0.95}, n_pairs=100)
+    for p in range(30):
+        db.create_gold_pair(f"items_{p}", f"v{p}a", f"v{p}b", f"v{p}a")
+    em = ReliabilityEM()
+    em.update(db, bt)
+    q = dict(zip(em.raters, em.q))
+    assert q["honest"] > 0.8 and q["liar1"] < 0.3
+
+
+def test_labels_set_later_replace_votes_and_gold_reads_add_no_pairs():
+    db, bt = InMemoryDB(), BradleyTerry()
+    pending = db.create_comparison("items_0", "va", "vb", None, "expert", "e", [], False)
+    db.create_comparison("items_1", "vc", "vd", "vc", "expert", "e", [], False)
+    db.create_gold_pair("items_9", "vx", "vy", "vx")
+    em = ReliabilityEM()
+    em.update(db, bt)
+    assert em.votes == 1
+    em.update(db, bt)
+    assert em.votes == 1
+    # an expert labels the pending comparison, then changes their mind, then abstains
+    db.update_comparison(pending, winner_id="va")
+    em.update(db, bt)
+    assert em.votes == 2
+    db.update_comparison(pending, winner_id="vb")
+    db.create_comparison("items_2", "ve", "vf", "ve", "expert", "e", [], False)
+    em.update(db, bt)
+    assert em.votes == 3
+    db.update_comparison(pending, winner_id=None, abstain=True)
+    em.update(db, bt)
+    assert em.votes == 2 and em.fit(db.gold_pairs.values()).shape == (1,)
@@ -0,0 +1,46 @@
+from backend.app.config import config
+from backend.app.retention import retention
+from backend.app.storage import InMemoryDB
+from backend.app.streaming import StreamState
+
+
+def test_stream_events_bounded_by_max_rows(monkeypatch):
+    monkeypatch.setattr(retention, "policies", {"stream_events": {"ttl_s": None, "max_rows": 100}})
+    monkeypatch.setattr(retention, "evicted", {})
+    db = InMemoryDB()
+    for _ in range(10_000):
+        db.append_stream_event("u1", None, None, "negative", 0.2, [], {})
+    assert len(db.stream_events) == 100
+    assert retention.evicted["stream_events"] == 9_900
+    # evicted head slots are compacted away, newest rows stay addressable
+    assert len(db.stream_events.column("p_win")) < 5_000
+    assert "stream_event_10000" in db.stream_events
+    assert "stream_event_1" not in db.stream_events
+
+
+def test_idempotency_ttl(monkeypatch):
+    monkeypatch.setattr(retention, "policies", {"idempotency": {"ttl_s": 60, "max_rows": None}})
+    db = InMemoryDB()
+    now = [1000.0]
+    monkeypatch.setattr(db, "now", lambda: now[0])
+    db.set_idempotent("k1", {"ok": True})
+    assert db.get_idempotent("k1") == {"ok": True}
+    now[0] += 120
+    assert db.get_idempotent("k1") is None
+    db.set_idempotent("k2", {"ok": True})
+    assert list(db.idempotency) == ["k2"]
+
+
+def test_stream_sessions_lru_bound(monkeypatch):
+    monkeypatch.setattr(retention, "policies", {"stream_sessions": {"ttl_s": None, "max_rows": 10}})
+    monkeypatch.setitem(config.streaming, "min_persistence", 1)
+    st = StreamState()
+    for i in range(50):
+        st.update(f"u{i}", None, "positive", "standard")
+    assert st.stats()["sessions"] == 10
+    # least recently updated out first
+    st.update("u40", None, "neutral", "standard")
+    st.update("new", None, "neutral", "standard")
+    # u40 kept its session (still cooling down); u41 was evicted and starts over
+    assert st.update("u40", None, "positive", "standard") == (False, "positive")
+    assert st.update("u41", None, "positive", "standard") == (True, "positive")
@@ -1,4 +1,6 @@
-from backend.app.rm import SimpleTextRM
+import pytest
+
+from backend.app.rm import RMRegistry, SimpleTextRM, StagedRM
 
 
 def test_rm_pairwise_loss_direction():
@@ -11,3 +13,50 @@ def test_rm_pairwise_loss_direction():
     p1 = rm.pairwise_prob(a, b)
     assert p1 > p0
 
+
+def test_score_batch_matches_single_pairs():
+    rm = SimpleTextRM(tags=["clearer_ask", "fewer_hedges"])
+    xs = [{"words": w, "hedges": w % 3, "specificity_markers": w % 2} for w in range(1, 9)]
+    fa, fb = rm.feature_matrix(xs[:4]), rm.feature_matrix(xs[4:])
+    p = rm.score_batch(fa, fb)
+    for i in range(4):
+        assert abs(p[i] - rm.pairwise_prob(rm.features(xs[i]), rm.features(xs[4 + i]))) < 1e-12
+    assert rm.explain_batch(fa)[0] == rm.explain(rm.features(xs[0]))
+
+
+def test_registry_freezes_routes_canary_and_round_trips(tmp_path):
+    reg = RMRegistry()
+    v1 = SimpleTextRM(tags=["clearer_ask"], version="v1")
+    reg.add(v1, current=True)
+    with pytest.raises(ValueError):
+        v1.train_pair(v1.features({"words": 1}), v1.features({"words": 9}), ya=1.0)
+    v2 = v1.copy(reg.next_version())
+    v2.train_pair(v2.features({"words": 1}), v2.features({"words": 9}), ya=1.0, lr=1.0)
+    reg.add(v2, candidate=True)
+    reg.set_canary("v2", 0.25)
+    routed = [reg.route(f"user{i}") for i in range(2000)]
+    assert 0.2 < routed.count("v2") / len(routed) < 0.3
+    assert reg.route(None) == "v1" and reg.get().version == "v1"
+
+    reg.save(str(tmp_path))
+    loaded = RMRegistry()
+    assert loaded.load(str(tmp_path))
+    assert loaded.manifest() == reg.manifest()
+    assert (loaded.get("v2").w == v2.w).all() and not loaded.get("v2").w.flags.writeable
+    assert [loaded.route(f"user{i}") for i in range(2000)] == routed
+
+
+def test_staged_training_registers_nothing_and_save_prunes_files(tmp_path):
+    reg = RMRegistry(keep=2)
+    reg.add(SimpleTextRM(tags=[], version="v1"), current=True)
+    staged = StagedRM()
+    for _ in range(3):
+        snap = staged.train(reg.get(), reg.get().features({"words": 1}), reg.get().features({"words": 9}), ya=1.0)
+    assert reg.versions() == ["v1"] and staged.status() == {"base_rm_version": "v1", "pairs": 3}
+    assert (staged.take().w == snap.w).all() and staged.take() is None
+
+    for _ in range(3):
+        reg.add(reg.get().copy(reg.next_version()), current=True)
+        reg.save(str(tmp_path))
+    assert reg.versions() == ["v3", "v4"]
+    assert sorted(p.name for p in tmp_path.glob("*.npz")) == ["v3.npz", "v4.npz"]
@@ -0,0 +1,47 @@
+import numpy as np
+
+from backend.app import rm as rm_module
+from backend.app.bt import BradleyTerry
+from backend.app.rm import FEATURES, SimpleTextRM
+from backend.app.rm_train import RMTrainer, train_pairwise, training_pairs
+from backend.app.storage import InMemoryDB
+
+
+def _labeled_db(n_items: int = 200):
+    """Experts always prefer the variant with fewer hedges; a noisy rater votes the other way."""
+    db = InMemoryDB()
+    rng = np.random.default_rng(0)
+    for i in range(n_items):
+        item = db.create_item("u", "text", {}, {}, {})
+        h = rng.integers(0, 4, 2)
+        h[1] += 1 + h[0]
+        a = db.create_variant(item, {}, {"words": int(rng.integers(5, 50)), "hedges": int(h[0])}, "a")
+        b = db.create_variant(item, {}, {"words": int(rng.integers(5, 50)), "hedges": int(h[1])}, "b")
+        db.create_comparison(item, a, b, a, "expert", "good", [], False)
+        if i % 4 == 0:
+            db.create_comparison(item, a, b, b, "crowd", "noisy", [], False)
+    return db
+
+
+def test_trust_weighted_training_learns_the_expert_preference():
+    db = _labeled_db()
+    rm = SimpleTextRM(tags=[])
+    diff, wt = training_pairs(db, {"good": 1.0, "noisy": 10.0}, rm)
+    assert diff.shape == (250, len(FEATURES)) and np.isclose(wt.min(), 0.1)
+    w, loss = train_pairwise(np.zeros(len(FEATURES)), diff, wt, epochs=20, batch_size=32)
+    assert w[FEATURES.index("hedges")] < 0
+    assert loss < np.log(2)
+
+
+def test_trainer_installs_a_new_rm_version_in_the_background(monkeypatch):
+    monkeypatch.setattr(rm_module, "rm_registry", rm_module.RMRegistry())
+    db = _labeled_db(50)
+    trainer = RMTrainer(db=db, bt=BradleyTerry(db=db))
+    before = rm_module.get_rm([])
+    assert trainer.start(epochs=3, batch_size=16, lr=0.5)["state"] == "running"
+    trainer.join(10)
+    status = trainer.status()
+    assert status["state"] == "done" and status["pairs"] == 63
+    after = rm_module.get_rm([])
+    assert after is not before and after.version == status["rm_version"] == "v2"
+    assert not after.w.flags.writeable
@@ -0,0 +1,35 @@
+import random
+
+from backend.app.bandit import pair_z
+from backend.app.scheduler import ItemHeap, info_gain
+
+
+def test_info_gain_prefers_close_and_uncertain_pairs():
+    assert info_gain(0.0, 1.0) > info_gain(2.0, 1.0) > info_gain(6.0, 1.0)
+    assert info_gain(0.0, 4.0) > info_gain(0.0, 0.1)
+    assert info_gain(0.0, 1e-9) < 1e-6  # a known coin flip teaches nothing
+
+
+def test_heap_tracks_brute_force_best_touching_only_changed_pairs():
+    rng = random.Random(0)
+    vids = [f"v{i}" for i in range(12)]
+    scores = {v: (rng.gauss(0, 1), rng.uniform(0.2, 1.0)) for v in vids}
+    h = ItemHeap(scores)
+    for _ in range(200):
+        a, b = rng.sample(vids, 2)
+        pushes, rebuilds = h.pushes, h.rebuilds
+        h.update({a: (h.scores[a][0] + rng.gauss(0, 0.3), 0.95 * h.scores[a][1]), b: (h.scores[b][0], 0.95 * h.scores[b][1])})
+        n = len(vids)
+        assert h.pushes - pushes == (n * (n - 1) // 2 if h.rebuilds > rebuilds else 2 * (n - 2) + 1)
+        best = max(h.key(x, y) for i, x in enumerate(vids) for y in vids[i + 1 :])
+        assert abs(h.best()[2] - best) < 1e-12
+    assert 1 < h.rebuilds < 100  # most labels re-key locally
+
+
+def test_heap_uses_the_laplace_difference_variance_like_pair_z():
+    scores = {"a": (1.0, 0.6), "b": (0.0, 0.6)}
+    diff_var = {("a", "b"): 0.1}
+    h, plain = ItemHeap(scores, diff_var), ItemHeap(scores)
+    # the same resolved decision as the thompson policy's pair_z
+    assert h.z("a", "b") == pair_z("a", "b", scores, diff_var) > 3 > plain.z("a", "b")
+    assert h.best()[2] < plain.best()[2]  # a tighter difference leaves less to learn
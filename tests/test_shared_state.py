@@ -0,0 +1,45 @@
+import threading
+from multiprocessing.managers import BaseManager
+
+from backend.app import shared_state
+from backend.app.config import config
+from backend.app.streaming import StreamMetrics
+
+
+def test_shared_is_local_without_state_server(monkeypatch):
+    monkeypatch.setattr(config, "state_server", None)
+    m = shared_state.shared("metrics_local", StreamMetrics)
+    assert isinstance(m, StreamMetrics)
+
+
+def test_workers_share_one_instance_through_the_coordinator(monkeypatch):
+    # a coordinator serving one StreamMetrics, run on a thread instead of a separate process
+    metrics = StreamMetrics()
+
+    class Coordinator(BaseManager):
+        pass
+
+    Coordinator.register("metrics_shared", callable=lambda: metrics)
+    server = Coordinator(address=("127.0.0.1", 0), authkey=b"test").get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setattr(config, "state_server", "%s:%d" % server.address)
+    monkeypatch.setattr(config, "state_authkey", "test")
+    monkeypatch.setattr(shared_state, "_manager", None)
+    # two "workers", each with its own connection and proxy
+    proxies = []
+    for _ in range(2):
+        proxies.append(shared_state.shared("metrics_shared", StreamMetrics))
+        shared_state._manager = None
+
+    def work(proxy):
+        for _ in range(50):
+            proxy.record(1.0, alerted=True)
+
+    ts = [threading.Thread(target=work, args=(p,)) for p in proxies]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    assert metrics.calls == 100 and metrics.alerts == 100
+    assert proxies[0].snapshot()["calls"] == 100
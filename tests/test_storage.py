@@ -0,0 +1,84 @@
+import pytest
+
+from backend.app.storage import InMemoryDB
+from benchmarks.bench_storage_memory import measure
+
+
+def test_secondary_indexes_track_writes():
+    db = InMemoryDB()
+    v1 = db.create_variant("items_1", {"text": "a"}, {}, "baseline")
+    v2 = db.create_variant("items_1", {"text": "b"}, {}, "remove_hedges")
+    db.create_variant("items_2", {"text": "c"}, {}, "baseline")
+    assert db.variant_ids("items_1") == [v1, v2]
+
+    p1 = db.create_pair("items_1", v1, v2, topic="networking")
+    p2 = db.create_pair("items_1", v2, v1, topic="networking")
+    assert db.pair_ids("networking") == [p1, p2]
+    db.mark_pair_labeled(p1, abstain=False)
+    assert db.pair_ids("networking") == [p2]
+    assert db.pair_ids("networking", labeled=True) == [p1]
+
+    c1 = db.create_comparison("items_1", v1, v2, v1, "expert", None, [], False)
+    assert db.comparison_ids("items_1") == [c1]
+    assert db.comparison_ids("items_2") == []
+
+
+def test_columnar_comparisons_round_trip():
+    db = InMemoryDB()
+    c1 = db.create_comparison("items_1", "variants_1", "variants_2", None, "llm", None, ["concise"], True)
+    row = db.comparisons[c1]
+    assert dict(row) == {
+        "id": c1,
+        "item_id": "items_1",
+        "a_id": "variants_1",
+        "b_id": "variants_2",
+        "winner_id": None,
+        "judge_type": "llm",
+        "rater_id": None,
+        "tags": ["concise"],
+        "abstain": True,
+        "confidence": None,
+        "created_at": row["created_at"],
+    }
+    db.update_comparison(c1, winner_id="variants_2", abstain=False)
+    assert db.comparisons[c1]["winner_id"] == "variants_2"
+    assert [r["id"] for r in db.comparisons.values()] == [c1]
+
+    e1 = db.append_stream_event("u1", None, None, "negative", 0.1, ["hedge"], {})
+    assert db.stream_events[e1]["suggestion"] == {}
+    assert db.stream_events[e1]["p_win"] == 0.1
+
+
+def test_columnar_tables_are_4x_smaller():
+    for as_dict, columnar in measure(5_000).values():
+        assert as_dict / columnar >= 4.0
+
+
+def test_row_views_survive_head_compaction():
+    db = InMemoryDB()
+    for _ in range(9_000):
+        db.append_stream_event("u1", None, None, "negative", 0.5, [], {})
+    t = db.stream_events
+    early, late = t["stream_event_100"], t["stream_event_9000"]
+    for n in range(1, 8_001):
+        del t[f"stream_event_{n}"]
+    assert t.key_of(t.oldest()) == "stream_event_8001"
+    assert len(t.column("p_win")) == 1_000  # the head was compacted away
+    assert late["id"] == "stream_event_9000" and late["p_win"] == 0.5
+    with pytest.raises(KeyError):
+        early["p_win"]
+
+
+def test_comparison_update_log_releases_consumed_entries():
+    db = InMemoryDB()
+    c1 = db.create_comparison("items_1", "variants_1", "variants_2", None, "crowd", "r", [], True)
+    c2 = db.create_comparison("items_1", "variants_1", "variants_2", None, "crowd", "r", [], True)
+    db.update_comparison(c1, winner_id="variants_1", abstain=False)
+    db.update_comparison(c1, winner_id="variants_2")
+    rows, cursor = db.comparison_updates_since(0)
+    assert [r["winner_id"] for r in rows] == ["variants_2"]
+    db.update_comparison(c2, winner_id="variants_1", abstain=False)
+    rows, cursor = db.comparison_updates_since(cursor)
+    assert [r["id"] for r in rows] == [c2]
+    # c1's updates were consumed before `cursor` and are gone from the log
+    assert [r["id"] for r in db.comparison_updates_since(0)[0]] == [c2]
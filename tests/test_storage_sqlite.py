@@ -0,0 +1,52 @@
+import threading
+
+from backend.app.storage_sqlite import SQLiteDB
+
+
+def test_sqlite_db_matches_in_memory_surface(tmp_path):
+    db = SQLiteDB(str(tmp_path / "t.db"), read_pool=2)
+    item = db.create_item("u1", "text", {"goal": "x"}, {"text": "hi"}, {})
+    v1 = db.create_variant(item, {"text": "a"}, {}, "baseline")
+    v2 = db.create_variant(item, {"text": "b"}, {}, "remove_hedges")
+    assert db.variant_ids(item) == [v1, v2]
+    assert db.variants[v1]["item_id"] == item
+    assert db.scores.get(v2) == {"s": 0.0, "stderr": 1.0}
+
+    pair = db.create_pair(item, v1, v2, topic="networking")
+    db.mark_pair_labeled(pair, abstain=True)
+    assert db.pair_ids("networking") == []
+    assert db.pair_ids("networking", labeled=True) == [pair]
+    assert db.pairs[pair]["abstain"] is True
+    db.close()
+
+    reopened = SQLiteDB(str(tmp_path / "t.db"))
+    assert reopened.items[item]["context_json"] == {"goal": "x"}
+    assert reopened.create_item("u1", "text", {}, {}, {}) != item
+    reopened.close()
+
+
+def test_sqlite_group_commit_concurrent_writers(tmp_path):
+    db = SQLiteDB(str(tmp_path / "t.db"))
+
+    def work():
+        for _ in range(25):
+            db.append_stream_event("u1", None, None, "negative", 0.2, ["hedge"], {})
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(db.stream_events) == 200
+    db.close()
+
+
+def test_sqlite_comparison_updates_are_seen_by_other_processes(tmp_path):
+    worker, coordinator = SQLiteDB(str(tmp_path / "t.db")), SQLiteDB(str(tmp_path / "t.db"))
+    c1 = worker.create_comparison("items_1", "variants_1", "variants_2", None, "crowd", "r", [], True)
+    worker.update_comparison(c1, winner_id="variants_1", abstain=False)
+    rows, cursor = coordinator.comparison_updates_since(0)
+    assert [r["winner_id"] for r in rows] == ["variants_1"]
+    assert coordinator.comparison_updates_since(cursor) == ([], cursor)
+    worker.close()
+    coordinator.close()
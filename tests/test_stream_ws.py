@@ -0,0 +1,38 @@
+from fastapi.testclient import TestClient
+
+from backend.app.config import config
+from backend.app.main import app
+from backend.app.streaming import stream_metrics
+
+
+def test_ws_coalesces_a_burst_into_one_scored_frame(monkeypatch):
+    monkeypatch.setitem(config.streaming, "debounce_ms", 200)
+    client = TestClient(app)
+    with client.websocket_connect("/rm/stream/ws?user_id=u_ws&item_id=i_ws") as ws:
+        calls = stream_metrics.snapshot()["calls"]
+        text = ""
+        for ch in "maybe we could meet":
+            text += ch
+            ws.send_json({"snippet": text, "cursor": {"pos": len(text)}, "context": {"goal": "ask clearly"}})
+        frame = ws.receive_json()
+        assert 0.0 <= frame["p_win"] <= 1.0 and frame["rm_version"]
+        assert stream_metrics.snapshot()["calls"] == calls + 1
+
+        ws.send_json({"cursor": {"pos": 0}})
+        assert "error" in ws.receive_json()
+        # context persists from earlier events on the same socket
+        ws.send_json({"snippet": text + " tomorrow at 10am"})
+        assert "p_win" in ws.receive_json()
+
+
+def test_ws_reports_malformed_frames_between_edits(monkeypatch):
+    monkeypatch.setitem(config.streaming, "debounce_ms", 50)
+    client = TestClient(app)
+    with client.websocket_connect("/rm/stream/ws?user_id=u_ws2&item_id=i_ws2") as ws:
+        ws.send_text("not json")
+        assert ws.receive_json() == {"error": "expected a JSON object"}
+        ws.send_json({"snippet": "see you tomorrow", "context": {"goal": "ask clearly"}})
+        ws.send_text("[1, 2]")
+        # the error goes out immediately; the pending edit is still scored after the quiet period
+        assert ws.receive_json() == {"error": "expected a JSON object"}
+        assert "p_win" in ws.receive_json()
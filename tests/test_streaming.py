@@ -1,4 +1,10 @@
-from backend.app.streaming import streaming_score, find_spans
+import random
+
+from fastapi.testclient import TestClient
+
+from backend.app.config import config
+from backend.app.main import app
+from backend.app.streaming import StreamDeltas, StreamDoc, _apply_ops, derive_stream_features, find_spans, streaming_score, suggestion_for, suggestion_ops
 
 
 def test_streaming_score_basic():
@@ -13,3 +19,51 @@ def test_find_spans_hedges():
     spans = find_spans(text)
     assert any(s["tag"] == "hedge" for s in spans)
 
+
+def test_stream_doc_matches_full_rescan_under_random_edits():
+    rng = random.Random(0)
+    words = ["maybe", "we", "meet", "at", "3pm", "on", "Friday.", "I", "think", "just", "coffee?", "sort", "of", "ok!", "\n\n", "that"]
+    doc, text = StreamDoc(), ""
+    for step in range(600):
+        pos = rng.randint(0, len(text))
+        if text and rng.random() < 0.35:
+            end = min(len(text), pos + rng.randint(1, 12))
+            text, cursor = text[:pos] + text[end:], pos
+        else:
+            ins = " ".join(rng.choice(words) for _ in range(rng.randint(1, 4))) + rng.choice(["", " "])
+            text, cursor = text[:pos] + ins + text[pos:], pos + len(ins)
+        # a wrong cursor must only cost the fallback diff, never correctness
+        doc.update(text, cursor if step % 5 else rng.randint(0, len(text)))
+        assert doc.features() == derive_stream_features(text)
+        assert doc.spans() == find_spans(text)
+
+
+def test_delta_responses_rebuild_full_spans_and_patches():
+    rng = random.Random(1)
+    deltas, held, text = StreamDeltas(8), [], "maybe we meet. "
+    for _ in range(300):
+        pos = rng.randint(0, len(text))
+        text = text[:pos] + rng.choice(["just ", "x", " kind of", ". ", "I think "]) + text[pos:]
+        spans = [(s["start"], s["end"], s["tag"]) for s in find_spans(text)]
+        out = deltas.encode(("u", "i"), text, pos + 1, spans)
+        if out.get("base_seq") is None:
+            held = list(spans)
+        else:
+            # the client side of the protocol (schemas.StreamScoreResponse)
+            a, old_end, new_end = out["edit"]
+            gone = set(out["spans_removed"])
+            held = [(s + (new_end - old_end), e + (new_end - old_end), t) if s >= old_end else (s, e, t) for s, e, t in held if (s, e, t) not in gone]
+            held += out["spans_added"]
+        assert sorted(held) == spans
+        label, patched = suggestion_for(text, [])
+        assert suggestion_ops(text, [])[0] == label and _apply_ops(text, suggestion_ops(text, [])[1]) == patched
+
+
+def test_full_responses_keep_the_original_payload():
+    client = TestClient(app)
+    body = {"snippet": "maybe later", "context": {"goal": next(iter(config.blocked_goal_keywords))}}
+    full = client.post("/rm/stream/score", json=body).json()
+    assert set(full) == {"p_win", "confidence", "state", "tags", "spans", "suggestion", "rm_version", "explanations"}
+    assert set(full["suggestion"]) == {"label", "patch"}
+    delta = client.post("/rm/stream/score", json={**body, "user_id": "u_full", "delta": True}).json()
+    assert delta["seq"] == 1 and "patch" not in delta["suggestion"]